@@ -41,7 +41,23 @@ import carla
 fps_server = 20
 save_seconds_before_cc = 7
 record_every_x_frames = 3
+writer_workers = 4               # threads which write the frames of a corner case in the background
+writer_max_pending = 64          # queued frames, the writer blocks if it falls behind
+writer_progress_frames = 25      # the writer reports every x written frames of a corner case
+qrecording_class_ids = False     # keep the masks before a cc as class id maps (3x smaller than colorized masks)
+qrecording_compression = None    # [None, jpeg, lz4], compression of the camera frames before a cc in memory, lz4 needs lz4
+qrecording_memory_mb = None      # memory budget of the frames before a cc, limits save_seconds_before_cc
+semseg_colorized = False         # save_cc.py also writes the CityScapes colored semseg (02_semseg_cs), otherwise only the labels (02_semseg_raw)
+depth_format = 'png'             # [png, float32, float16, mm], save_cc.py writes the 24 bit encoded depth (06_depth_raw) or the decoded depth in m (mm) as npz (06_depth)
+depth_lidar = None               # [None, npz, bin], save_cc.py also writes the labeled point cloud of the depth and semseg camera (04_lidar)
+depth_lidar_rays = True          # keep the points of the rays of the lidar of save_cc.py only, otherwise of every pixel
+frame_storage = 'png'            # [png, pack], save_cc.py writes one png per sensor and frame or one pack file per recording (utils/framepack.py)
+pack_codec = 'lz4'               # [None, lz4, png], lossless compression of the frames in a pack, lz4 needs lz4
 radius_trajectory = 15
+trajectory_codec = None          # [None, gzip, zstd], compression of the streamed trajectories (08_trajectory/trajectories.jsonl), zstd needs zstandard
+actor_log_format = 'npy'         # [npy, parquet], columnar log of the actors around the ego vehicle (<scene>/08_trajectory/actor_data.npy or .parquet), parquet needs pyarrow
+actor_log_csv = True             # also export the log at the end of the drive as <scene>/08_trajectory/actor_data.csv, the file and folder of the former save_csv
+pedal_log_csv = True             # also export the pedal telemetry (00_log/pedal_tracking.bin) as 00_log/pedal_tracking.csv at the end of the drive
 
 available_displays= 1 # [1,3]
 resolution = [1280, 640] # [width, height]
@@ -70,3 +86,18 @@ ckpt_2 = 'clear_FastSCNN_cornercases'
 ckpt_3 = 'clear_FastSCNN_origin'
 ckpt_4 = 'clear_FastSCNN_pedestrian'
 
+
+#---------------------------- inference ------------------------------
+model_cache_size = 2      # networks held in memory, the least recently used one is unloaded
+prefetch_models = False   # load the networks in a background thread instead of by the first frame which needs them
+inference_queue_size = 1  # frames waiting for the inference, older ones are dropped
+deploy = True             # fold the batch norms into the convolutions
+channels_last = False     # channels last memory format of the networks
+jit = None                # [None, trace, compile], TorchScript tracing or torch.compile (torch 2.0+)
+bisenet_aux_mode = 'eval' # [eval, pred], pred returns the argmax directly
+inference_scale = 1.0     # input resolution of the networks relative to the camera resolution (multiple of 32), the class maps are upsampled
+precision = 'fp32'        # [fp32, bf16, fp16, int8], fp16 on the GPU only (bf16 on the CPU), int8 on the CPU only
+quantization_backend = 'fbgemm'     # [fbgemm, qnnpack], int8 backend for x86 or ARM
+calibration_root = os.path.join(os.getcwd(), 'output')  # recorded scenes (01_cam) for the int8 calibration
+calibration_frames = 100  # number of frames for the int8 calibration
+backend = 'torch'         # [torch, onnx], onnx runs the exported graphs (export_onnx.py) with ONNX Runtime on the CPU, needs onnxruntime
@@ -43,12 +43,12 @@ import torch
 
 from utils.cc import CheckCornerCase
 from utils.weather import Weather
-from utils.inference import Inference
-from utils.tools import TimeMeasurement, get_folder_name, get_model_name 
-from utils.tools import output_folders_data_generator as output_folders
-from utils.tracking import pedal_tracking
+from utils.inference import InferenceEngine, InferenceWorker
+from utils.tools import TimeMeasurement, get_model_name 
+from utils.session import Session
+from utils.tracking import PedalRecorder
 from utils.rec import QRecording
-from utils.save import save_csv
+from utils.actor_log import ActorStateLogger
 from utils.carlaworld import TravelDistance, SpeedDisplay, TrafficLightsDisplay
 from utils.carlaworld import get_ego_car, remove_fences
 # from utils.spawn import spawning_radius
@@ -182,6 +182,7 @@ class HUD(object):
         heading += 'E' if 179.5 > t.rotation.yaw > 0.5 else ''
         heading += 'W' if -0.5 > t.rotation.yaw > -179.5 else ''
         vehicles = world.world.get_actors().filter('vehicle.*')
+        inference_stats = world.camera_manager.inference_worker.stats()
 
         # for vehicle in vehicles:
         #     if not vehicle.attributes:
@@ -200,6 +201,10 @@ class HUD(object):
             'Server:  % 16.0f FPS' % self.server_fps,
             'Client:  % 16.0f FPS' % clock.get_fps(),
             '',
+            'Inference: % 14.0f ms' % (1000 * inference_stats['mean_latency']),
+            'Dropped frames: % 9d' % inference_stats['dropped'],
+            'Queue depth: % 12d' % inference_stats['queue_depth'],
+            '',
             'Vehicle: % 20s' % get_actor_display_name(world.player, truncate=20),
 #            'Map:     % 20s' % world.world.map_name,
             'Simulation time: % 12s' % datetime.timedelta(seconds=int(self.simulation_time)),
@@ -530,6 +535,7 @@ class World(object):
             if sensor is not None:
                 sensor.stop()
                 sensor.destroy()
+        self.camera_manager.inference_worker.stop()
         if self.player is not None:
             self.player.destroy()
     
@@ -546,8 +552,12 @@ class DualControl(object):
     first:      plug in steering wheel for safety driver
     second:     plug in steering wheel for semantic driver
     """
-    def __init__(self, world, start_in_autopilot, client, ccc, start, weather):
+    def __init__(self, world, start_in_autopilot, client, ccc, start, weather, session=None):
         self._previous_steer_safety_driver = 0 
+        self.session = session
+        # pedal telemetry of both drivers, buffered and written in the background, without a session
+        # into the scene folder of the corner case check (the latest one) like before
+        self.pedals = PedalRecorder((session if session is not None else ccc.session).log)
         self._autopilot_enabled = start_in_autopilot
         self.i_rec = 1 # start with 1
         self.client = client
@@ -696,6 +706,12 @@ class DualControl(object):
             world.player.apply_control(self._control)
 
 
+    def close(self):
+        """
+        writes the remaining pedal telemetry
+        """
+        self.pedals.close(export_csv=cfg.pedal_log_csv)
+
     def _parse_vehicle_keys(self, keys, milliseconds):
         self._control.throttle = 1.0 if keys[K_UP] or keys[K_w] else 0.0
         steer_increment = 5e-4 * milliseconds
@@ -751,8 +767,13 @@ class DualControl(object):
             -0.7 * jsInputs_safety_driver[self._brake_idx] + 1.4) - 1.2) / 0.92
         
         ###############
-        # retrieve throttle/brake for sem/safety driver
-        pedal_tracking(throttleCmd, throttleCmd_safety_driver, brakeCmd, brakeCmd_safety_driver, time.time()-self.timer) 
+        # retrieve throttle/brake/steer for sem/safety driver
+        # timer: time since the last corner case (self.timer is reset by the gui)
+        if self.joystick_count > 1:
+            self.pedals.record(throttleCmd, brakeCmd, throttleCmd_safety_driver, brakeCmd_safety_driver,
+                               steerCmd, steerCmd_safety_driver, timer=time.time()-self.timer)
+        else:
+            self.pedals.record(throttleCmd, brakeCmd, steer_sem=steerCmd, timer=time.time()-self.timer)
         ###############
         if throttleCmd <= 0:
             throttleCmd = 0
@@ -896,14 +917,23 @@ class CameraManager(object):
         self.qrecording = qrecording
         self.time_measurement = TimeMeasurement()
 
-        self.inf_1 = Inference(cfg.ckpt_1)
-        self.inf_2 = Inference(cfg.ckpt_2)
-        self.inf_3 = Inference(cfg.ckpt_3)
-        self.inf_4 = Inference(cfg.ckpt_4)
+        # one engine holds the networks of the checkpoints, only the selected one runs per frame,
+        # the networks are loaded when they are selected for the first time (LRU cache)
+        # the history of the corner cases can keep the class maps instead of the colorized masks
+        output = 'both' if qrecording is not None and qrecording.class_ids else 'mask'
+        self.engine = InferenceEngine([cfg.ckpt_1, cfg.ckpt_2, cfg.ckpt_3, cfg.ckpt_4], output=output,
+                                      cache_size=cfg.model_cache_size, prefetch=cfg.prefetch_models)
+        # the forward pass runs in its own thread and not in the sensor callback
+        self.inference_worker = InferenceWorker(self.engine, cfg.inference_queue_size)
         self.model_name_1 = get_model_name(cfg.ckpt_1)
         self.model_name_2 = get_model_name(cfg.ckpt_2)
         self.model_name_3 = get_model_name(cfg.ckpt_3)
         self.model_name_4 = get_model_name(cfg.ckpt_4)
+        self.inf_ckpts = {
+            self.model_name_1: cfg.ckpt_1,
+            self.model_name_2: cfg.ckpt_2,
+            self.model_name_3: cfg.ckpt_3,
+            self.model_name_4: cfg.ckpt_4}
         
         if hud.dim[0] == 3840 or hud.dim[0] == 7680:              # move camera because of new resolution 
                 self._camera_transforms = [
@@ -974,6 +1004,8 @@ class CameraManager(object):
             # circular reference.
             weak_self = weakref.ref(self)
             self.sensor.listen(lambda image: CameraManager._parse_image(weak_self, image))
+        if self.sensors[index][2] in self.inf_ckpts:
+            self.engine.set_active(self.inf_ckpts[self.sensors[index][2]])
         if notify:
             self.hud.notification(self.sensors[index][2])
         self.index = index
@@ -986,6 +1018,16 @@ class CameraManager(object):
         self.hud.notification('Recording %s' % ('On' if self.recording else 'Off'))
 
     def render(self, display):
+        result = self.inference_worker.get()
+        if result is not None and self.sensors[self.index][2] in self.inf_ckpts:
+            masks, image = result
+            mask = masks.get(self.inf_ckpts[self.sensors[self.index][2]])
+            if mask is not None:    # None if the network was switched during processing
+                class_map = None
+                if self.engine.output == 'both':
+                    mask, class_map = mask
+                if self.qrecording is not None: self.qrecording.add(mask, image, class_map)
+                self.surface = pygame.surfarray.make_surface(mask.swapaxes(0, 1))
         if self.surface is not None:
             display.blit(self.surface, (0, 0))
 
@@ -1009,26 +1051,9 @@ class CameraManager(object):
             lidar_img[tuple(lidar_data.T)] = (255, 255, 255)
             self.surface = pygame.surfarray.make_surface(lidar_img)
         ############################ added inference #############################
-        elif self.sensors[self.index][2].startswith(f'{self.model_name_1}'):
-            self.get_inf_name = f'{self.model_name_1}'            
-            mask = self.inf_1.processing(image)
-            if self.qrecording is not None: self.qrecording.add(mask, image)
-            self.surface = pygame.surfarray.make_surface(mask.swapaxes(0, 1))
-        elif self.sensors[self.index][2].startswith(f'{self.model_name_2}'):
-            self.get_inf_name = f'{self.model_name_2}'
-            mask = self.inf_2.processing(image)
-            if self.qrecording is not None: self.qrecording.add(mask, image)
-            self.surface = pygame.surfarray.make_surface(mask.swapaxes(0, 1))
-        elif self.sensors[self.index][2].startswith(f'{self.model_name_3}'):
-            self.get_inf_name = f'{self.model_name_3}'
-            mask = self.inf_3.processing(image)
-            if self.qrecording is not None: self.qrecording.add(mask, image)
-            self.surface = pygame.surfarray.make_surface(mask.swapaxes(0, 1))
-        elif self.sensors[self.index][2].startswith(f'{self.model_name_4}'):
-            self.get_inf_name = f'{self.model_name_4}'
-            mask = self.inf_4.processing(image)
-            if self.qrecording is not None: self.qrecording.add(mask, image)
-            self.surface = pygame.surfarray.make_surface(mask.swapaxes(0, 1))
+        elif self.sensors[self.index][2] in self.inf_ckpts:
+            self.get_inf_name = self.sensors[self.index][2]
+            self.inference_worker.put(image)    # the mask is picked up in render()
         ########################################################################
         else:
             self.get_inf_name = None
@@ -1050,14 +1075,19 @@ def game_loop(args):
     pygame.init()
     pygame.font.init()
     world = None
+    qrecording = None
+    actor_log = None
+    controller = None
     start = time.time()
+    # the scene folder is resolved once and handed to the writers
     if args.cc_gen_mode:
-        path = get_folder_name() # folders already created in utils/spawn_npc.py
+        session = Session.latest() # folders already created in utils/spawn_npc.py
     else:
         if args.demonstration:
-            path =''
+            session = None
         else:
-            path = output_folders()
+            session = Session.create()
+    path = session.path if session is not None else ''
     
     try:
         client = carla.Client(args.host, args.port)
@@ -1069,20 +1099,25 @@ def game_loop(args):
 
         hud = HUD(cfg.resolution[0], cfg.resolution[1])
         
-        weather = Weather(client, args.weather)
+        weather = Weather(client, args.weather, session)
         
         if args.save_inference_images: 
             qrecording = QRecording(cfg.fps_server, 
                                     cfg.save_seconds_before_cc, 
-                                    cfg.record_every_x_frames)
+                                    cfg.record_every_x_frames,
+                                    class_ids=cfg.qrecording_class_ids,
+                                    compression=cfg.qrecording_compression,
+                                    memory_mb=cfg.qrecording_memory_mb,
+                                    resolution=hud.dim,     # image_size_x/y of the cameras (CameraManager)
+                                    session=session)
         else:
             qrecording= None
         world = World(client.get_world(), hud, args.filter, path, cfg.model_name, qrecording, args)
         if not args.demonstration: weather.save_weather()
         #----------------- controller --------------------
         td = TravelDistance(world.get_ego_location())
-        ccc = CheckCornerCase(world, args, client, td, qrecording, weather) 
-        controller = DualControl(world, args.autopilot, client, ccc, start, weather)
+        ccc = CheckCornerCase(world, args, client, td, qrecording, weather, session) 
+        controller = DualControl(world, args.autopilot, client, ccc, start, weather, session)
 
         #----------------- visualisation ----------------- 
         # show traffic lights and speed
@@ -1099,6 +1134,9 @@ def game_loop(args):
         world.world.apply_settings(settings)
 
         ego_car = get_ego_car(world.world.get_actors())
+        # same folder as the former save_csv: <scene>/08_trajectory of the run, without a session (demonstration)
+        # the one of the corner case check (the latest scene folder)
+        actor_log = ActorStateLogger(ccc.session.trajectory, cfg.radius_trajectory, log_format=cfg.actor_log_format)
         frame = 1
         record_every_x_frames = 10
         remove_fences(world.world)
@@ -1111,7 +1149,7 @@ def game_loop(args):
             world.render(display)
 
             if frame % record_every_x_frames == 0:
-                save_csv(ego_car, world.world.get_actors(), cfg.radius_trajectory, frame, start)
+                actor_log.log(ego_car, world.world.get_actors(), frame, start)
             frame += 1
 
             tld.fetch_tl_landmarks(world.player.get_location(), distance=50)
@@ -1124,6 +1162,12 @@ def game_loop(args):
             speedmeter.render(world.player, display, (cfg.width//2, 30))
             pygame.display.flip()
     finally:
+        if qrecording is not None:
+            qrecording.close()      # the frames of the last corner case are still written
+        if actor_log is not None:
+            actor_log.close(export_csv=cfg.actor_log_csv)
+        if controller is not None:
+            controller.close()
         if ccc is not None: 
             ccc.delete_recording()
             print('recording stopped')
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+exports the checkpoints of config.py (ckpt_1 ... ckpt_4) to ONNX (weights/<ckpt>.onnx)
+
+every export is checked against the torch network (parity check), with --benchmark the throughput
+of ONNX Runtime (CPU) is compared with the torch path, set backend = 'onnx' in config.py to use the graphs
+
+    python export_onnx.py --benchmark
+"""
+import argparse
+import time
+import sys
+
+import torch
+
+from utils.deploy import fuse_bn
+from utils.networks import load_network
+from utils.preprocessing import inference_size
+from utils.onnx_runtime import OnnxNetwork, export_onnx, onnx_path
+import config as cfg
+
+
+def logits(network, x):
+    out = network(x)
+    return out[0] if isinstance(out, (tuple, list)) else out
+
+
+def throughput(network, x, iterations):
+    """
+    frames per second
+    """
+    with torch.inference_mode():
+        logits(network, x)      # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            logits(network, x)
+    return iterations * x.shape[0] / (time.perf_counter() - start)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--ckpts', nargs='+', default=[cfg.ckpt_1, cfg.ckpt_2, cfg.ckpt_3, cfg.ckpt_4])
+    height, width = inference_size(cfg.height, cfg.width, cfg.inference_scale)
+    argparser.add_argument('--width', type=int, default=width, help='input width (default: inference resolution)')
+    argparser.add_argument('--height', type=int, default=height, help='input height (default: inference resolution)')
+    argparser.add_argument('--opset', type=int, default=11)
+    argparser.add_argument('--tolerance', type=float, default=0.999, help='minimal agreement of the class maps')
+    argparser.add_argument('--benchmark', action='store_true', help='compares the throughput with the torch path')
+    argparser.add_argument('-n', '--iterations', type=int, default=20)
+    argparser.add_argument('--batch', type=int, default=1)
+    argparser.add_argument('--threads', type=int, default=None, help='number of CPU threads')
+    args = argparser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    failed = []
+    for ckpt in [ckpt for ckpt in args.ckpts if ckpt]:
+        network = fuse_bn(load_network(ckpt, 'cpu', cfg.bisenet_aux_mode))
+        example = torch.zeros((1, 3, args.height, args.width))
+        path = export_onnx(network, onnx_path(ckpt), example, args.opset)
+        onnx_network = OnnxNetwork(path, args.threads)
+
+        #----------- parity check -----------
+        x = torch.randn((args.batch, 3, args.height, args.width))
+        with torch.inference_mode():
+            reference = logits(network, x)
+        out = logits(onnx_network, x)
+        max_diff = (reference - out).abs().max().item()
+        if reference.dim() == 4:
+            reference, out = reference.argmax(dim=1), out.argmax(dim=1)
+        agreement = (reference == out).float().mean().item()
+        print(f'{path}: max. difference {max_diff:.2e}, agreement of the class maps {agreement * 100:.3f}%')
+        if agreement < args.tolerance:
+            failed.append(ckpt)
+
+        #----------- throughput -----------
+        if args.benchmark:
+            fps_torch = throughput(network, x, args.iterations)
+            fps_onnx = throughput(onnx_network, x, args.iterations)
+            print(f'    torch {fps_torch:.1f} fps, onnxruntime {fps_onnx:.1f} fps ({fps_onnx / fps_torch:.2f}x)')
+
+    if failed:
+        sys.exit(f'parity check failed for {failed}')
+
+
+if __name__ == '__main__':
+    main()
@@ -393,6 +393,22 @@ class BiSeNetV2(nn.Module):
         return wd_params, nowd_params, lr_mul_wd_params, lr_mul_nowd_params
 
 
+def bisenetv2_inference(n_classes, state_dict=None, aux_mode='eval'):
+    """
+    builds BiSeNetV2 for inference with the main head only, the four auxiliary heads are not allocated
+    training checkpoints can be loaded, the weights of the auxiliary heads are ignored
+    :param n_classes:   number of classes
+    :param state_dict:  state dict of a (training) checkpoint
+    :param aux_mode:    'eval' returns (logits,), 'pred' returns the argmax (N, H, W) directly
+    """
+    if aux_mode not in ('eval', 'pred'):
+        raise ValueError(f'aux_mode {aux_mode} is not an inference mode')
+    network = BiSeNetV2(n_classes, aux_mode=aux_mode)
+    if state_dict is not None:
+        state_dict = {k: v for k, v in state_dict.items() if not k.startswith('aux')}
+        network.load_state_dict(state_dict, strict=True)
+    return network.eval()
+
 
 if __name__ == "__main__":
     #  x = torch.randn(16, 3, 1024, 2048)
@@ -9,6 +9,10 @@ import sys
 import config as cfg 
 from utils.inference import Inference
 from utils.save import SaveContext
+from utils.sinks import PngSink, LabelSink, CityScapesSink, DepthSink, DepthLidarSink, FramePacks, PackSink, SinkStage
+from utils.writer import AsyncWriter
+from utils.jobs import JobManifest
+from utils.tools import PhaseTimer
 # from supplement.radar import radar as rd
 import time
 import subprocess
@@ -16,6 +20,8 @@ import signal
 from PIL import Image
 import json
 import shutil
+import argparse
+from multiprocessing import Process
 
 try:
     sys.path.append(glob.glob(cfg.path_egg_file + '/carla/dist/carla-*%d.%d-%s.egg' % (
@@ -79,6 +85,19 @@ class CarlaSyncMode(object):
     def __exit__(self, *args, **kwargs):
         self.world.apply_settings(self._settings)
 
+    def warm_up(self, timeout, max_ticks=10):
+        """
+        ticks until every sensor delivered a frame of the same tick, instead of waiting a fixed time 
+        for the sensors
+        :return: data of the first complete tick
+        """
+        for _ in range(max_ticks):
+            try:
+                return self.tick(timeout)
+            except queue.Empty:
+                continue
+        raise RuntimeError(f'the sensors did not deliver a frame within {max_ticks} ticks')
+
     def _retrieve_data(self, sensor_queue, timeout):
         while True:
             data = sensor_queue.get(timeout=timeout)
@@ -98,6 +117,21 @@ def get_recordings(folder, path):
     return recorded_files
 
 
+def wait_for_actor(world, actor_id, timeout=10.0):
+    """
+    waits for the world ticks until the actor exists, e.g. the ego vehicle spawned by the replayer
+    :return: actor
+    """
+    deadline = time.time() + timeout
+    actor = world.get_actor(actor_id)
+    while actor is None:
+        if time.time() > deadline:
+            raise RuntimeError(f'actor {actor_id} does not exist after {timeout}s')
+        world.wait_for_tick(timeout)
+        actor = world.get_actor(actor_id)
+    return actor
+
+
 def load_weather(world, path, scene):
     """
     loading the orignal weather
@@ -267,187 +301,287 @@ def sensor_settings(world):
 
     return camera_bp, segm_bp, lidar_bp, depth_bp#, inst_bp
 
-# def lidar_save(path, depth, mask):
-#     os.makedirs(os.path.dirname(path), exist_ok=True)
-#     ocfg = OmegaConf.load("../sensors/configs/carla.yaml") #
-#     camera = buw_sensors.Camera(ocfg.camera) #
-#     lidar = buw_sensors.Lidar(ocfg.lidar) #
-#     precomputed_coords = camera.project_angles(*lidar.all_angles) #
-#     depth_array = np.frombuffer(depth.raw_data, dtype=np.dtype("uint8"))
-#     depth_array = np.reshape(depth_array, (depth.height, depth.width, 4))[..., :3]
-#     convert = np.array([1, 256, 256 * 256], dtype=float) #
-#     convert *= 1000 / (256 * 256 * 256 - 1) #
-#     depth_array = depth_array @ convert
-#     mask_array = np.frombuffer(mask.raw_data, dtype=np.dtype("uint8"))
-#     mask_array = np.reshape(mask_array, (mask.height, mask.width, 4))[..., 0]
-#     points, labels = lidar.from_depth(depth_array, mask_array, camera, image_coords=precomputed_coords)
-#     points = points.astype(np.float32)
-#     np.savez(path, points=points, labels=labels)
-
-
-def main(folder_name):
-    start_cc = time.time()
-    
+def extract(client, world, path, scene, file, blueprints, stage):
+    """
+    replays a recording and saves the sensor data of the corner case
+    :param path:        folder of the recorded scenes
+    :param scene:       scene folder
+    :param file:        recording file of the scene
+    :param blueprints:  sensor blueprints (camera, semseg, lidar, depth)
+    :param stage:       SinkStage which writes the sensor data
+    :return:            PhaseTimer of the recording
+    """
+    camera_bp, segm_bp, lidar_bp, depth_bp = blueprints
+    sc = SaveContext(path, cfg.trajectory_codec)
+    timer = PhaseTimer()
+    sensor_list = []
     try:
-        ### start carla world
-        # carla_proc = subprocess.Popen(['./CarlaUE4.sh', '-RenderOffScreen'], cwd=cfg.path_carla, preexec_fn=os.setsid) 
-        # carla_proc = subprocess.Popen('./CarlaUE4.sh', cwd=cfg.path_carla, preexec_fn=os.setsid) 
-        # time.sleep(10)
-        
-        client = carla.Client('localhost', 2000, worker_threads=1)
+        ### get ego id
+        if not os.path.exists(os.path.join(path, scene, '00_log', 'context.json')):
+            with open(os.path.join(path, scene, '00_log', 'ego_id.txt')) as f:
+                lines = f.readlines()
+                ego_id = int(lines[0])
+        else:
+            with open(os.path.join(path, scene, '00_log', 'context.json')) as f:
+                json_data = json.load(f)
+                ego_id = json_data['ego_vehicle']['id']
+
+        path_rec_file = os.path.join(path, scene, '00_log', file)
+        considered_time_period = 9
+        client.replay_file(path_rec_file, -considered_time_period, 0, ego_id) # (file, start [s], duration [s], actor id)
+        vehicle = wait_for_actor(world, ego_id)
+        timer.lap('replay start')
+        ### load the weather settings
+        load_weather(world, path, scene)
+        world.wait_for_tick()   # the weather is applied with the next tick
+        timer.lap('weather load')
+
+        transform = carla.Transform(carla.Location(x=1.6, z=1.7))
+        transform_lidar = transform
+
+        transform_bird = carla.Transform(carla.Location(x=0.0, z=35.0), carla.Rotation(pitch=-90))
+
+        camera = world.spawn_actor(camera_bp, transform, attach_to=vehicle)
+        sensor_list.append(camera)
+
+        segm = world.spawn_actor(segm_bp, transform, attach_to=vehicle)
+        sensor_list.append(segm)
+
+        lidar = world.spawn_actor(lidar_bp, transform_lidar, attach_to=vehicle)
+        sensor_list.append(lidar)
+
+        depth = world.spawn_actor(depth_bp, transform, attach_to=vehicle)
+        sensor_list.append(depth)
+
+        ### inference - usable with CARLA 0.9.13+ ###
+        # inst = world.spawn_actor(inst_bp, transform, attach_to=vehicle)
+        # sensor_list.append(inst)
+
+        ### radar ###
+        # transform_radar = transform
+        # radar = world.spawn_actor(radar_bp, transform_radar, attach_to=vehicle)
+        # sensor_list.append(radar)
+
+
+        ### birds-eye-view ###
+        bird = world.spawn_actor(camera_bp, transform_bird, 
+                                    attach_to=vehicle, attachment_type=carla.AttachmentType.Rigid)
+        sensor_list.append(bird)
+        bird_sem = world.spawn_actor(segm_bp, transform_bird, 
+                                    attach_to=vehicle, attachment_type=carla.AttachmentType.Rigid)
+        sensor_list.append(bird_sem)
+
+        world.wait_for_tick()   # the sensors are attached with the next tick
+        sc.sensor_settings(sensor_list, transform)
+        sc.sensor_locations(world, sensor_list)
+        sc.save_json_post(scene)
+
+        #------- initializing bboxes and radar_data---------
+        # bb = BoundingBoxes.BoundingBoxes(world, depth, width, height)
+        # radar_data = rd.SensorData()
+        #---------------------------------------------------
+
+        fps_stat = 1 #--> changes not the framerate
+        fps_factor = 1
+        last_loc = {}
+        radius = 15
+        frame = 1  
+        start = time.time()
+        delete_first_10 = False # needed for inference
+
+        ### some settings for recording ###
+        client.set_replayer_time_factor(fps_factor) #--> changes the framerate !!!
+        # 1 --> normal speed, 2 --> double speed, 0.5 --> 1/2 speed
+        # 10 --> of 1fps is needed
+        sc.open_trajectories(scene, file.split('.')[0])   # collect_trajectories streams into it
+
+        with CarlaSyncMode(world, camera, segm, lidar, depth, bird, bird_sem, fps=fps_stat) as sync_mode:
+            data = sync_mode.warm_up(timeout=2.0)   # the first complete tick is the first frame
+            timer.lap('sensor warm-up')
+            while True:
+                if frame == 5 and delete_first_10: # overrides the first 10 images, because the first ones are damaged
+                    stage.wait()    # the first frames have to be written before they are overwritten
+                    frame =1
+                    delete_first_10 = False
+                snapshot, image_rgb, image_semseg, lidar_pc, image_depth, img_bird, img_bird_segm = data
+                ### encoded and written by the writer threads, the next tick does not wait for it
+                stage.submit(data, os.path.join(path, scene), file.split('.')[0], frame)
+                # img_inst.save_to_disk(os.path.join(path, scene, '03_inseg_cs', file.split('.')[0], '{0:05d}.png'.format(frame)), carla.ColorConverter.CityScapesPalette)
+                # lidar_pc.save_to_disk(os.path.join(path, scene, '04_lidar', '{0:05d}'.format(frame)))
+                # image_depth.save_to_disk(os.path.join(path, scene, '06_depth_log', file.split('.')[0], '{0:05d}.png'.format(frame)), carla.ColorConverter.LogarithmicDepth)
+                #------------------ radar --------------------------------------------------
+                # radar_data.collect(radar_pc)
+                # Process each Frame
+                # for radar_measurement in radar_data:
+                #     points = rd.polar_to_cartesian(radar_measurement, transform_radar.location)
+                #     rd.save_to_disk(points, os.path.join(path, scene, '05_radar', '{0:05d}.ply'.format(frame))) 
+                #     radar_data.clear()       
+                #----------------------------------------------------------------------------
+
+                # bboxes = bb.on_tick(snapshot = snapshot, image_semseg = image_semseg, image_depth = image_depth)
+                # sc.collect_trajectories(vehicle, snapshot, world, fps = fps_factor/10, bboxes = bboxes, radius = radius) # maybe fps needs to be adjusted
+                # with open(os.path.join(path, scene, '07_bboxes', '{0:05d}.json'.format(frame)), 'w') as file:
+                #     json.dump(bboxes[0], file, indent = 2)
+
+                if frame > 29: # save 30 images --> 10fps
+                    stage.close()   # all frames are written (and the pack is closed) before the job is done
+                    sc.save_trajectories_json(scene, file.split('.')[0])
+                    timer.lap('capture')
+                    break
+                frame +=1
+                data = sync_mode.tick(timeout=2.0) #--> timeout: Dauer die gewartet werden soll, dass der Sensor Daten sendet
+                # last_loc = save_csv_post(world.get_actor(ego_id), world.get_actors(), radius, frame, start, last_loc, path)
+                # frame += 1
+                # get_snapshot_vehicles(world, path, str(image_rgb.frame))
+                # image_depth.save_to_disk('output/depth-{0:06d}.png'.format(image_depth.frame), carla.ColorConverter.LogarithmicDepth)
+    finally:
+        sc.close_trajectories()
+        for sensor in sensor_list:
+            sensor.destroy()
+    return timer
+
+
+def add_jobs(manifest, path):
+    """
+    adds one job per (scene, recording file), scenes without recordings are skipped
+    """
+    for scene in sorted(os.listdir(path)):
+        if not os.path.isdir(os.path.join(path, scene)):
+            continue
+        recorded_files = get_recordings(scene, path)
+        if not recorded_files:
+            print(f'{scene}: no recorded file available, skipped')
+            continue
+        manifest.add(scene, recorded_files)
+
+
+def work(folder_name, host='localhost', port=2000):
+    """
+    runs the pending jobs of the manifest on the CARLA server at host:port until none is left
+    a failed job is marked as failed and the next job is started, a scene is moved to the "done" 
+    folder when all its jobs are done
+    """
+    cur_dir = os.path.dirname(__file__)
+    path = os.path.join(cur_dir, 'output', folder_name)
+    manifest = JobManifest(os.path.join(cur_dir, 'output', f'{folder_name}_jobs.json'))
+    writer = None
+    timers = PhaseTimer()
+
+    try:
+        client = carla.Client(host, port, worker_threads=1)
         client.set_timeout(60.0)
         world = client.get_world()
-    
-        cur_dir = os.path.dirname(__file__)
-        path = os.path.join(cur_dir, 'output', folder_name)
-        
-        sc = SaveContext(path)
-
-        camera_bp, segm_bp, lidar_bp, depth_bp = sensor_settings(world)
-
-        for i, scene in enumerate(sorted(os.listdir(path))):
-            recorded_files = get_recordings(scene, path)
-            if not recorded_files:
-                print('no recorded file available')
-                exit(1)
-            for file in recorded_files:
-                sensor_list = []
-                ### get ego id
-                if not os.path.exists(os.path.join(path, scene, '00_log', 'context.json')):
-                    with open(os.path.join(path, scene, '00_log', 'ego_id.txt')) as f:
-                        lines = f.readlines()
-                        ego_id = int(lines[0])
-                else:
-                    with open(os.path.join(path, scene, '00_log', 'context.json')) as f:
-                        json_data = json.load(f)
-                        ego_id = json_data['ego_vehicle']['id']
-                
-                path_rec_file = os.path.join(path, scene, '00_log', file)
-                considered_time_period = 9
-                client.replay_file(path_rec_file, -considered_time_period, 0, ego_id) # (file, start [s], duration [s], actor id)
-                time.sleep(1)
-                ### load the weather settings
-                load_weather(world, path, scene)
-                time.sleep(1)
-                               
-
-                vehicle = world.get_actor(ego_id)
-                transform = carla.Transform(carla.Location(x=1.6, z=1.7))
-                transform_lidar = transform
-                
-                transform_bird = carla.Transform(carla.Location(x=0.0, z=35.0), carla.Rotation(pitch=-90))
-
-                camera = world.spawn_actor(camera_bp, transform, attach_to=vehicle)
-                sensor_list.append(camera)
-
-                segm = world.spawn_actor(segm_bp, transform, attach_to=vehicle)
-                sensor_list.append(segm)
-
-                lidar = world.spawn_actor(lidar_bp, transform_lidar, attach_to=vehicle)
-                sensor_list.append(lidar)
-
-                depth = world.spawn_actor(depth_bp, transform, attach_to=vehicle)
-                sensor_list.append(depth)
-
-                ### inference - usable with CARLA 0.9.13+ ###
-                # inst = world.spawn_actor(inst_bp, transform, attach_to=vehicle)
-                # sensor_list.append(inst)
-
-                ### radar ###
-                # transform_radar = transform
-                # radar = world.spawn_actor(radar_bp, transform_radar, attach_to=vehicle)
-                # sensor_list.append(radar)
-
-                
-                ### birds-eye-view ###
-                bird = world.spawn_actor(camera_bp, transform_bird, 
-                                            attach_to=vehicle, attachment_type=carla.AttachmentType.Rigid)
-                sensor_list.append(bird)
-                bird_sem = world.spawn_actor(segm_bp, transform_bird, 
-                                            attach_to=vehicle, attachment_type=carla.AttachmentType.Rigid)
-                sensor_list.append(bird_sem)
-
-                time.sleep(1)
-                sc.sensor_settings(sensor_list, transform)
-                sc.sensor_locations(world, sensor_list)
-                sc.save_json_post(scene)
-                
-                #------- initializing bboxes and radar_data---------
-                # bb = BoundingBoxes.BoundingBoxes(world, depth, width, height)
-                # radar_data = rd.SensorData()
-                #---------------------------------------------------
-
-                fps_stat = 1 #--> changes not the framerate
-                fps_factor = 1
-                last_loc = {}
-                radius = 15
-                frame = 1  
-                start = time.time()
-                delete_first_10 = False # needed for inference
-
-                ### some settings for recording ###
-                client.set_replayer_time_factor(fps_factor) #--> changes the framerate !!!
-                # 1 --> normal speed, 2 --> double speed, 0.5 --> 1/2 speed
-                # 10 --> of 1fps is needed
-                
-                with CarlaSyncMode(world, camera, segm, lidar, depth, bird, bird_sem, fps=fps_stat) as sync_mode:
-                    while True:
-                        if frame == 5 and delete_first_10: # overrides the first 10 images, because the first ones are damaged
-                            frame =1
-                            delete_first_10 = False
-                        snapshot, image_rgb, image_semseg, lidar_pc, image_depth, img_bird, img_bird_segm= sync_mode.tick(timeout=2.0) #--> timeout: Dauer die gewartet werden soll, dass der Sensor Daten sendet
-                        image_rgb.save_to_disk(os.path.join(path, scene, '01_cam', file.split('.')[0], '{0:05d}.png'.format(frame)))
-                        image_semseg.save_to_disk(os.path.join(path, scene, '02_semseg_cs', file.split('.')[0], '{0:05d}.png'.format(frame)), carla.ColorConverter.CityScapesPalette)
-                        image_semseg.save_to_disk(os.path.join(path, scene, '02_semseg_raw', file.split('.')[0], '{0:05d}.png'.format(frame)))
-                        # img_inst.save_to_disk(os.path.join(path, scene, '03_inseg_raw', file.split('.')[0], '{0:05d}.png'.format(frame)))
-                        # img_inst.save_to_disk(os.path.join(path, scene, '03_inseg_cs', file.split('.')[0], '{0:05d}.png'.format(frame)), carla.ColorConverter.CityScapesPalette)
-                        # lidar_save(os.path.join(path, scene, '04_lidar', file.split('.')[0], '{0:05d}.npz'.format(frame)), image_depth, image_semseg)
-                        # lidar_pc.save_to_disk(os.path.join(path, scene, '04_lidar', '{0:05d}'.format(frame)))
-                        image_depth.save_to_disk(os.path.join(path, scene, '06_depth_raw', file.split('.')[0], '{0:05d}.png'.format(frame)))
-                        # image_depth.save_to_disk(os.path.join(path, scene, '06_depth_log', file.split('.')[0], '{0:05d}.png'.format(frame)), carla.ColorConverter.LogarithmicDepth)
-                        img_bird.save_to_disk(os.path.join(path, scene, '12_bird', '01_cam', file.split('.')[0], '{0:05d}.png'.format(frame)))
-                        img_bird_segm.save_to_disk(os.path.join(path, scene, '12_bird', '02_semseg_cs', file.split('.')[0], '{0:05d}.png'.format(frame)), carla.ColorConverter.CityScapesPalette)
-                        #------------------ radar --------------------------------------------------
-                        # radar_data.collect(radar_pc)
-                        # Process each Frame
-                        # for radar_measurement in radar_data:
-                        #     points = rd.polar_to_cartesian(radar_measurement, transform_radar.location)
-                        #     rd.save_to_disk(points, os.path.join(path, scene, '05_radar', '{0:05d}.ply'.format(frame))) 
-                        #     radar_data.clear()       
-                        #----------------------------------------------------------------------------
-
-                        # bboxes = bb.on_tick(snapshot = snapshot, image_semseg = image_semseg, image_depth = image_depth)
-                        # sc.collect_trajectories(vehicle, snapshot, world, fps = fps_factor/10, bboxes = bboxes, radius = radius) # maybe fps needs to be adjusted
-                        # with open(os.path.join(path, scene, '07_bboxes', '{0:05d}.json'.format(frame)), 'w') as file:
-                        #     json.dump(bboxes[0], file, indent = 2)
-
-                        if frame > 29: # save 30 images --> 10fps
-                            sc.save_trajectories_json(scene, file.split('.')[0])
-                            ### move folder to "done" folder
-                            path_tmp = path.split(f'/{folder_name}')[0]
-                            shutil.move(os.path.join(path, scene), os.path.join(path_tmp, 'done'))
-                            break
-                        frame +=1
-                        # last_loc = save_csv_post(world.get_actor(ego_id), world.get_actors(), radius, frame, start, last_loc, path)
-                        # frame += 1
-                        # get_snapshot_vehicles(world, path, str(image_rgb.frame))
-                        # image_depth.save_to_disk('output/depth-{0:06d}.png'.format(image_depth.frame), carla.ColorConverter.LogarithmicDepth)
-
-                # carla_proc, client, world = restart_carla_world(carla_proc, sensor_list)
-        
-        # kill_carla_world(carla_proc, sensor_list)
-    
+
+        blueprints = sensor_settings(world)
+
+        ### sinks of the sensor data: (index in the tick data, sink), encoded and written by a bounded pool
+        writer = AsyncWriter(cfg.writer_workers, cfg.writer_max_pending)
+        sinks = [
+            (1, PngSink('01_cam')),
+            (2, LabelSink('02_semseg_raw')),
+            # (3, InstanceSink('03_inseg_raw')),
+            (5, PngSink(os.path.join('12_bird', '01_cam'))),
+            (6, LabelSink(os.path.join('12_bird', '02_semseg_raw'))),
+        ]
+        if cfg.depth_format == 'png':
+            sinks.append((4, PngSink('06_depth_raw')))
+        else:
+            ### decoded once, the depth in m (mm) is stored compressed (06_depth/<recording>/<frame>.npz)
+            sinks.append((4, DepthSink('06_depth', cfg.depth_format)))
+        if cfg.semseg_colorized:
+            ### otherwise the colored images are derived from the labels by supplement/colorize_semseg.py
+            sinks += [(2, CityScapesSink('02_semseg_cs')), (6, CityScapesSink(os.path.join('12_bird', '02_semseg_cs')))]
+        if cfg.frame_storage == 'pack':
+            ### one file per recording (<scene>/<recording>.pack) instead of one png per sensor and frame
+            packs = FramePacks(cfg.pack_codec)
+            sinks = [(index, PackSink(sink, packs)) for index, sink in sinks]
+        if cfg.depth_lidar is not None:
+            ### labeled point cloud of the depth and semseg camera (04_lidar/<recording>/<frame>.npz or .bin)
+            lidar = None
+            if cfg.depth_lidar_rays:
+                lidar_bp = blueprints[2]
+                channels = lidar_bp.get_attribute('channels').as_int()
+                points_per_rotation = lidar_bp.get_attribute('points_per_second').as_int() / lidar_bp.get_attribute('rotation_frequency').as_float()
+                lidar = {'channels': channels, 
+                         'upper_fov': lidar_bp.get_attribute('upper_fov').as_float(), 
+                         'lower_fov': lidar_bp.get_attribute('lower_fov').as_float(),
+                         'points_per_channel': int(points_per_rotation / channels)}
+            sinks.append(((4, 2), DepthLidarSink('04_lidar', fov, cfg.depth_lidar, lidar)))
+        stage = SinkStage(writer, sinks)
+
+        while True:
+            job = manifest.claim(port)
+            if job is None:
+                break
+            scene, file = job['scene'], job['file']
+            print(f'[{port}] {scene}/{file}')
+            try:
+                timer = extract(client, world, path, scene, file, blueprints, stage)
+                print(f'[{port}] {scene}/{file}: {timer.report()}')
+                timers.add(timer)
+                scene_done = manifest.finish(job)
+            except Exception as error:
+                stage.discard()
+                print(f'[{port}] {scene}/{file} failed: {error!r}')
+                manifest.finish(job, error=repr(error))
+                continue
+            if scene_done:
+                ### move folder to "done" folder
+                done = os.path.join(os.path.dirname(path), 'done')
+                os.makedirs(done, exist_ok=True)
+                shutil.move(os.path.join(path, scene), done)
+
+            # carla_proc, client, world = restart_carla_world(carla_proc, sensor_list)
     finally:
+        if writer is not None:
+            writer.shutdown(wait=True)
+        if timers.jobs:
+            print(f'[{port}] {timers.jobs} recordings: {timers.report()}')
+
+
+def main(folder_name, host='localhost', ports=(2000,), retry_failed=False):
+    """
+    extracts the corner cases of all recordings in output/<folder_name>, one worker process per CARLA server
+    the state of the jobs is kept in output/<folder_name>_jobs.json, an interrupted run continues with the
+    jobs which are not done yet
+    """
+    start_cc = time.time()
+    cur_dir = os.path.dirname(__file__)
+    manifest = JobManifest(os.path.join(cur_dir, 'output', f'{folder_name}_jobs.json'))
+    add_jobs(manifest, os.path.join(cur_dir, 'output', folder_name))
+    manifest.reset(retry_failed)
+    print(f'jobs: {manifest.summary()}')
+
+    ### start carla world
+    # carla_proc = subprocess.Popen(['./CarlaUE4.sh', '-RenderOffScreen'], cwd=cfg.path_carla, preexec_fn=os.setsid) 
+    # carla_proc = subprocess.Popen('./CarlaUE4.sh', cwd=cfg.path_carla, preexec_fn=os.setsid) 
+    # time.sleep(10)
+    try:
+        if len(ports) == 1:
+            work(folder_name, host, ports[0])
+        else:
+            workers = [Process(target=work, args=(folder_name, host, port), name=f'save_cc_{port}') for port in ports]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
         # kill_carla_world(carla_proc, sensor_list)
+    finally:
+        print(f'jobs: {manifest.summary()}')
         print("Finished")
         print(f'total time: {time.time()-start_cc:.2f}s = {(time.time()-start_cc)/60:.2f}min = {(time.time()-start_cc)/3600:.2f}h')
 
 if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Corner Case Retrieval')
+    argparser.add_argument('--folders', nargs='+', default=['recordings'], help='folders of the recordings within the output folder')
+    argparser.add_argument('--host', default='localhost', help='IP of the CARLA servers (default: localhost)')
+    argparser.add_argument('--ports', nargs='+', type=int, default=[2000], help='ports of the CARLA servers, one worker per server (default: 2000)')
+    argparser.add_argument('--retry-failed', action='store_true', help='runs the failed jobs again')
+    args = argparser.parse_args()
     try:
-        list_rec = ['recordings']
-        for folder_name in list_rec:
-            main(folder_name)
+        for folder_name in args.folders:
+            main(folder_name, args.host, args.ports, args.retry_failed)
     except KeyboardInterrupt:
         pass
     finally:
-        print('\ndone.')
\ No newline at end of file
+        print('\ndone.')
@@ -20,6 +20,9 @@ except IndexError:
 
 import carla
 
+from utils.depth import decode_depth
+
+
 def from_buffer(sensor_data):
     image = np.frombuffer(sensor_data.raw_data, dtype=np.dtype("uint8"))
     return np.reshape(image, (sensor_data.height, sensor_data.width, 4))
@@ -72,14 +75,8 @@ class BoundingBoxes:
         walker_mask = cv2.inRange(semantic_image, 4, 4)
         vehicle_mask = cv2.inRange(semantic_image, 10, 10)
 
-        depth_information_32 = depth_information.astype(np.dtype('uint32'))
-        depth_information_32[..., 0] <<= 16
-        depth_information_32[..., 1] <<= 8
-
         # Create array of actual distances for each pixel
-        # np.bitwise_or() is ~ 15% faster compared to np.sum()
-        distance = np.bitwise_or(depth_information_32[..., 0], depth_information_32[..., 1])
-        distance = np.bitwise_or(distance, depth_information_32[..., 2]) * (1000 / 16777215)
+        distance = decode_depth(from_buffer(image_depth))
         reshaped_distance = distance.flatten()
 
         # cc_depth = carla.ColorConverter.Depth  # Not good on close distances
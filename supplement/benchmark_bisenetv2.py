@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+memory and CPU latency of BiSeNetV2 built for training (four auxiliary heads) and built for
+inference with models.bisenetv2.bisenetv2_inference (main head only, 'eval' and 'pred' mode)
+
+    python supplement/benchmark_bisenetv2.py --width 1280 --height 640
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+
+from models.bisenetv2 import BiSeNetV2, bisenetv2_inference
+from utils.carla_dataloader import Carla
+
+
+def class_map(network, x):
+    out = network(x)
+    if isinstance(out, (tuple, list)):
+        out = out[0]
+    return out if out.dim() == 3 else out.argmax(dim=1)
+
+
+def measure(network, x, iterations):
+    """
+    :return: latency [ms] and memory allocated per forward pass [MB]
+    """
+    with torch.inference_mode():
+        class_map(network, x)   # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            class_map(network, x)
+        latency = (time.perf_counter() - start) / iterations * 1000
+        with torch.autograd.profiler.profile(profile_memory=True) as prof:
+            class_map(network, x)
+    allocated = sum(max(event.self_cpu_memory_usage, 0) for event in prof.function_events)
+    return latency, allocated / 2**20
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=' '.join(__doc__.strip().split('\n\n')[0].split()))
+    argparser.add_argument('--width', type=int, default=1280)
+    argparser.add_argument('--height', type=int, default=640)
+    argparser.add_argument('-n', '--iterations', type=int, default=5)
+    args = argparser.parse_args()
+
+    train = BiSeNetV2(n_classes=Carla.num_train_ids).eval()
+    state_dict = train.state_dict()     # stands in for a training checkpoint
+    variants = [
+        ('train (aux heads)',   train),
+        ('inference, eval',     bisenetv2_inference(Carla.num_train_ids, state_dict, 'eval')),
+        ('inference, pred',     bisenetv2_inference(Carla.num_train_ids, state_dict, 'pred'))]
+
+    x = torch.randn(1, 3, args.height, args.width)
+    with torch.inference_mode():
+        reference = class_map(train, x)
+    print(f'BiSeNetV2 {args.width}x{args.height}')
+    print(f'{"":<22}{"parameters [MB]":>17}{"latency [ms]":>14}{"allocated [MB]":>16}{"same output":>13}')
+    for name, network in variants:
+        params = sum(p.numel() * p.element_size() for p in network.parameters()) / 2**20
+        latency, allocated = measure(network, x, args.iterations)
+        with torch.inference_mode():
+            same = bool((class_map(network, x) == reference).all())
+        print(f'{name:<22}{params:>17.2f}{latency:>14.2f}{allocated:>16.1f}{str(same):>13}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+parity check and CPU latency benchmark of the deployment build (utils.deploy) against the eager network
+
+the deployment variants fold the batch norms into the convolutions and run under inference mode,
+optionally with channels last memory format and TorchScript tracing / torch.compile
+
+    python supplement/benchmark_deploy.py --model fast_scnn --sizes 1280x640 3840x1080
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+
+from models.fast_scnn import FastSCNN
+from models.bisenetv2 import BiSeNetV2
+from utils.carla_dataloader import Carla
+from utils.deploy import deploy
+
+try:
+    import config as cfg
+    default_sizes = [f'{cfg.width}x{cfg.height}']
+except ImportError:     # config needs the carla module
+    default_sizes = ['1280x640']
+
+
+def build_network(model_name, ckpt=None):
+    """
+    :param ckpt: path of a checkpoint, otherwise the batch norm statistics are randomized 
+                 so that the folding is actually tested
+    """
+    if model_name == 'fast_scnn':
+        network = FastSCNN(in_channels=3, num_classes=Carla.num_train_ids)
+    else:
+        network = BiSeNetV2(n_classes=Carla.num_train_ids, aux_mode='eval')
+    if ckpt is not None:
+        network.load_state_dict(torch.load(ckpt, map_location='cpu'), strict=False)
+    else:
+        for module in network.modules():
+            if isinstance(module, torch.nn.BatchNorm2d):
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2.)
+                module.weight.data.uniform_(0.5, 1.5)
+                module.bias.data.uniform_(-0.5, 0.5)
+    return network.eval()
+
+
+def logits(network, x):
+    out = network(x)
+    return out[0] if isinstance(out, (tuple, list)) else out
+
+
+def latency(network, x, iterations):
+    with torch.inference_mode():
+        logits(network, x)      # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            logits(network, x)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--model', default='fast_scnn', choices=['fast_scnn', 'bisenetv2'])
+    argparser.add_argument('--ckpt', default=None, help='path of a checkpoint (default: random weights)')
+    argparser.add_argument('--sizes', nargs='+', default=default_sizes, help='input sizes WIDTHxHEIGHT')
+    argparser.add_argument('-n', '--iterations', type=int, default=10)
+    argparser.add_argument('--threads', type=int, default=None, help='number of CPU threads')
+    args = argparser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    eager = build_network(args.model, args.ckpt)
+    for size in args.sizes:
+        width, height = [int(v) for v in size.split('x')]
+        x = torch.randn(1, 3, height, width)
+        variants = [
+            ('eager',                       lambda: eager),
+            ('fused',                       lambda: deploy(copy.deepcopy(eager))),
+            ('fused + channels last',       lambda: deploy(copy.deepcopy(eager), channels_last=True)),
+            ('fused + trace',               lambda: deploy(copy.deepcopy(eager), x, jit='trace')),
+            ('fused + channels last + trace', lambda: deploy(copy.deepcopy(eager), x, channels_last=True, jit='trace'))]
+
+        with torch.no_grad():
+            reference = logits(eager, x)
+        print(f'\n{args.model} {width}x{height}')
+        print(f'{"":<32}{"latency [ms]":>14}{"max abs diff":>16}{"argmax agreement":>18}')
+        for name, build in variants:
+            network = build()
+            x_in = x.contiguous(memory_format=torch.channels_last) if 'channels last' in name else x
+            with torch.inference_mode():
+                out = logits(network, x_in)
+            diff = (out - reference).abs().max().item()
+            agreement = (out.argmax(dim=1) == reference.argmax(dim=1)).float().mean().item()
+            print(f'{name:<32}{latency(network, x_in, args.iterations):>14.2f}{diff:>16.2e}{agreement:>18.4%}')
+            assert agreement > 0.999, f'{name} differs from the eager network'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+decode and storage cost of the depth camera: 24 bit encoded png (06_depth_raw) against decoded npz (06_depth)
+
+decodes a synthetic depth frame (road plane, sky at the far plane and some boxes) with the former channel
+shifts (BoundingBoxes.on_tick), the former matrix product (lidar_save) and utils.depth.decode_depth, then
+writes and reads it back as png (decoded on every read) and as npz in each depth format
+
+    python supplement/benchmark_depth.py --width 1920 --height 1080
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from utils.depth import DEPTH_FORMATS, SCALE, decode_depth, load_depth, save_depth
+
+
+def synthetic_depth(height, width):
+    """
+    :return: depth (H, W) in m and its carla encoding (H, W, 4) BGRA
+    """
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    horizon = height / 2
+    depth = np.full((height, width), 1000.)
+    below = y > horizon
+    depth[below] = 1.7 * (width / 2) / (y[below] - horizon)     # road plane, camera 1.7 m above the ground
+    for i in range(8):
+        x0, y0 = int(width * (0.1 + 0.1 * i)), int(horizon - height * 0.05)
+        depth[y0:y0 + height // 8, x0:x0 + width // 16] = 5. + 7 * i
+    depth = np.minimum(depth, 1000.)
+    encoded = np.round(depth / SCALE).astype(np.uint32)
+    bgra = np.dstack([encoded >> 16, (encoded >> 8) & 255, encoded & 255, np.full_like(encoded, 255)]).astype(np.uint8)
+    return depth, bgra
+
+
+def decode_shifts(bgra):
+    depth = bgra[..., :3].astype(np.dtype('uint32'))
+    depth[..., 0] <<= 16
+    depth[..., 1] <<= 8
+    distance = np.bitwise_or(depth[..., 0], depth[..., 1])
+    return np.bitwise_or(distance, depth[..., 2]) * (1000 / 16777215)
+
+
+def decode_matmul(bgra):
+    convert = np.array([256 * 256, 256, 1], dtype=float)    # B, G, R (the former lidar_save used R, G, B)
+    convert *= 1000 / (256 * 256 * 256 - 1)
+    return bgra[..., :3] @ convert
+
+
+def timeit(function, repeat):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--width', type=int, default=1920)
+    argparser.add_argument('--height', type=int, default=1080)
+    argparser.add_argument('-n', '--repeat', type=int, default=10)
+    args = argparser.parse_args()
+
+    depth, bgra = synthetic_depth(args.height, args.width)
+    print(f'{args.width}x{args.height}')
+    print(f'{"decode":>16}{"[ms]":>8}{"max error [m]":>16}')
+    decoders = [('shifts', lambda: decode_shifts(bgra)), ('matmul', lambda: decode_matmul(bgra))]
+    decoders += [(depth_format, lambda depth_format=depth_format: decode_depth(bgra, depth_format)) for depth_format in DEPTH_FORMATS]
+    for name, decoder in decoders:
+        elapsed, result = timeit(decoder, args.repeat)
+        result = result.astype(np.float64) / (1000 if result.dtype == np.uint16 else 1)
+        error = np.abs(result - depth)[depth < (65.535 if name == 'mm' else 1000)].max()
+        print(f'{name:>16}{elapsed:>8.2f}{error:>16.4f}')
+
+    folder = tempfile.mkdtemp()
+    print(f'\n{"storage":>16}{"size [KB]":>11}{"write [ms]":>12}{"read [ms]":>11}{"max error [m]":>16}')
+    try:
+        path = os.path.join(folder, 'depth.png')
+        write, _ = timeit(lambda: cv2.imwrite(path, bgra), args.repeat)
+        read, result = timeit(lambda: load_depth(path), args.repeat)
+        error = np.abs(result - depth).max()
+        print(f'{"png":>16}{os.path.getsize(path) / 1024:>11.0f}{write:>12.2f}{read:>11.2f}{error:>16.4f}')
+        for depth_format in DEPTH_FORMATS:
+            path = os.path.join(folder, f'depth_{depth_format}.npz')
+            write, _ = timeit(lambda: save_depth(path, decode_depth(bgra, depth_format)), args.repeat)
+            read, result = timeit(lambda: load_depth(path), args.repeat)
+            valid = depth < (65.535 if depth_format == 'mm' else 1000)
+            error = np.abs(result - depth)[valid].max()
+            print(f'{"npz " + depth_format:>16}{os.path.getsize(path) / 1024:>11.0f}{write:>12.2f}{read:>11.2f}{error:>16.4f}')
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+throughput of the labeled point clouds from the depth and semantic segmentation camera (utils.depth_lidar)
+
+synthetic frames (road plane, sky and boxes at random depths, random labels), no CARLA server needed;
+reports the points per second of the projection for every pixel and for the rays of the lidar of save_cc.py,
+and the time to write the point clouds as npz and bin
+
+    python supplement/benchmark_depth_lidar.py --width 1920 --height 1080
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.depth_lidar import depth_to_points, lidar_pixels, ray_table, save_points
+
+
+def synthetic_frame(height, width, seed=0):
+    """
+    :return: depth (H, W) float32 in m, carla ids (H, W) uint8
+    """
+    rng = np.random.RandomState(seed)
+    y = np.arange(height, dtype=np.float32)[:, None]
+    depth = np.full((height, width), 1000., dtype=np.float32)
+    below = np.broadcast_to(y > height / 2, (height, width))
+    depth[below] = np.broadcast_to(1.7 * (width / 2) / np.maximum(y - height / 2, 1), (height, width))[below]
+    labels = np.where(below, 7, 13).astype(np.uint8)    # road, sky
+    for _ in range(20):
+        x0, y0 = rng.randint(0, width - width // 10), rng.randint(height // 4, height // 2)
+        depth[y0:y0 + height // 6, x0:x0 + width // 10] = rng.uniform(3, 80)
+        labels[y0:y0 + height // 6, x0:x0 + width // 10] = rng.choice([1, 4, 10])
+    return depth, labels
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--width', type=int, default=1920)
+    argparser.add_argument('--height', type=int, default=1080)
+    argparser.add_argument('--fov', type=float, default=90.)
+    argparser.add_argument('--frames', type=int, default=20)
+    args = argparser.parse_args()
+
+    frames = [synthetic_frame(args.height, args.width, seed) for seed in range(args.frames)]
+    start = time.perf_counter()
+    ray_table(args.width, args.height, args.fov)
+    pixels = lidar_pixels(args.width, args.height, args.fov)
+    print(f'{args.width}x{args.height}, fov {args.fov}, ray tables: {(time.perf_counter() - start) * 1000:.1f}ms (once)')
+    print(f'{"sampling":>10}{"points/frame":>14}{"[ms/frame]":>12}{"Mpoints/s":>11}{"npz [ms]":>10}{"bin [ms]":>10}')
+    folder = tempfile.mkdtemp()
+    try:
+        for name, sampling in [('pixels', None), ('lidar', pixels)]:
+            start = time.perf_counter()
+            clouds = [depth_to_points(depth, labels, args.fov, sampling) for depth, labels in frames]
+            elapsed = (time.perf_counter() - start) / args.frames
+            points = np.mean([len(cloud[0]) for cloud in clouds])
+            writes = []
+            for ext in ['npz', 'bin']:
+                start = time.perf_counter()
+                for i, (cloud, labels) in enumerate(clouds):
+                    save_points(os.path.join(folder, f'{name}_{i:05d}.{ext}'), cloud, labels)
+                writes.append((time.perf_counter() - start) / args.frames * 1000)
+            print(f'{name:>10}{points:>14.0f}{elapsed * 1000:>12.2f}{points / elapsed / 1e6:>11.1f}{writes[0]:>10.2f}{writes[1]:>10.2f}')
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+write and read throughput of the frame storage of save_cc.py: png folders against frame packs
+
+writes synthetic recordings (camera, semantic segmentation, depth and the birds-eye-view sensors of save_cc.py)
+through the SinkStage of save_cc.py, once as png files and once as packs for each codec, and reads the camera
+frames and the ground truth back with CarlaRecording in a DataLoader
+
+    python supplement/benchmark_framepack.py --width 1920 --height 1080 --recordings 4
+    python supplement/benchmark_framepack.py --codecs none lz4 --loader-workers 4
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from torch.utils.data import DataLoader
+
+from utils.carla_dataloader import CarlaRecording, Frame
+from utils.sinks import PngSink, LabelSink, FramePacks, PackSink, SinkStage
+from utils.writer import AsyncWriter
+
+
+def sinks():
+    return [
+        (1, PngSink('01_cam')),
+        (2, LabelSink('02_semseg_raw')),
+        (4, PngSink('06_depth_raw')),
+        (5, PngSink(os.path.join('12_bird', '01_cam'))),
+        (6, LabelSink(os.path.join('12_bird', '02_semseg_raw'))),
+    ]
+
+
+def synthetic_tick(height, width, frame):
+    """
+    sensor data of a tick (snapshot, rgb, semseg, lidar, depth, bird, bird_sem) with some image structure,
+    so the compression is not measured on noise
+    """
+    y, x = np.mgrid[0:height, 0:width]
+    shift = 4 * frame
+    rgb = np.dstack([(x + shift) % 256, (y + shift) % 256, (x + y) % 256]).astype(np.uint8)
+    rgb = cv2.add(rgb, np.random.randint(0, 8, rgb.shape, dtype=np.uint8))
+    ids = (((x + shift) // 97 + y // 61) % 23).astype(np.uint8)
+    semseg = np.dstack([ids, np.zeros_like(ids), np.zeros_like(ids)])
+    depth = np.dstack([(y * 255 // height), (x * 255 // width), np.full_like(x, 3)]).astype(np.uint8)
+    return [None, Frame(rgb), Frame(semseg), None, Frame(depth), Frame(rgb[::-1].copy()), Frame(semseg[::-1].copy())]
+
+
+def folder_size(root):
+    files = [path for path in glob.glob(os.path.join(root, '**', '*'), recursive=True) if os.path.isfile(path)]
+    return len(files), sum(os.path.getsize(path) for path in files)
+
+
+def write(root, ticks, recordings, storage, codec, workers):
+    """
+    :return: seconds
+    """
+    writer = AsyncWriter(workers, 64)
+    stage_sinks = sinks()
+    if storage == 'pack':
+        packs = FramePacks(codec)
+        stage_sinks = [(index, PackSink(sink, packs)) for index, sink in stage_sinks]
+    stage = SinkStage(writer, stage_sinks)
+    start = time.perf_counter()
+    for recording in range(recordings):
+        for frame, data in enumerate(ticks, 1):
+            stage.submit(data, root, f'scene_recording_{recording}', frame)
+        stage.close()
+    elapsed = time.perf_counter() - start
+    writer.shutdown()
+    return elapsed
+
+
+def read(root, storage, loader_workers):
+    """
+    :return: seconds of the listing, seconds of the reading, number of frames
+    """
+    start = time.perf_counter()
+    dataset = CarlaRecording(root, storage=storage)
+    listing = time.perf_counter() - start
+    loader = DataLoader(dataset, batch_size=None, num_workers=loader_workers)
+    start = time.perf_counter()
+    for image, target in loader:
+        pass
+    return listing, time.perf_counter() - start, len(dataset)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--width', type=int, default=1280)
+    argparser.add_argument('--height', type=int, default=720)
+    argparser.add_argument('--frames', type=int, default=30, help='frames per recording (save_cc.py: 30)')
+    argparser.add_argument('--recordings', type=int, default=2)
+    argparser.add_argument('--codecs', nargs='+', default=['none', 'lz4', 'png'], help='codecs of the packs')
+    argparser.add_argument('--workers', type=int, default=4, help='writer threads (config.writer_workers)')
+    argparser.add_argument('--loader-workers', type=int, default=0, help='DataLoader workers')
+    argparser.add_argument('--tmp', default=None, help='folder of the written recordings, default: system temp')
+    args = argparser.parse_args()
+
+    ticks = [synthetic_tick(args.height, args.width, frame) for frame in range(args.frames)]
+    raw_mb = args.frames * args.recordings * args.height * args.width * (3 * 4 + 2) / 2**20  # 3 BGRA images, 2 label maps
+    print(f'{args.recordings} recordings x {args.frames} frames x {len(sinks())} sensors, {args.width}x{args.height}, '
+          f'{raw_mb:.0f} MB raw')
+    print(f'{"storage":>10}{"files":>8}{"size [MB]":>11}{"write [s]":>11}{"write [MB/s]":>14}'
+          f'{"list [ms]":>11}{"read [frames/s]":>17}')
+    configurations = [('png', None)] + [('pack', None if codec == 'none' else codec) for codec in args.codecs]
+    for storage, codec in configurations:
+        root = tempfile.mkdtemp(dir=args.tmp)
+        try:
+            scene = os.path.join(root, 'scene_0000')
+            elapsed = write(scene, ticks, args.recordings, storage, codec, args.workers)
+            files, size = folder_size(root)
+            listing, reading, frames = read(root, storage, args.loader_workers)
+        finally:
+            shutil.rmtree(root)
+        name = storage if storage == 'png' else f'pack {codec}'
+        print(f'{name:>10}{files:>8}{size / 2**20:>11.1f}{elapsed:>11.2f}{raw_mb / elapsed:>14.1f}'
+              f'{listing * 1000:>11.1f}{frames / reading:>17.1f}')
+
+
+if __name__ == '__main__':
+    main()
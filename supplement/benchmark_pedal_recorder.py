@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+time per sample of the pedal telemetry: former pedal_tracking (csv append per call) vs utils.tracking.PedalRecorder
+
+the recorder is also run paced at --rate Hz to check that it keeps up with the sampling rate
+
+    python supplement/benchmark_pedal_recorder.py --samples 20000 --rate 1000 --seconds 3
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.tracking import PedalRecorder, read_pedal_log
+
+
+def legacy_pedal_tracking(path, throttle_sem, throttle_safety, brake_sem, brake_safety, timer):
+    """
+    former utils.tracking.pedal_tracking, without the folder scan of get_folder_name
+    """
+    fields = ["timer", "throttle_sem", "brake_sem", "throttle_safety", "brake_safety"]
+    throttle_sem = round((throttle_sem+0.049480200779342)/1.063121089866,2)
+    brake_sem=round((brake_sem+0.049480200779342)/1.063121089866,2)
+    throttle_safety=round((throttle_safety+0.049480200779342)/1.063121089866,2)
+    brake_safety=round((brake_safety+0.049480200779342)/1.063121089866,2)
+
+    row=[timer, throttle_sem, brake_sem, throttle_safety, brake_safety]
+    with open(os.path.join(path, '00_log', 'pedal_tracking.csv'), 'a') as file:
+        csvwriter = csv.writer(file)
+        if not os.path.exists(os.path.join(path, '00_log', 'pedal_tracking.csv')) or os.stat(os.path.join(path, '00_log', 'pedal_tracking.csv')).st_size == 0:
+            csvwriter.writerow(fields)
+        csvwriter.writerow(row)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--samples', type=int, default=20000)
+    argparser.add_argument('--rate', type=float, default=1000., help='sampling rate of the paced run [Hz]')
+    argparser.add_argument('--seconds', type=float, default=3.)
+    args = argparser.parse_args()
+    values = np.random.RandomState(0).uniform(-1, 1, (args.samples, 6)).tolist()
+
+    with tempfile.TemporaryDirectory() as path:
+        os.makedirs(os.path.join(path, '00_log'))
+        start = time.perf_counter()
+        for i, (t_sem, b_sem, t_safety, b_safety, _, _) in enumerate(values):
+            legacy_pedal_tracking(path, t_sem, t_safety, b_sem, b_safety, i / args.rate)
+        legacy = (time.perf_counter() - start) / args.samples
+
+        recorder = PedalRecorder(os.path.join(path, '00_log'))
+        start = time.perf_counter()
+        for i, sample in enumerate(values):
+            recorder.record(*sample, timer=i / args.rate)
+        buffered = (time.perf_counter() - start) / args.samples
+        recorder.close(export_csv=True)
+        stored = len(read_pedal_log(recorder.path))
+        print(f'pedal_tracking: {legacy * 1e6:.1f} us per sample')
+        print(f'PedalRecorder:  {buffered * 1e6:.1f} us per sample ({legacy / buffered:.0f}x), {stored} samples stored')
+
+        # paced run: one sample every 1 / rate seconds
+        recorder = PedalRecorder(os.path.join(path, '00_log'), flush_seconds=0.5)
+        period = 1. / args.rate
+        count, late, worst = 0, 0, 0.
+        begin = time.perf_counter()
+        deadline = begin
+        while deadline - begin < args.seconds:
+            while time.perf_counter() < deadline:
+                pass
+            sample = time.perf_counter()
+            recorder.record(*values[count % len(values)])
+            worst = max(worst, time.perf_counter() - sample)
+            late += time.perf_counter() - deadline > period
+            count += 1
+            deadline += period
+        recorder.close()
+        stored = len(read_pedal_log(recorder.path, recorder.first))
+        print(f'{args.rate:.0f} Hz for {args.seconds:.0f} s: {stored} of {count} samples stored, '
+              f'{late} late, slowest record() {worst * 1e6:.0f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+micro-benchmark of the preprocessing of a carla image for the segmentation networks (CPU)
+
+compares the former path of Inference.processing
+    frombuffer --> reshape --> slice --> channel flip --> copy --> ToTensor --> Normalize --> unsqueeze
+with utils.preprocessing.Preprocessing and reports latency and allocations per frame
+
+    python supplement/benchmark_preprocessing.py --width 1280 --height 640
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+from torchvision.transforms import Compose, Normalize, ToTensor
+
+from utils.carla_dataloader import Carla
+from utils.preprocessing import Preprocessing
+
+class Frame():
+    """
+    stands in for a carla image
+    """
+    def __init__(self, raw_data, height, width):
+        self.raw_data = raw_data
+        self.height = height
+        self.width = width
+
+
+def legacy_preprocessing(image, torch_transform):
+    array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
+    array = np.reshape(array, (image.height, image.width, 4))
+    array = array[:, :, :3]
+    array = array[:, :, ::-1]
+    img = array.copy()
+    return torch_transform(img).unsqueeze_(0)
+
+
+def measure(function, frame, iterations):
+    """
+    :return: latency [ms], peak numpy bytes, torch bytes and torch allocations per frame
+    """
+    function(frame)     # warm up, buffers are allocated here
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(frame)
+    latency = (time.perf_counter() - start) / iterations * 1000
+
+    tracemalloc.start()
+    for _ in range(iterations):
+        function(frame)
+    _, numpy_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with torch.autograd.profiler.profile(profile_memory=True) as prof:
+        for _ in range(iterations):
+            function(frame)
+    # allocations are attributed to the allocating op, scalars (< 1 kB) are ignored
+    allocations = [event.self_cpu_memory_usage for event in prof.function_events]
+    allocations = [size for size in allocations if size >= 1024]
+    return latency, numpy_bytes, sum(allocations) / iterations, len(allocations) / iterations
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--width', type=int, default=1280, help='frame width (default: 1280)')
+    argparser.add_argument('--height', type=int, default=640, help='frame height (default: 640)')
+    argparser.add_argument('-n', '--iterations', type=int, default=50, help='frames per measurement')
+    args = argparser.parse_args()
+
+    torch.set_grad_enabled(False)
+    raw = np.random.randint(0, 256, (args.height, args.width, 4), dtype=np.uint8)
+    frame = Frame(raw.tobytes(), args.height, args.width)
+
+    torch_transform = Compose([ToTensor(), Normalize(Carla.mean, Carla.std)])
+    preprocessing = Preprocessing(Carla.mean, Carla.std)
+    diff = (legacy_preprocessing(frame, torch_transform) - preprocessing(frame)).abs().max().item()
+    print(f'frame {args.width}x{args.height}, max abs difference: {diff:.2e}')
+
+    print(f'{"":<16}{"latency [ms]":>14}{"numpy peak [MB]":>18}{"torch [MB/frame]":>18}{"torch allocs/frame":>20}')
+    for name, function in [
+            ('legacy',          lambda f: legacy_preprocessing(f, torch_transform)),
+            ('Preprocessing',   preprocessing)]:
+        latency, numpy_bytes, torch_bytes, torch_allocs = measure(function, frame, args.iterations)
+        print(f'{name:<16}{latency:>14.2f}{numpy_bytes / 2**20:>18.2f}{torch_bytes / 2**20:>18.2f}{torch_allocs:>20.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+memory and throughput benchmark of the corner case history (QRecording)
+
+compares the former two queue.Queue (maskqueue, camqueue) with the history of QRecording (masks by reference,
+camera frames in a utils.ringbuffer.RingBuffer) for
+fps_server 20, save_seconds_before_cc 7 and several record_every_x_frames, reports the memory
+held by the history, the time per recorded frame and the time of a snapshot when a corner case is triggered
+
+    python supplement/benchmark_qrecording.py --width 1280 --height 640 --every 1 3 5
+"""
+import argparse
+import os
+import queue
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from utils.ringbuffer import RingBuffer, ReferenceRingBuffer
+
+
+class Frame():
+    """
+    stands in for a carla image
+    """
+    def __init__(self, raw_data, height, width):
+        self.raw_data = raw_data
+        self.height = height
+        self.width = width
+
+
+class LegacyHistory():
+    """
+    former history of QRecording: two queues with the references of the masks and carla images
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.maskqueue = queue.Queue(maxsize=capacity)
+        self.camqueue = queue.Queue(maxsize=capacity)
+        self.qitems = 0
+
+    def add(self, mask, image, frame):
+        if self.qitems < self.maskqueue.maxsize:
+            self.maskqueue.put(mask)
+            self.camqueue.put(image)
+            self.qitems += 1
+        else:
+            self.maskqueue.get()
+            self.camqueue.get()
+            self.maskqueue.put(mask)
+            self.camqueue.put(image)
+
+    def snapshot(self):
+        items = [(self.maskqueue.get(), self.camqueue.get()) for _ in range(self.qitems)]
+        self.maskqueue = queue.Queue(maxsize=self.capacity)
+        self.camqueue = queue.Queue(maxsize=self.capacity)
+        self.qitems = 0
+        return items
+
+
+class RingHistory():
+    """
+    history of QRecording: the masks by reference, the camera frames as rgb in a preallocated ring buffer
+    """
+    def __init__(self, capacity):
+        self.masks = ReferenceRingBuffer(capacity)
+        self.cams = RingBuffer(capacity)
+
+    def add(self, mask, image, frame):
+        bgra = np.frombuffer(image.raw_data, dtype=np.uint8).reshape(image.height, image.width, 4)
+        self.masks.push(mask, frame)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=self.cams.slot((image.height, image.width, 3), frame))
+
+    def snapshot(self):
+        items = self.masks.snapshot(), self.cams.snapshot()
+        self.masks.clear()
+        self.cams.recycle(items[1][0])     # QRecording: once the frames are written
+        return items
+
+
+def fill(history, every, frames, height, width):
+    """
+    :return: time per recorded frame [ms]
+    """
+    recorded, elapsed = 0, 0.
+    for frame in range(frames):
+        # every frame the sensor and the inference deliver new buffers
+        image = Frame(np.random.randint(0, 256, 16, dtype=np.uint8).repeat(height * width * 4 // 16).tobytes(), height, width)
+        mask = np.empty((height, width, 3), dtype=np.uint8)
+        if frame % every == 0:
+            start = time.perf_counter()
+            history.add(mask, image, frame)
+            elapsed += time.perf_counter() - start
+            recorded += 1
+        del image, mask
+    return elapsed / recorded * 1000
+
+
+def run(history_class, capacity, every, frames, height, width):
+    """
+    the history is filled, emptied by a corner case and filled again (the storage of the ring buffer is reused)
+    :return: held memory [MB], time per recorded frame of the first and the second fill [ms], snapshot time [ms]
+    """
+    tracemalloc.start()
+    history = history_class(capacity)
+    first = fill(history, every, frames, height, width)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    history.snapshot()
+    second = fill(history, every, frames, height, width)
+    start = time.perf_counter()
+    history.snapshot()
+    snapshot = time.perf_counter() - start
+    return held / 2**20, first, second, snapshot * 1000
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--width', type=int, default=1280)
+    argparser.add_argument('--height', type=int, default=640)
+    argparser.add_argument('--fps', type=int, default=20, help='fps_server')
+    argparser.add_argument('--seconds', type=int, default=7, help='save_seconds_before_cc')
+    argparser.add_argument('--every', nargs='+', type=int, default=[1, 2, 3, 5, 10], help='record_every_x_frames')
+    args = argparser.parse_args()
+
+    print(f'{args.width}x{args.height}, fps_server {args.fps}, save_seconds_before_cc {args.seconds}')
+    print(f'{"every":>6}{"frames":>8}{"":>8}{"memory [MB]":>14}{"add [ms]":>10}{"after cc":>10}{"frames/s":>10}{"snapshot [ms]":>15}')
+    for every in args.every:
+        capacity = args.seconds * args.fps // every + 1
+        frames = 2 * capacity * every    # the history is filled and overwritten once
+        for name, history_class in [('queue', LegacyHistory), ('ring', RingHistory)]:
+            memory, add, add_after_cc, snapshot = run(history_class, capacity, every, frames, args.height, args.width)
+            print(f'{every:>6}{capacity:>8}{name:>8}{memory:>14.1f}{add:>10.3f}{add_after_cc:>10.3f}{1000 / add:>10.0f}{snapshot:>15.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+latency and mIoU of the segmentation against the inference scale (config.inference_scale)
+
+the frames are downsampled to the inference resolution, the class maps are upsampled (nearest) back to the
+camera resolution, the mIoU over Carla.train_ids is computed at the camera resolution against the ground
+truth of recorded scenes (02_semseg_raw) or, without ground truth, against the prediction at scale 1.0
+
+    python supplement/benchmark_scale.py --ckpt clear_FastSCNN_origin --root output/scene_0001 --plot scale.png
+    python supplement/benchmark_scale.py --size 3840x1080      # random frames and weights, latency only
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+
+from models.fast_scnn import FastSCNN
+from utils.carla_dataloader import Carla, CarlaRecording, Frame
+from utils.deploy import deploy
+from utils.metrics import confusion_matrix, mean_iou
+from utils.networks import load_network
+from utils.preprocessing import Preprocessing, inference_size, upsample_nearest
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--ckpt', default=None, help='checkpoint name (weights/<ckpt>.pth), default: random FastSCNN')
+    argparser.add_argument('--root', default=None, help='recorded scene(s), default: random frames')
+    argparser.add_argument('--size', default='1280x640', help='WIDTHxHEIGHT of the random frames')
+    argparser.add_argument('--frames', type=int, default=50)
+    argparser.add_argument('--scales', nargs='+', type=float, default=[0.25, 0.375, 0.5, 0.75, 1.0])
+    argparser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    argparser.add_argument('--threads', type=int, default=None, help='number of CPU threads')
+    argparser.add_argument('--plot', default=None, help='saves the plot, e.g. scale.png')
+    args = argparser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    device = torch.device(args.device)
+
+    if args.ckpt is not None:
+        network = deploy(load_network(args.ckpt, device))
+    else:
+        network = deploy(FastSCNN(in_channels=3, num_classes=Carla.num_train_ids).to(device).eval())
+    if args.root is not None:
+        dataset = CarlaRecording(args.root, args.frames)
+        samples = [dataset[i] for i in range(len(dataset))]
+    else:
+        width, height = [int(v) for v in args.size.split('x')]
+        samples = [(np.random.randint(0, 256, (height, width, 3), dtype=np.uint8), None) for _ in range(args.frames)]
+    if not samples:
+        sys.exit(f'no recorded frames (01_cam) found in {args.root}')
+    frames = [Frame(image) for image, _ in samples]
+    has_gt = all(target is not None for _, target in samples)
+    height, width = frames[0].height, frames[0].width
+
+    results, reference = [], []
+    for scale in sorted(args.scales, key=lambda s: s != 1.0):   # scale 1.0 first, it is the reference without ground truth
+        preprocessing = Preprocessing(Carla.mean, Carla.std, device, scale)
+        conf = np.zeros((Carla.num_train_ids, Carla.num_train_ids), dtype=np.int64)
+        times = []
+        with torch.inference_mode():
+            network(preprocessing(frames[0]))    # warm up
+            for i, frame in enumerate(frames):
+                start = time.perf_counter()
+                out = network(preprocessing(frame))
+                out = out[0] if isinstance(out, (tuple, list)) else out
+                pred = upsample_nearest(out.argmax(dim=1).to(torch.uint8), (height, width))[0].cpu().numpy()
+                times.append(time.perf_counter() - start)
+                if scale == 1.0:
+                    reference.append(pred)
+                if has_gt:
+                    conf += confusion_matrix(pred, samples[i][1])
+                elif reference:
+                    conf += confusion_matrix(pred, reference[i])
+        miou = mean_iou(conf) if has_gt or reference else float('nan')
+        results.append((scale, inference_size(height, width, scale), np.mean(times) * 1000, miou))
+
+    results.sort()
+    print(f'{width}x{height}, {len(frames)} frames, mIoU vs {"ground truth" if has_gt else "scale 1.0"}')
+    print(f'{"scale":>8}{"inference":>14}{"latency [ms]":>14}{"fps":>8}{"mIoU":>8}')
+    for scale, (h, w), latency, miou in results:
+        print(f'{scale:>8.3f}{f"{w}x{h}":>14}{latency:>14.2f}{1000 / latency:>8.1f}{miou * 100:>8.2f}')
+
+    if args.plot is not None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        scales = [r[0] for r in results]
+        fig, ax_latency = plt.subplots()
+        ax_latency.plot(scales, [r[2] for r in results], 'o-', color='tab:blue')
+        ax_latency.set_xlabel('inference scale')
+        ax_latency.set_ylabel('latency [ms]', color='tab:blue')
+        ax_miou = ax_latency.twinx()
+        ax_miou.plot(scales, [r[3] * 100 for r in results], 's--', color='tab:red')
+        ax_miou.set_ylabel(f'mIoU vs {"ground truth" if has_gt else "scale 1.0"} [%]', color='tab:red')
+        ax_latency.set_title(f'{args.ckpt or "FastSCNN"} at {width}x{height}')
+        fig.tight_layout()
+        fig.savefig(args.plot)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+"""
+time per step of the trajectory collection (SaveContext.collect_trajectories) with synthetic actors
+
+compares the former per actor loop (world.get_actor, get_location and transform_to_geolocation per actor,
+linear search of the bounding boxes) with utils.trajectory.TrajectoryEngine on a stand-in of the carla world,
+snapshot and map, so no CARLA server is needed; the entries of both are compared as well
+
+    python supplement/benchmark_trajectory.py --actors 500 --steps 30
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.trajectory import EARTH_RADIUS_EQUA, TrajectoryEngine
+
+REFERENCE = (49.0, 8.0)
+TYPES = ['vehicle.tesla.model3', 'vehicle.mercedes.sprinter', 'vehicle.yamaha.yzf', 'vehicle.bh.crossbike',
+         'walker.pedestrian.0001', 'sensor.camera.rgb', 'traffic.traffic_light', 'static.prop.bench']
+
+
+#----------- stand-in of the carla API -----------
+class Location():
+    def __init__(self, x=0., y=0., z=0.):
+        self.x, self.y, self.z = x, y, z
+
+
+class Rotation():
+    def __init__(self, yaw=0.):
+        self.pitch, self.yaw, self.roll = 0., yaw, 0.
+
+
+class Transform():
+    def __init__(self, location, rotation):
+        self.location, self.rotation = location, rotation
+
+
+class GeoLocation():
+    def __init__(self, latitude, longitude):
+        self.latitude, self.longitude = latitude, longitude
+
+
+class Map():
+    def transform_to_geolocation(self, location):
+        lat0, lon0 = REFERENCE
+        scale = math.cos(math.radians(lat0))
+        mx = scale * math.radians(lon0) * EARTH_RADIUS_EQUA + location.x
+        my = scale * EARTH_RADIUS_EQUA * math.log(math.tan((90.0 + lat0) * math.pi / 360.0)) - location.y
+        lon = mx * 180.0 / (math.pi * EARTH_RADIUS_EQUA * scale)
+        lat = 360.0 * math.atan(math.exp(my / (EARTH_RADIUS_EQUA * scale))) / math.pi - 90.0
+        return GeoLocation(lat, lon)
+
+
+class Actor():
+    def __init__(self, actor_id, type_id, world):
+        self.id, self.type_id, self.world = actor_id, type_id, world
+
+    def get_transform(self):
+        x, y, z, yaw = self.world.poses[self.id]
+        return Transform(Location(x, y, z), Rotation(yaw))
+
+    def get_location(self):
+        return self.get_transform().location
+
+
+class ActorSnapshot():
+    def __init__(self, actor_id, pose):
+        self.id, self.pose = actor_id, pose
+
+    def get_transform(self):
+        x, y, z, yaw = self.pose
+        return Transform(Location(x, y, z), Rotation(yaw))
+
+
+class World():
+    def __init__(self, actors, seed=0):
+        rng = np.random.RandomState(seed)
+        self.actors = {i: Actor(i, TYPES[i % len(TYPES)] if i else TYPES[0], self) for i in range(actors)}
+        self.positions = rng.uniform(-30, 30, (actors, 3)) * [1, 1, 0.05]
+        self.velocities = rng.uniform(-3, 3, (actors, 3)) * [1, 1, 0]
+        self.yaws = rng.uniform(-180, 180, actors)
+        self.map = Map()
+        self.poses = {}
+        self.tick(0.)
+
+    def tick(self, dt):
+        self.positions += self.velocities * dt
+        self.poses = {i: tuple(self.positions[i]) + (self.yaws[i],) for i in self.actors}
+
+    def get_snapshot(self):
+        return [ActorSnapshot(i, pose) for i, pose in self.poses.items()]
+
+    def get_actor(self, actor_id):
+        return self.actors.get(actor_id)
+
+    def get_actors(self, actor_ids):
+        return [self.actors[i] for i in actor_ids if i in self.actors]
+
+    def get_map(self):
+        return self.map
+
+
+#----------- former SaveContext.collect_trajectories -----------
+class LegacyTrajectories():
+    def __init__(self):
+        self.age = {}
+        self.last_loc = {}
+
+    def step(self, ego_vehicle, snapshot, world, timestamp, bboxes, radius):
+        ego_car_location = ego_vehicle.get_location()
+        eclx, ecly = ego_car_location.x, ego_car_location.y
+        data_list = []
+        actors = [world.get_actor(actor_snapshot.id) for actor_snapshot in snapshot]
+        actors_in_scene = [actor for actor in actors
+                           if ((actor.get_location().x - eclx)**2 + (actor.get_location().y - ecly)**2)**0.5 < radius]
+        for actor in actors_in_scene:
+            if str(actor.type_id).startswith('vehicle') or str(actor.type_id).startswith('walker'):
+                transform = actor.get_transform()
+                geolocation = world.get_map().transform_to_geolocation(transform.location)
+                self.age[str(actor.id)] = self.age.get(str(actor.id), 0) + 1
+                if str(actor.type_id) in ["vehicle.mercedes.sprinter", "vehicle.volkswagen.t2", "vehicle.volkswagen.t2_2021", "vehicle.ford.ambulance"]:
+                    class_name1 = "van"
+                elif str(actor.type_id).startswith('walker'):
+                    class_name1 = "pedestrian"
+                elif str(actor.type_id) in ["vehicle.yamaha.yzf", "vehicle.vespa.zx125", "vehicle.kawasaki.ninja"]:
+                    class_name1 = "motorcycle"
+                elif str(actor.type_id) == "vehicle.bh.crossbike":
+                    class_name1 = "cyclist"
+                else:
+                    class_name1 = "car"
+                for i in range(len(bboxes[0]['3d'])):
+                    if bboxes[0]["3d"][i]["id"] == actor.id:
+                        index = i
+                entry = {
+                    "id": actor.id, "age": self.age[str(actor.id)], "existence_prob": 1, "class_name1": class_name1,
+                    "class_prob1": 1, "latitude": geolocation.latitude, "longitude": geolocation.longitude,
+                    "length": bboxes[0]["3d"][index]["extent"][0] * 2, "width": bboxes[0]["3d"][index]["extent"][1] * 2,
+                    "height": bboxes[0]["3d"][index]["extent"][2] * 2, "orientation": transform.rotation.yaw + 180}
+                last = self.last_loc.get(str(actor.id))
+                if last is not None:
+                    timedelta = (timestamp - last['starttime']) / (10 ** 6)
+                    vx = (transform.location.x - last['locx']) / timedelta
+                    vy = (transform.location.y - last['locy']) / timedelta
+                    vz = (transform.location.z - last['locz']) / timedelta
+                    ax, ay, az = (vx - last['vx']) / timedelta, (vy - last['vy']) / timedelta, (vz - last['vz']) / timedelta
+                    entry["speed"] = (vx ** 2 + vy ** 2 + vz ** 2)**0.5
+                    entry["acceleration_longitudinal"] = (ax ** 2 + ay ** 2 + az ** 2)**0.5
+                else:
+                    vx = vy = vz = 0
+                    entry["speed"] = 0
+                    entry["acceleration_longitudinal"] = 0
+                self.last_loc[str(actor.id)] = {'locx': transform.location.x, 'locy': transform.location.y,
+                                                'locz': transform.location.z, 'vx': vx, 'vy': vy, 'vz': vz,
+                                                'starttime': timestamp}
+                entry["kidt_car_company"] = "buw"
+                entry["kidt_car_latitude"] = world.get_map().transform_to_geolocation(ego_car_location).latitude
+                entry["kidt_car_longitude"] = world.get_map().transform_to_geolocation(ego_car_location).longitude
+                data_list.append(entry)
+        return data_list
+
+
+def compare(legacy, engine):
+    if [entry['id'] for entry in legacy] != [entry['id'] for entry in engine]:
+        return float('inf')
+    error = 0.
+    for a, b in zip(legacy, engine):
+        for key, value in a.items():
+            if isinstance(value, str):
+                if value != b[key]:
+                    return float('inf')
+            else:
+                error = max(error, abs(value - b[key]))
+    return error
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--actors', type=int, default=500)
+    argparser.add_argument('--steps', type=int, default=30)
+    argparser.add_argument('--radius', type=float, default=15.)
+    argparser.add_argument('--fps', type=float, default=10.)
+    args = argparser.parse_args()
+
+    world = World(args.actors)
+    ego = world.get_actor(0)
+    legacy = LegacyTrajectories()
+    engine = TrajectoryEngine(world, reference=REFERENCE)
+    times = {'legacy': 0., 'engine': 0.}
+    error, entries = 0., 0
+    timestamp = 0
+    for step in range(args.steps):
+        world.tick(1 / args.fps)
+        timestamp += int(10**6 / args.fps)
+        snapshot = world.get_snapshot()
+        bboxes = [{'3d': [{'id': i, 'extent': [2.3, 1.0, 0.8]} for i in world.actors]}]
+        start = time.perf_counter()
+        a = legacy.step(ego, snapshot, world, timestamp, bboxes, args.radius)
+        times['legacy'] += time.perf_counter() - start
+        start = time.perf_counter()
+        b = engine.step(ego.id, snapshot, timestamp, bboxes, args.radius)
+        times['engine'] += time.perf_counter() - start
+        error = max(error, compare(a, b))
+        entries += len(a)
+
+    print(f'{args.actors} actors, {entries / args.steps:.0f} entries per step, max deviation {error:.2e}')
+    for name, seconds in times.items():
+        print(f'{name:>8}: {seconds / args.steps * 1000:.2f} ms per step')
+    print(f'speedup: {times["legacy"] / times["engine"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
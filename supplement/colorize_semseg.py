@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+derives the CityScapes colored semantic segmentation (02_semseg_cs) from the recorded labels (02_semseg_raw)
+
+save_cc.py writes only the label channel of the semantic segmentation cameras, the colors are looked up
+offline in Carla.color_lut_ids (one gather per image) by a pool of writer threads, the labels of frame packs
+are written into the png folders of their scene
+
+    python supplement/colorize_semseg.py --root output/done
+    python supplement/colorize_semseg.py --root output/done/scene_0001 --workers 8 --overwrite
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from utils.carla_dataloader import Carla, semseg_ids
+from utils.framepack import FramePack
+from utils.writer import AsyncWriter
+
+RAW = '02_semseg_raw'
+CS = '02_semseg_cs'
+LUT = Carla.color_lut_ids[:, ::-1].copy()   # id --> BGR
+
+
+def write(path, ids):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not cv2.imwrite(path, LUT[ids]):
+        raise IOError(f'cannot write {path}')
+
+
+def colorize_file(src, dst):
+    write(dst, semseg_ids(cv2.imread(src, cv2.IMREAD_UNCHANGED)))
+
+
+def colorize_pack(path, stream, frame, dst):
+    pack = FramePack(path)
+    try:
+        write(dst, semseg_ids(pack.read(stream, frame)))
+    finally:
+        pack.close()
+
+
+def jobs(root, overwrite=False):
+    """
+    :return: list of (function, args) for the AsyncWriter
+    """
+    raw = os.sep + RAW + os.sep
+    jobs = []
+    for src in sorted(glob.glob(os.path.join(root, '**', RAW, '**', '*.png'), recursive=True)):
+        dst = src.replace(raw, os.sep + CS + os.sep)
+        if overwrite or not os.path.exists(dst):
+            jobs.append((colorize_file, (src, dst)))
+    for path in sorted(glob.glob(os.path.join(root, '**', '*.pack'), recursive=True)):
+        pack = FramePack(path)
+        name_rec = os.path.splitext(os.path.basename(path))[0]
+        for stream in [stream for stream in pack.streams if os.path.basename(stream) == RAW]:
+            for frame in pack.frames(stream):
+                dst = os.path.join(os.path.dirname(path), os.path.dirname(stream), CS, name_rec, '{0:05d}.png'.format(frame))
+                if overwrite or not os.path.exists(dst):
+                    jobs.append((colorize_pack, (path, stream, frame, dst)))
+        pack.close()
+    return jobs
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=' '.join(__doc__.strip().split('\n\n')[0].split()))
+    argparser.add_argument('--root', required=True, help='scene folder or folder with several scenes')
+    argparser.add_argument('--workers', type=int, default=4, help='writer threads')
+    argparser.add_argument('--overwrite', action='store_true', help='overwrites existing colored images')
+    args = argparser.parse_args()
+
+    todo = jobs(args.root, args.overwrite)
+    writer = AsyncWriter(args.workers, 4 * args.workers)
+    start = time.perf_counter()
+    try:
+        done = writer.submit_batch(todo).result()
+    finally:
+        writer.shutdown()
+    elapsed = time.perf_counter() - start
+    print(f'{done} images colorized in {elapsed:.2f}s ({done / max(elapsed, 1e-9):.1f} images/s)')
+
+
+if __name__ == '__main__':
+    main()
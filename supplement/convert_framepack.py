@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""
+converts the recordings of save_cc.py between the png folders and the frame packs (utils/framepack.py)
+
+    python supplement/convert_framepack.py --root output/done --to pack --codec lz4 --remove
+    python supplement/convert_framepack.py --root output/done/scene_0001 --to png
+"""
+import argparse
+import glob
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.framepack import PACK_CODECS, pack_recording, unpack_recording
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--root', required=True, help='scene folder or folder with several scenes')
+    argparser.add_argument('--to', choices=['pack', 'png'], required=True)
+    argparser.add_argument('--codec', default='lz4', choices=[str(codec) for codec in PACK_CODECS])
+    argparser.add_argument('--remove', action='store_true', help='removes the converted files')
+    args = argparser.parse_args()
+    codec = None if args.codec == 'None' else args.codec
+
+    if args.to == 'pack':
+        # recordings are the folders within 01_cam of a scene
+        for folder in sorted(glob.glob(os.path.join(args.root, '**', '01_cam', '*', ''), recursive=True)):
+            scene = os.path.dirname(os.path.dirname(os.path.dirname(folder)))
+            if os.path.basename(scene) == '12_bird':
+                continue
+            name_rec = os.path.basename(os.path.dirname(folder))
+            print(pack_recording(scene, name_rec, codec, remove=args.remove))
+    else:
+        for path in sorted(glob.glob(os.path.join(args.root, '**', '*.pack'), recursive=True)):
+            unpack_recording(path)
+            if args.remove:
+                os.remove(path)
+            print(path)
+
+
+if __name__ == '__main__':
+    main()
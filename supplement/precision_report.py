@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+accuracy vs latency report of the precision modes (fp32, bf16, fp16, int8) of a checkpoint
+
+the networks run on recorded scenes (01_cam), the mIoU over Carla.train_ids is computed against
+the ground truth (02_semseg_raw) if it was recorded, otherwise against the fp32 prediction
+
+    python supplement/precision_report.py --ckpt clear_FastSCNN_origin --root output/scene_0001 --csv report.csv
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+
+from utils.carla_dataloader import Carla, CarlaRecording
+from utils.deploy import deploy, fuse_bn
+from utils.metrics import confusion_matrix, mean_iou
+from utils.networks import load_network
+from utils.preprocessing import Preprocessing
+from utils.quantization import PRECISIONS, Frame, precision_dtype, quantize_int8, calibration_frames
+
+
+def build(args, precision, device, preprocessing):
+    network = load_network(args.ckpt, device, path=args.path)
+    if precision == 'int8':
+        batches = (preprocessing(frame).clone() for frame in calibration_frames(args.calibration_root, args.calibration_frames))
+        return quantize_int8(network, batches, args.backend), torch.float32
+    dtype = precision_dtype(precision, device)
+    return fuse_bn(network).to(dtype), dtype
+
+
+def predict(network, x, dtype):
+    out = network(x.to(dtype))
+    out = out[0] if isinstance(out, (tuple, list)) else out
+    return out if out.dim() == 3 else out.argmax(dim=1)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--ckpt', required=True, help='checkpoint name (weights/<ckpt>.pth)')
+    argparser.add_argument('--path', default=None, help='checkpoint file (default: weights/<ckpt>.pth)')
+    argparser.add_argument('--root', required=True, help='recorded scene(s) for the evaluation')
+    argparser.add_argument('--calibration-root', default=None, help='recorded scene(s) for the int8 calibration (default: --root)')
+    argparser.add_argument('--calibration-frames', type=int, default=100)
+    argparser.add_argument('--frames', type=int, default=200, help='number of evaluated frames')
+    argparser.add_argument('--precisions', nargs='+', default=PRECISIONS, choices=PRECISIONS)
+    argparser.add_argument('--backend', default='fbgemm', choices=['fbgemm', 'qnnpack'])
+    argparser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    argparser.add_argument('--trace', action='store_true', help='TorchScript tracing of all variants')
+    argparser.add_argument('--threads', type=int, default=None, help='number of CPU threads')
+    argparser.add_argument('--csv', default=None, help='writes the report into a csv file')
+    args = argparser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    args.calibration_root = args.calibration_root or args.root
+
+    dataset = CarlaRecording(args.root, args.frames)
+    if len(dataset) == 0:
+        sys.exit(f'no recorded frames (01_cam) found in {args.root}')
+    samples = [dataset[i] for i in range(len(dataset))]
+    has_gt = all(target is not None for _, target in samples)
+
+    rows, reference = [], []
+    for precision in ['fp32'] + [p for p in args.precisions if p != 'fp32']:
+        device = torch.device('cpu' if precision == 'int8' else args.device)
+        preprocessing = Preprocessing(Carla.mean, Carla.std, device)
+        network, dtype = build(args, precision, device, preprocessing)
+        if args.trace:
+            example = preprocessing(Frame(samples[0][0])).to(dtype)
+            network = deploy(network, example, jit='trace')
+        conf = np.zeros((Carla.num_train_ids, Carla.num_train_ids), dtype=np.int64)
+        times = []
+        with torch.inference_mode():
+            predict(network, preprocessing(Frame(samples[0][0])), dtype)    # warm up
+            for i, (image, target) in enumerate(samples):
+                x = preprocessing(Frame(image))
+                if device.type == 'cuda':
+                    torch.cuda.synchronize(device)
+                start = time.perf_counter()
+                pred = predict(network, x, dtype)
+                if device.type == 'cuda':
+                    torch.cuda.synchronize(device)
+                times.append(time.perf_counter() - start)
+                pred = pred[0].to(torch.uint8).cpu().numpy()
+                if precision == 'fp32':
+                    reference.append(pred)
+                conf += confusion_matrix(pred, target if has_gt else reference[i])
+        if precision not in args.precisions:
+            continue
+        rows.append({
+            'precision':    precision,
+            'device':       device.type,
+            'dtype':        'qint8' if precision == 'int8' else str(dtype).replace('torch.', ''),
+            'mIoU':         round(mean_iou(conf) * 100, 2),
+            'latency_ms':   round(np.mean(times) * 1000, 2),
+            'fps':          round(1 / np.mean(times), 1)})
+
+    print(f'{args.ckpt}: {len(samples)} frames, mIoU vs {"ground truth" if has_gt else "fp32"}')
+    print(f'{"precision":>10}{"device":>8}{"dtype":>10}{"mIoU":>8}{"latency ms":>12}{"fps":>8}')
+    for row in rows:
+        print(f'{row["precision"]:>10}{row["device"]:>8}{row["dtype"]:>10}{row["mIoU"]:>8}{row["latency_ms"]:>12}{row["fps"]:>8}')
+    if args.csv is not None:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    main()
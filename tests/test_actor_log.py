@@ -0,0 +1,107 @@
+import csv
+import os
+import time
+
+import numpy as np
+import pytest
+
+from utils.actor_log import ActorStateLogger, export_csv_log, read_actor_log
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class Vector():
+    def __init__(self, x=0., y=0., z=0.):
+        self.x, self.y, self.z = x, y, z
+
+
+class Rotation():
+    def __init__(self, yaw=0.):
+        self.pitch, self.yaw, self.roll = 0., yaw, 0.
+
+
+class Transform():
+    def __init__(self, location, rotation):
+        self.location, self.rotation = location, rotation
+
+
+class Actor():
+    """
+    stand-in of carla.Actor with the queries of ActorStateLogger.log
+    """
+    def __init__(self, actor_id, type_id, x):
+        self.id, self.type_id, self.x = actor_id, type_id, x
+
+    def get_location(self):
+        return Vector(self.x)
+
+    def get_transform(self):
+        return Transform(Vector(self.x), Rotation(90.))
+
+    def get_velocity(self):
+        return Vector(1.)
+
+    def get_acceleration(self):
+        return Vector(0.5)
+
+
+def drive(folder, actors, frames, log_format, chunk_rows=3):
+    logger = ActorStateLogger(folder, chunk_rows=chunk_rows, log_format=log_format)
+    start = time.time()
+    for frame in range(frames):
+        logger.log(actors[0], actors, frame, start)
+    logger.close(export_csv=True)
+    return logger
+
+
+@pytest.mark.parametrize('log_format', ['npy', 'parquet'])
+def test_two_loggers_keep_both_drives(tmp_path, log_format):
+    if log_format == 'parquet' and pyarrow is None:
+        pytest.skip('pyarrow is not installed')
+    folder = str(tmp_path)
+    first = [Actor(1, 'vehicle.tesla.model3', 0.), Actor(2, 'walker.pedestrian.0001', 2.),
+             Actor(3, 'sensor.camera.rgb', 1.)]
+    # the second drive has another type table: the walker gets code 0
+    second = [Actor(10, 'walker.pedestrian.0001', 0.), Actor(11, 'vehicle.audi.tt', 3.),
+              Actor(12, 'vehicle.tesla.model3', 30.)]
+    logger_a = drive(folder, first, 4, log_format)
+    logger_b = drive(folder, second, 5, log_format)
+
+    if log_format == 'npy':
+        assert logger_a.path == logger_b.path
+        rows, types = read_actor_log(logger_b.path)
+        assert len(rows) == 2 * 4 + 2 * 5
+    else:
+        assert logger_a.path != logger_b.path
+        rows_a, types_a = read_actor_log(logger_a.path)
+        rows_b, types_b = read_actor_log(logger_b.path)
+        assert len(rows_a) == 2 * 4 and len(rows_b) == 2 * 5
+        rows = np.concatenate([rows_a, rows_b])
+        types = None
+    if types is not None:
+        names = {actor_id: types[code] for actor_id, code in zip(rows['id'].tolist(), rows['type'].tolist())}
+        assert names == {1: 'vehicle.tesla.model3', 2: 'walker.pedestrian.0001',
+                         10: 'walker.pedestrian.0001', 11: 'vehicle.audi.tt'}
+
+    # the csv has one header and the rows of both drives once
+    with open(os.path.join(folder, 'actor_data.csv')) as file:
+        lines = list(csv.reader(file))
+    assert lines[0][0] == 'id'
+    assert sum(line[0] == 'id' for line in lines) == 1
+    assert [line[0] for line in lines[1:]].count('1') == 4
+    assert [line[0] for line in lines[1:]].count('10') == 5
+    assert {line[0]: line[3] for line in lines[1:]} == {'1': 'vehicle.tesla.model3', '2': 'walker.pedestrian.0001',
+                                                        '10': 'walker.pedestrian.0001', '11': 'vehicle.audi.tt'}
+
+
+def test_export_from_offset(tmp_path):
+    folder = str(tmp_path)
+    actors = [Actor(1, 'vehicle.tesla.model3', 0.)]
+    drive(folder, actors, 2, 'npy')
+    logger = drive(folder, actors, 3, 'npy')
+    csv_path = export_csv_log(logger.path, str(tmp_path / 'second.csv'), logger.offset)
+    with open(csv_path) as file:
+        assert len(list(csv.reader(file))) == 1 + 3
@@ -0,0 +1,42 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip('carla')    # config.py imports carla
+
+from utils.rec import QRecording
+from utils.session import Session
+from utils.writer import AsyncWriter
+
+
+class Image():
+    """
+    stand-in of a carla camera image (raw BGRA)
+    """
+    def __init__(self, value, height=24, width=32):
+        self.height, self.width = height, width
+        self.raw_data = np.full((height, width, 4), value, dtype=np.uint8).tobytes()
+
+
+@pytest.mark.parametrize('compression', [None, 'jpeg'])
+def test_retrieve_reports_every_frame(tmp_path, compression):
+    session = Session.create(str(tmp_path), 'scene')
+    qrecording = QRecording(fps=10, seconds_before_cc=2, writer=AsyncWriter(workers=3),
+                            compression=compression, session=session)
+    for value in range(15):
+        qrecording.add(np.full((24, 32, 3), value, dtype=np.uint8), Image(value))
+    calls = []
+    lock = threading.Lock()
+
+    def progress(cc_counter, written, total):
+        with lock:
+            calls.append((cc_counter, written, total))
+
+    frames = qrecording.retrieve(cc_true=True, progress=progress).result(timeout=30)
+    qrecording.close()
+    assert frames == 15
+    assert sorted(calls) == [(1, written, 15) for written in range(1, 16)]
+    assert len(os.listdir(session.folder('01_cam', 'cc_1'))) == 15
+    assert len(os.listdir(session.folder('10_inference', 'cc_1'))) == 15
@@ -0,0 +1,229 @@
+import csv
+import os
+import threading
+import time
+import numpy as np
+
+from utils.writer import AsyncWriter
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+LOG_FORMATS = ['npy', 'parquet']
+# columns of the former actor_data.csv (utils.save.save_csv), the csv export keeps this schema
+CSV_FIELDS = [  'id','frame','time [ms]', 'type', 'x [m]', 'y [m]', 'z [m]', 'distance to ego [m]',
+                'vx [m/s]', 'vy [m/s]', 'vz [m/s]',
+                'ax [m/s2]', 'ay [m/s2]', 'az [m/s2]',
+                'pitch [deg]', 'yaw [deg]', 'roll [deg]'    ]
+COLUMNS = np.dtype([('id', np.int64), ('frame', np.int64), ('time', np.int64), ('type', np.int32),
+                    ('x', np.float64), ('y', np.float64), ('z', np.float64), ('distance', np.float64),
+                    ('vx', np.float64), ('vy', np.float64), ('vz', np.float64),
+                    ('ax', np.float64), ('ay', np.float64), ('az', np.float64),
+                    ('pitch', np.float64), ('yaw', np.float64), ('roll', np.float64)])
+
+
+def check_log_format(log_format):
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f'log format {log_format} is not supported, choose from {LOG_FORMATS}')
+    if log_format == 'parquet' and pyarrow is None:
+        raise RuntimeError('cannot import pyarrow, make sure pyarrow package is installed')
+
+
+class ActorStateLogger():
+    """
+    position, velocity, acceleration and rotation of the moving actors around the ego vehicle
+    (replaces the csv appends of save_csv), the rows are buffered in a preallocated chunk of typed columns
+    and a full chunk is written by a background thread into one file which stays open:
+        npy:        consecutive np.save records (chunk rows, type names) appended to actor_data.npy
+        parquet:    one row group per chunk in actor_data.parquet, actor_data_1.parquet, ... (one file per drive)
+    the rows of former drives in the same scene folder are kept, the type names are stored as codes, each actor is queried once for its type and once per log() for
+    its transform, velocity and acceleration
+    """
+    def __init__(self, folder, radius=15, chunk_rows=4096, log_format='npy'):
+        """
+        :param folder:      08_trajectory folder of the scene
+        :param radius:      actors within the radius [m] around the ego vehicle are logged
+        :param chunk_rows:  rows per written chunk
+        :param log_format:  npy (numpy only) or parquet (needs pyarrow)
+        """
+        check_log_format(log_format)
+        os.makedirs(folder, exist_ok=True)
+        self.radius = radius
+        self.log_format = log_format
+        self.chunk = np.empty(chunk_rows, dtype=COLUMNS)
+        self.rows = 0
+        self.codes = {}     # actor id --> type code, -1: not logged (sensors, props, ...)
+        self.types = []     # type names of the codes
+        self.csv_path = os.path.join(folder, 'actor_data.csv')
+        if log_format == 'npy':
+            self.path = os.path.join(folder, 'actor_data.npy')
+            self.file = open(self.path, 'ab')
+        else:
+            # a parquet file cannot be appended, the next free name is claimed by the exclusive open
+            number = 0
+            while True:
+                self.path = os.path.join(folder, 'actor_data{}.parquet'.format(f'_{number}' if number else ''))
+                try:
+                    self.file = open(self.path, 'xb')
+                    break
+                except FileExistsError:
+                    number += 1
+        self.offset = self.file.tell()  # first byte of this drive
+        self.parquet = None
+        self.lock = threading.Lock()    # one chunk is written at a time, in order
+        self.writer = AsyncWriter(workers=1, max_pending=4)
+
+    def type_code(self, actor):
+        code = self.codes.get(actor.id)
+        if code is None:
+            type_id = str(actor.type_id)
+            code = -1
+            if type_id.startswith('vehicle') or type_id.startswith('walker'):
+                if type_id not in self.types:
+                    self.types.append(type_id)
+                code = self.types.index(type_id)
+            self.codes[actor.id] = code
+        return code
+
+    def log(self, ego_car, actors, frame, start):
+        """
+        :param ego_car: actor object representing the driver
+        :param actors:  the world's actor list
+        :param frame:   current frame
+        :param start:   starting time of the recording (time.time())
+        """
+        ego_location = ego_car.get_location()
+        eclx, ecly = ego_location.x, ego_location.y
+        milliseconds = int(1000 * (time.time() - start))
+        for actor in actors:
+            code = self.type_code(actor)
+            if code < 0:
+                continue
+            transform = actor.get_transform()
+            distance = ((transform.location.x - eclx)**2 + (transform.location.y - ecly)**2)**0.5
+            if distance >= self.radius:
+                continue
+            velocity = actor.get_velocity()
+            acceleration = actor.get_acceleration()
+            self.chunk[self.rows] = (actor.id, frame, milliseconds, code,
+                                     transform.location.x, transform.location.y, transform.location.z, distance,
+                                     velocity.x, velocity.y, velocity.z,
+                                     acceleration.x, acceleration.y, acceleration.z,
+                                     transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll)
+            self.rows += 1
+            if self.rows == len(self.chunk):
+                self.flush()
+
+    def flush(self):
+        """
+        hands the buffered rows to the background thread
+        """
+        if self.rows == 0:
+            return
+        rows = self.chunk[:self.rows].copy()
+        self.rows = 0
+        self.writer.submit(self.write, rows, list(self.types))
+
+    def write(self, rows, types):
+        with self.lock:
+            if self.log_format == 'npy':
+                np.save(self.file, rows)
+                np.save(self.file, np.array(types, dtype=str))
+            else:
+                table = pyarrow.Table.from_arrays(
+                    [pyarrow.DictionaryArray.from_arrays(pyarrow.array(rows[name]), pyarrow.array(types))
+                     if name == 'type' else pyarrow.array(rows[name]) for name in COLUMNS.names],
+                    names=list(COLUMNS.names))
+                if self.parquet is None:
+                    self.parquet = pyarrow.parquet.ParquetWriter(self.file, table.schema)
+                self.parquet.write_table(table)
+            self.file.flush()
+
+    def close(self, export_csv=False):
+        """
+        writes the remaining rows and closes the file
+        :param export_csv:  additionally appends the rows of this drive to actor_data.csv next to the log
+                            (former format)
+        """
+        if self.file is None:
+            return
+        self.flush()
+        self.writer.shutdown(wait=True)
+        if self.parquet is not None:
+            self.parquet.close()
+        self.file.close()
+        self.file = None
+        if export_csv:
+            export_csv_log(self.path, self.csv_path, self.offset)
+
+
+def read_actor_log(path, offset=0):
+    """
+    :param path:    actor_data.npy or actor_data.parquet
+    :param offset:  npy: first byte to read, e.g. ActorStateLogger.offset for the rows of one drive
+    :return:        rows (N,) with the COLUMNS and the type names of the type codes
+    """
+    if os.path.splitext(path)[1] == '.parquet':
+        check_log_format('parquet')
+        table = pyarrow.parquet.read_table(path)
+        rows = np.empty(table.num_rows, dtype=COLUMNS)
+        types = []
+        for name in COLUMNS.names:
+            column = table.column(name)
+            if name == 'type':
+                # the chunks can have different dictionaries, the types are mapped to a common table
+                codes = []
+                for piece in column.chunks:
+                    names = piece.dictionary.to_pylist()
+                    for type_id in names:
+                        if type_id not in types:
+                            types.append(type_id)
+                    lookup = np.array([types.index(type_id) for type_id in names], dtype=np.int32)
+                    codes.append(lookup[piece.indices.to_numpy(zero_copy_only=False)])
+                rows[name] = np.concatenate(codes) if codes else []
+            else:
+                rows[name] = column.to_numpy()
+        return rows, types
+    chunks, types = [], []
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        while file.tell() < size:
+            chunk = np.load(file)
+            names = np.load(file).tolist()
+            # every drive has its own type table, the codes are mapped to a common table
+            for type_id in names:
+                if type_id not in types:
+                    types.append(type_id)
+            lookup = np.array([types.index(type_id) for type_id in names], dtype=np.int32)
+            if len(chunk):
+                chunk['type'] = lookup[chunk['type']]
+            chunks.append(chunk)
+    rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=COLUMNS)
+    return rows, types
+
+
+def export_csv_log(path, csv_path=None, offset=0):
+    """
+    writes the log in the schema of the former actor_data.csv (values rounded to 2 decimals), the rows are
+    appended to an existing csv like before (several drives in the same scene folder)
+    :param path:        actor_data.npy or actor_data.parquet
+    :param csv_path:    default: actor_data.csv next to the log
+    :param offset:      npy: first exported byte, see read_actor_log
+    :return:            csv path
+    """
+    if csv_path is None:
+        csv_path = os.path.splitext(path)[0] + '.csv'
+    rows, types = read_actor_log(path, offset)
+    header = not os.path.exists(csv_path) or os.stat(csv_path).st_size == 0
+    with open(csv_path, 'a') as file:
+        csvwriter = csv.writer(file)
+        if header:
+            csvwriter.writerow(CSV_FIELDS)
+        for row in rows.tolist():
+            csvwriter.writerow([str(row[0]), str(row[1]), str(row[2]), types[row[3]]]
+                               + [str(round(value, 2)) for value in row[4:]])
+    return csv_path
@@ -1,8 +1,13 @@
 import os
+import glob
 from collections import namedtuple
 from typing import Any, Callable, Optional, Tuple
+import numpy as np
 from torch.utils.data import Dataset
 from PIL import Image
+import cv2
+
+from utils.framepack import FramePack
 
 
 class Carla(Dataset):
@@ -74,6 +79,12 @@ class Carla(Dataset):
     id2label = {label.id: label for label in labels}
     train_id2label = {label.train_id: label for label in labels}
     
+    color_lut_train_ids = np.array(color_palette_train_ids, dtype=np.uint8) # (256, 3) lookup table train_id --> color
+    id2train_id_lut = np.full(256, 255, dtype=np.uint8)  # lookup table id --> train_id
+    color_lut_ids = np.zeros((256, 3), dtype=np.uint8)   # lookup table id --> color (CityScapesPalette)
+    for i in range(len(labels)):
+        id2train_id_lut[labels[i].id] = labels[i].train_id
+        color_lut_ids[labels[i].id] = labels[i].color
     color_palette_train_ids = list(sum(color_palette_train_ids, ())) # needed for putpalette
 
 
@@ -109,3 +120,97 @@ class Carla(Dataset):
 
     def __len__(self) -> int:
         return len(self.images)
+
+
+def semseg_ids(raw):
+    """
+    carla ids of a recorded semantic segmentation: label map (H, W) or raw BGR(A) image (ids in the red channel)
+    :param raw: image as read by cv2 or FramePack
+    """
+    return raw if raw.ndim == 2 else raw[..., 2]
+
+
+class Frame():
+    """
+    recorded rgb frame with the interface of a carla image (raw_data BGRA, height, width), so it can be
+    fed into the Preprocessing like a camera frame
+    """
+    def __init__(self, rgb):
+        self.height, self.width = rgb.shape[:2]
+        bgra = np.full((self.height, self.width, 4), 255, dtype=np.uint8)
+        bgra[..., :3] = rgb[..., ::-1]
+        self.raw_data = bgra.tobytes()
+
+
+class CarlaRecording(Dataset):
+    """
+    frames of recorded scenes (save_cc.py, QRecording): rgb images from 01_cam and, if available, 
+    the ground truth from 02_semseg_raw (carla ids in the red channel) mapped to train ids
+    the frames are read from the png folders and/or from the frame packs of the recordings (utils/framepack.py)
+    """
+    targets = ['train_id', 'id', 'color']
+
+    def __init__(self, root: str, max_frames: Optional[int] = None, storage: Optional[str] = None,
+                 target: str = 'train_id') -> None:
+        """
+        :param root:        scene folder or folder with several scenes
+        :param max_frames:  use only the first frames
+        :param storage:     [None, png, pack], None reads both
+        :param target:      [train_id, id, color], the ground truth as train ids, carla ids or in the
+                            CityScapesPalette (rgb), the colors are looked up when a frame is read
+        """
+        if target not in self.targets:
+            raise ValueError(f'target {target} is not supported, choose from {self.targets}')
+        self.target = target
+        self.images = []    # png file or (pack file, frame)
+        if storage in [None, 'png']:
+            for ext in ['png', 'jpg']:
+                self.images += glob.glob(os.path.join(root, '**', '01_cam', '**', f'*.{ext}'), recursive=True)
+            bird = os.sep + '12_bird' + os.sep
+            self.images = sorted(path for path in self.images if bird not in path)  # the ego camera only
+        if storage in [None, 'pack']:
+            # only the index of a pack is read, a listing per recording instead of per frame
+            for path in sorted(glob.glob(os.path.join(root, '**', '*.pack'), recursive=True)):
+                pack = FramePack(path)
+                self.images += [(path, frame) for frame in pack.frames('01_cam')]
+                pack.close()
+        self.images = self.images[:max_frames]
+        cam = os.sep + '01_cam' + os.sep
+        self.targets = [path.replace(cam, os.sep + '02_semseg_raw' + os.sep) if isinstance(path, str) else path 
+                        for path in self.images]
+        self.packs = {}     # opened lazily in each DataLoader worker
+
+    def pack(self, path):
+        if path not in self.packs:
+            self.packs[path] = FramePack(path)
+        return self.packs[path]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['packs'] = {}     # memory maps are opened again by the worker
+        return state
+
+    def __getitem__(self, index: int) -> Tuple[Any, Any]:
+        """
+        :return: rgb image (H, W, 3) and train id map (H, W) (or id map, or color image (H, W, 3)) as uint8 numpy 
+                 arrays, the target is None without ground truth
+        """
+        ids = None
+        if isinstance(self.images[index], tuple):
+            path, frame = self.images[index]
+            pack = self.pack(path)
+            image = cv2.cvtColor(pack.read('01_cam', frame), cv2.COLOR_BGRA2RGB)
+            if pack.has('02_semseg_raw', frame):
+                ids = semseg_ids(pack.read('02_semseg_raw', frame))
+        else:
+            image = np.array(Image.open(self.images[index]).convert('RGB'))
+            if os.path.exists(self.targets[index]):
+                ids = semseg_ids(cv2.imread(self.targets[index], cv2.IMREAD_UNCHANGED))
+        if ids is None or self.target == 'id':
+            return image, ids
+        if self.target == 'color':
+            return image, Carla.color_lut_ids[ids]
+        return image, Carla.id2train_id_lut[ids]
+
+    def __len__(self) -> int:
+        return len(self.images)
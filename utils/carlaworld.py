@@ -4,7 +4,7 @@ import os
 import time
 import math
 import pygame
-from utils.tools import get_folder_name
+from utils.session import Session
 import signal
 import subprocess
 import config as cfg
@@ -173,11 +173,13 @@ def get_ego_position(player_pos):
     
     print('ego position: ', ego_pos)
 
-def get_ego_id():
+def get_ego_id(session=None):
     """
     reads the ego vehicle id from a text file
+    :param session: scene folder of the run (utils.session.Session), default: the latest one
     """
-    with open(os.path.join(get_folder_name(), '00_log', 'ego_id.txt')) as f:
+    session = session if session is not None else Session.latest()
+    with open(session.folder('00_log', 'ego_id.txt')) as f:
             lines = f.readlines()
             ego_id = int(lines[0])
     return ego_id
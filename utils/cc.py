@@ -7,8 +7,9 @@ import os
 import sys
 import config as cfg
 from datetime import datetime
+from functools import partial
 from utils.carlaworld import count_vehicles_and_walkers
-from utils.tools import get_folder_name
+from utils.session import Session
 from utils.rec import Recording
 from utils.carla_dataloader import Carla
 from tkinter import Label, Button, Tk, Canvas, BooleanVar, Checkbutton, StringVar, Entry
@@ -16,21 +17,24 @@ from tkinter import Label, Button, Tk, Canvas, BooleanVar, Checkbutton, StringVa
 
 
 class CheckCornerCase():
-    def __init__(self, world, args, client, td, qrecording, weather):
+    def __init__(self, world, args, client, td, qrecording, weather, session=None):
         """
         check if the situation was a corner case
         :param td:          travel distance
         :param qrecording:  image queue
         :param weather:     weather preset (clear, rain, fog or night)
+        :param session:     scene folder of the run (utils.session.Session), default: the latest one
         """
         self.width = 600
         self.height = 300
         self.td = td
         self.qrecording = qrecording # integration of inference recording
+        self.progress_frames = cfg.writer_progress_frames
         self.weather = weather
         now = datetime.now()
         nr_vehicles, nr_walkers = count_vehicles_and_walkers(world.world)
-        self.rec = Recording()
+        self.session = session if session is not None else Session.latest()
+        self.rec = Recording(self.session)
         self.i_rec = 1
         self.client = client
         self.rec.start(self.client, self.i_rec)
@@ -64,7 +68,7 @@ class CheckCornerCase():
                 'name':             cfg.model_name,
                 'number classes':   Carla.num_train_ids
         }
-        with open(os.path.join(get_folder_name(), '09_corner_cases', 'experimental_setup.json'), "w") as f:
+        with open(self.session.folder('09_corner_cases', 'experimental_setup.json'), "w") as f:
             json.dump(setup, f)
 
 
@@ -135,10 +139,27 @@ class CheckCornerCase():
         self.timer = time.time()    # start new timing
         self.td.reset()
         if self.qrecording is not None: 
-            self.qrecording.retrieve(cc_true = True)
-            time.sleep(6)
+            # the frames are written in the background, the drive continues right away
+            saved = self.qrecording.retrieve(cc_true = True, progress = self.report_progress)
+            saved.add_done_callback(partial(self.report_saved, self.qrecording.cc_counter))
         if self.qrecording is not None: self.qrecording.wait_off()
 
+    def report_progress(self, cc_counter, written, total):
+        """
+        called by the writer after each written frame of a corner case, reports every progress_frames frames
+        """
+        if written % self.progress_frames == 0 and written < total:
+            print(f'Corner Case {cc_counter}: {written} of {total} frames written')
+
+    def report_saved(self, cc_counter, future):
+        """
+        called by the writer when all frames of a corner case are written
+        """
+        if future.exception() is None:
+            print(f'Corner Case {cc_counter}: {future.result()} frames written')
+        else:
+            print(f'Corner Case {cc_counter}: writing the images failed ({future.exception()})')
+
     def cc_false(self):
         """
         delete Corner Case
@@ -183,7 +204,7 @@ class CheckCornerCase():
         ]
 
         rows.append(row)   
-        path = get_folder_name()
+        path = self.session.path
 
         with open(os.path.join(path, '09_corner_cases', 'cc.csv'), 'a') as file:
             csvwriter = csv.writer(file)
@@ -196,5 +217,5 @@ class CheckCornerCase():
         """
         if the scene should not be saved, then delete the recording to save memory
         """
-        path = os.path.join( get_folder_name(), '00_log')
+        path = self.session.log
         os.remove(os.path.join(path, f'scene_recording_{self.i_rec}.log'))
@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+CODECS = [None, 'jpeg', 'lz4']
+# rough size of an encoded frame relative to the raw frame, used to derive the affordable history
+COMPRESSION_RATIO = {None: 1., 'jpeg': 0.1, 'lz4': 0.8}
+CLASS_ID_COMPRESSION_RATIO = {None: 1., 'jpeg': 1., 'lz4': 0.1}
+
+
+def check_codec(codec):
+    if codec not in CODECS:
+        raise ValueError(f'codec {codec} is not supported, choose from {CODECS}')
+    if codec == 'lz4' and lz4 is None:
+        raise RuntimeError('cannot import lz4, make sure lz4 package is installed')
+
+
+def encode_frame(array, codec, quality=90):
+    """
+    :param array:   BGR image (H, W, 3) for jpeg, any contiguous uint8 array for lz4
+    :param codec:   'jpeg' (lossy, the bytes are a jpg file) or 'lz4' (lossless)
+    :return:        encoded bytes
+    """
+    if codec == 'jpeg':
+        ok, data = cv2.imencode('.jpg', array, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise RuntimeError('jpeg encoding failed')
+        return data.tobytes()
+    return lz4.frame.compress(array, compression_level=0)
+
+
+def decode_frame(data, codec, shape=None, dtype=np.uint8):
+    """
+    :param shape:   array shape, needed for lz4
+    :param dtype:   array dtype for lz4
+    :return:        BGR image (H, W, 3) for jpeg, the array of the given shape for lz4
+    """
+    if codec == 'jpeg':
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    return np.frombuffer(lz4.frame.decompress(data), dtype=dtype).reshape(shape)
+
+
+def mask_bytes(width, height, class_ids=False, codec=None):
+    """
+    estimated memory of one recorded inference mask
+    :param class_ids:   masks are stored as class id maps (H, W) instead of colorized masks (H, W, 3)
+    :param codec:       the class id maps are compressed with lz4
+    """
+    if class_ids:
+        return width * height * CLASS_ID_COMPRESSION_RATIO[codec]
+    return width * height * 3
+
+
+def frame_bytes(width, height, class_ids=False, codec=None):
+    """
+    estimated memory of one recorded frame (inference mask and camera frame)
+    :param codec:   compression of the camera frames (and of the class id maps for lz4)
+    """
+    return mask_bytes(width, height, class_ids, codec) + width * height * 3 * COMPRESSION_RATIO[codec]
+
+
+def max_seconds_before_cc(memory_mb, width, height, fps, record_every_x_frames, class_ids=False, codec=None):
+    """
+    longest history before a corner case which fits into the memory budget
+    """
+    frames = memory_mb * 2**20 / frame_bytes(width, height, class_ids, codec)
+    return int((frames - 1) * record_every_x_frames / fps)
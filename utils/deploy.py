@@ -0,0 +1,51 @@
+import torch
+from torch import nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+def fuse_bn(network):
+    """
+    folds every BatchNorm2d into its preceding Conv2d, the BatchNorm2d is replaced by an Identity
+    covered are Conv2d --> BatchNorm2d within nn.Sequential and blocks with the attributes 
+    conv and bn (ConvBlock of FastSCNN, ConvBNReLU of BiSeNetV2)
+    :param network: network in eval mode, it is changed in place
+    """
+    for child in network.children():
+        fuse_bn(child)
+    if isinstance(network, nn.Sequential):
+        layers = list(network._modules.items())
+        for (name, layer), (next_name, next_layer) in zip(layers, layers[1:]):
+            if isinstance(layer, nn.Conv2d) and isinstance(next_layer, nn.BatchNorm2d):
+                network._modules[name] = fuse_conv_bn_eval(layer, next_layer)
+                network._modules[next_name] = nn.Identity()
+    elif isinstance(getattr(network, 'conv', None), nn.Conv2d) and isinstance(getattr(network, 'bn', None), nn.BatchNorm2d):
+        network.conv = fuse_conv_bn_eval(network.conv, network.bn)
+        network.bn = nn.Identity()
+    return network
+
+
+def deploy(network, example=None, channels_last=False, jit=None):
+    """
+    builds the deployment version of a network for inference
+    :param network:         network with loaded weights
+    :param example:         input tensor (N, 3, H, W), needed for jit='trace'
+    :param channels_last:   use the channels last memory format
+    :param jit:             None, 'trace' (frozen TorchScript) or 'compile' (torch.compile, torch 2.0+)
+    """
+    network = fuse_bn(network.eval())
+    if channels_last:
+        network = network.to(memory_format=torch.channels_last)
+    if jit == 'trace':
+        if example is None:
+            raise ValueError('tracing needs an example input')
+        if channels_last:
+            example = example.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            network = torch.jit.freeze(torch.jit.trace(network, example))
+    elif jit == 'compile':
+        if not hasattr(torch, 'compile'):
+            raise RuntimeError('torch.compile needs torch 2.0 or newer')
+        network = torch.compile(network)
+    elif jit is not None:
+        raise ValueError(f'jit mode {jit} is not supported')
+    return network
@@ -0,0 +1,54 @@
+import os
+import cv2
+import numpy as np
+
+DEPTH_FORMATS = ['float32', 'float16', 'mm']
+MAX_DEPTH = 1000.   # far plane of the carla depth camera in m
+SCALE = MAX_DEPTH / (256 ** 3 - 1)
+
+
+def decode_depth(bgra, depth_format='float32'):
+    """
+    decodes the 24 bit depth of the carla depth camera, R + G * 256 + B * 256**2 normalized to the far plane
+    the BGRA bytes of a pixel are read as one uint32, so the decoding is a byte swap, a shift and a scale
+    instead of shifting and combining the channels separately
+    :param bgra:            raw image (H, W, 4) uint8, e.g. the raw data of the carla image or a 06_depth_raw png
+                            read by cv2 (BGR(A))
+    :param depth_format:    float32 or float16 depth in m, mm: uint16 depth in mm (saturated at 65.535 m)
+    :return:                depth (H, W)
+    """
+    if depth_format not in DEPTH_FORMATS:
+        raise ValueError(f'depth format {depth_format} is not supported, choose from {DEPTH_FORMATS}')
+    if bgra.shape[-1] == 3:
+        bgra = cv2.cvtColor(bgra, cv2.COLOR_BGR2BGRA)
+    # little endian: B | G << 8 | R << 16 | A << 24 --> byte swap and shift: R | G << 8 | B << 16
+    packed = np.ascontiguousarray(bgra).view('<u4')[..., 0].byteswap() >> 8
+    depth = packed.astype(np.float32)
+    depth *= np.float32(SCALE)
+    if depth_format == 'mm':
+        depth *= 1000
+        depth += 0.5    # rounded
+        return np.minimum(depth, 65535).astype(np.uint16)
+    return depth if depth_format == 'float32' else depth.astype(np.float16)
+
+
+def save_depth(path, depth):
+    """
+    :param path:    npz file, the depth is stored compressed as 'depth'
+    """
+    np.savez_compressed(path, depth=depth)
+
+
+def load_depth(path):
+    """
+    reads a stored depth map in any format
+    :param path:    06_depth_raw png (24 bit encoded) or npz (decoded)
+    :return:        float32 depth (H, W) in m
+    """
+    if os.path.splitext(path)[1] == '.npz':
+        with np.load(path) as data:
+            depth = data['depth']
+        if depth.dtype == np.uint16:
+            return depth.astype(np.float32) / 1000
+        return depth.astype(np.float32)
+    return decode_depth(cv2.imread(path, cv2.IMREAD_UNCHANGED))
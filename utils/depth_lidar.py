@@ -0,0 +1,106 @@
+import os
+from functools import lru_cache
+import numpy as np
+
+LIDAR_FORMATS = ['npz', 'bin']
+
+
+def focal_length(width, fov):
+    """
+    :param fov: horizontal field of view of the camera in degrees
+    """
+    return width / (2 * np.tan(np.radians(fov) / 2))
+
+
+@lru_cache(maxsize=16)
+def ray_table(width, height, fov):
+    """
+    y and z of the ray of every pixel at depth 1 in the camera frame of carla (x forward, y right, z up),
+    computed once per (width, height, fov)
+    :return: read only float32 arrays (H, W): (u - cx) / f and -(v - cy) / f
+    """
+    f = focal_length(width, fov)
+    u = (np.arange(width, dtype=np.float32) - width / 2) / f
+    v = -(np.arange(height, dtype=np.float32) - height / 2) / f
+    rays_y, rays_z = np.meshgrid(u, v)
+    rays_y.setflags(write=False)
+    rays_z.setflags(write=False)
+    return rays_y, rays_z
+
+
+@lru_cache(maxsize=16)
+def lidar_pixels(width, height, fov, channels=128, upper_fov=15., lower_fov=-25., points_per_channel=1953):
+    """
+    pixels which are hit by the rays of a rotating lidar (the sensor.lidar.ray_cast_semantic settings of
+    save_cc.py: 2500000 points per second at 10 Hz --> 1953 points per channel and rotation),
+    computed once per setting
+    :param channels:            number of lasers, spread evenly between lower_fov and upper_fov (degrees)
+    :param points_per_channel:  points of a laser per rotation (360 degrees)
+    :return:                    read only flat pixel indices (N,) within the camera image
+    """
+    f = focal_length(width, fov)
+    elevation = np.radians(np.linspace(upper_fov, lower_fov, channels))
+    azimuth = np.radians(np.arange(-fov / 2, fov / 2, 360. / points_per_channel))
+    elevation, azimuth = np.meshgrid(elevation, azimuth, indexing='ij')
+    u = np.round(width / 2 + f * np.tan(azimuth)).astype(np.int64)
+    v = np.round(height / 2 - f * np.tan(elevation) / np.cos(azimuth)).astype(np.int64)
+    inside = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+    pixels = v[inside] * width + u[inside]
+    pixels.setflags(write=False)
+    return pixels
+
+
+def depth_to_points(depth, labels=None, fov=90., pixels=None, max_range=999.):
+    """
+    labeled point cloud of a depth camera in its carla frame: x = d, y = d (u - cx) / f, z = -d (v - cy) / f
+    :param depth:       depth (H, W) in m (utils.depth.decode_depth), the distance along the camera axis
+    :param labels:      carla ids (H, W) of the semantic segmentation camera at the same pose, optional
+    :param fov:         horizontal field of view of the camera in degrees
+    :param pixels:      flat pixel indices (lidar_pixels), default: every pixel
+    :param max_range:   points at the far plane (sky) and beyond are dropped
+    :return:            points (N, 3) float32 and labels (N,) uint8 (None without labels)
+    """
+    height, width = depth.shape
+    rays_y, rays_z = ray_table(width, height, float(fov))
+    d = depth.reshape(-1).astype(np.float32, copy=False)
+    rays_y, rays_z = rays_y.reshape(-1), rays_z.reshape(-1)
+    if pixels is not None:
+        d, rays_y, rays_z = d[pixels], rays_y[pixels], rays_z[pixels]
+    valid = d < max_range
+    index = np.flatnonzero(valid) if pixels is None else pixels[valid]
+    d = d[valid]
+    points = np.empty((len(d), 3), dtype=np.float32)
+    points[:, 0] = d
+    np.multiply(d, rays_y[valid], out=points[:, 1])
+    np.multiply(d, rays_z[valid], out=points[:, 2])
+    if labels is None:
+        return points, None
+    return points, labels.reshape(-1)[index].astype(np.uint8, copy=False)
+
+
+def save_points(path, points, labels=None):
+    """
+    :param path:    .npz (points float32 (N, 3), labels uint8 (N,)) or .bin (float32 (N, 4): x, y, z, label,
+                    like the KITTI velodyne files)
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if os.path.splitext(path)[1] == '.bin':
+        data = np.empty((len(points), 4), dtype=np.float32)
+        data[:, :3] = points
+        data[:, 3] = 0 if labels is None else labels
+        data.tofile(path)
+    elif labels is None:
+        np.savez(path, points=points)
+    else:
+        np.savez(path, points=points, labels=labels)
+
+
+def load_points(path):
+    """
+    :return: points (N, 3) float32 and labels (N,) uint8 (None if not stored)
+    """
+    if os.path.splitext(path)[1] == '.bin':
+        data = np.fromfile(path, dtype=np.float32).reshape(-1, 4)
+        return data[:, :3], data[:, 3].astype(np.uint8)
+    with np.load(path) as data:
+        return data['points'], data['labels'] if 'labels' in data else None
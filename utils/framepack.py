@@ -0,0 +1,171 @@
+import os
+import json
+import mmap
+import glob
+import struct
+import threading
+import cv2
+import numpy as np
+
+from utils.codec import check_codec, encode_frame, decode_frame
+
+MAGIC = b'AEYEPCK1'
+INDEX_MAGIC = b'AEYEIDX1'
+FOOTER = struct.Struct('<Q8s')  # offset of the index, INDEX_MAGIC
+PACK_CODECS = [None, 'lz4', 'png']
+# sensor folders of save_cc.py, each one is a stream of the pack
+STREAMS = ['01_cam', '02_semseg_cs', '02_semseg_raw', '06_depth_raw', os.path.join('12_bird', '01_cam'),
+           os.path.join('12_bird', '02_semseg_cs'), os.path.join('12_bird', '02_semseg_raw')]
+
+
+def pack_path(root, name_rec):
+    """
+    :param root:        scene folder
+    :param name_rec:    name of the recording
+    """
+    return os.path.join(root, f'{name_rec}.pack')
+
+
+def encode(array, codec):
+    if codec == 'png':
+        ok, data = cv2.imencode('.png', array, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise RuntimeError('png encoding failed')
+        return data.tobytes()
+    if codec == 'lz4':
+        return encode_frame(np.ascontiguousarray(array), codec)
+    return np.ascontiguousarray(array).tobytes()
+
+
+class FramePackWriter():
+    """
+    writes the frames of all sensors of a recording into one file instead of one png per sensor and frame
+    the frames are appended (raw, lz4 or png encoded), the index of every stream (sensor) and frame is
+    written at the end by close(), so the file is only valid after close()
+    write() can be called by several writer threads, the encoding runs in parallel
+    """
+    def __init__(self, path, codec='lz4'):
+        """
+        :param path:    pack file
+        :param codec:   [None, lz4, png] compression of the frames, all lossless
+        """
+        if codec not in PACK_CODECS:
+            raise ValueError(f'codec {codec} is not supported, choose from {PACK_CODECS}')
+        if codec == 'lz4':
+            check_codec(codec)
+        self.path = path
+        self.codec = codec
+        self.streams = {}
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+
+    def write(self, stream, frame, array):
+        """
+        :param stream:  name of the sensor, e.g. '01_cam'
+        :param frame:   frame number, a frame which is written again replaces the former one
+        :param array:   uint8 array, e.g. BGRA image (H, W, 4)
+        """
+        data = encode(array, self.codec)
+        with self.lock:
+            info = self.streams.setdefault(stream, {'shape': list(array.shape), 'dtype': str(array.dtype), 'frames': {}})
+            info['frames'][str(frame)] = [self.file.tell(), len(data)]
+            self.file.write(data)
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            offset = self.file.tell()
+            self.file.write(json.dumps({'codec': self.codec, 'streams': self.streams}).encode())
+            self.file.write(FOOTER.pack(offset, INDEX_MAGIC))
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FramePack():
+    """
+    reads the frames of a pack, random access by stream and frame number
+    the file is memory mapped, so the pack can be shared with the workers of a DataLoader
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC or self.map[-len(INDEX_MAGIC):] != INDEX_MAGIC:
+            raise IOError(f'{path} is not a complete frame pack')
+        offset, _ = FOOTER.unpack(self.map[-FOOTER.size:])
+        index = json.loads(self.map[offset:len(self.map) - FOOTER.size].decode())
+        self.codec = index['codec']
+        self.streams = index['streams']
+
+    def frames(self, stream):
+        """
+        :return: sorted frame numbers of the stream
+        """
+        if stream not in self.streams:
+            return []
+        return sorted(int(frame) for frame in self.streams[stream]['frames'])
+
+    def has(self, stream, frame):
+        return stream in self.streams and str(frame) in self.streams[stream]['frames']
+
+    def read(self, stream, frame):
+        """
+        :return: the written array, read only for uncompressed packs
+        """
+        info = self.streams[stream]
+        offset, nbytes = info['frames'][str(frame)]
+        if self.codec is None:
+            return np.frombuffer(self.map, dtype=info['dtype'], count=nbytes // np.dtype(info['dtype']).itemsize,
+                                 offset=offset).reshape(info['shape'])
+        data = self.map[offset:offset + nbytes]
+        if self.codec == 'png':
+            return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        return decode_frame(data, 'lz4', info['shape'], info['dtype'])
+
+    def close(self):
+        self.map.close()
+
+
+#----------- conversion from and to the folder layout -----------
+def pack_recording(root, name_rec, codec='lz4', streams=STREAMS, remove=False):
+    """
+    writes the png files of a recording (root/<stream>/<name_rec>/<frame>.png) into root/<name_rec>.pack
+    :param remove:  removes the png files afterwards
+    :return:        path of the pack
+    """
+    path = pack_path(root, name_rec)
+    files = []
+    with FramePackWriter(path, codec) as pack:
+        for stream in streams:
+            for file in sorted(glob.glob(os.path.join(root, stream, name_rec, '*.png'))):
+                frame = int(os.path.splitext(os.path.basename(file))[0])
+                pack.write(stream, frame, cv2.imread(file, cv2.IMREAD_UNCHANGED))
+                files.append(file)
+    if remove:
+        for file in files:
+            os.remove(file)
+    return path
+
+
+def unpack_recording(path, root=None):
+    """
+    writes the frames of a pack as png files in the folder layout of save_cc.py
+    :param root:    scene folder, default: folder of the pack
+    """
+    root = os.path.dirname(path) if root is None else root
+    name_rec = os.path.splitext(os.path.basename(path))[0]
+    pack = FramePack(path)
+    for stream in pack.streams:
+        folder = os.path.join(root, stream, name_rec)
+        os.makedirs(folder, exist_ok=True)
+        for frame in pack.frames(stream):
+            cv2.imwrite(os.path.join(folder, '{0:05d}.png'.format(frame)), pack.read(stream, frame))
+    pack.close()
@@ -1,18 +1,27 @@
 import numpy as np
 import torch
 import os
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
 
-from torchvision.transforms import Compose, Normalize, ToTensor, ToPILImage
-from models.fast_scnn import FastSCNN
-from models.bisenetv2 import BiSeNetV2
 from utils.carla_dataloader import Carla
+from utils.preprocessing import Preprocessing, inference_size, upsample_nearest
+from utils.palette import colorize
+from utils.deploy import deploy
+from utils.networks import get_network_name, load_network
+from utils.quantization import precision_dtype, quantize_int8, calibration_frames
+from utils.onnx_runtime import OnnxNetwork, onnx_path
 import config as cfg
 import carla
 
 def carla_colorize(arr):
-    imc = arr.convert('P')
-    imc.putpalette(Carla.color_palette_train_ids)
-    return imc.convert('RGB')
+    """
+    colorizes a class map with the precomputed lookup table of the train ids (Carla.labels)
+    :param arr: class map (..., H, W) as numpy array or torch tensor, a tensor is colorized on its device
+    """
+    return colorize(arr, Carla.color_lut_train_ids)
 
 
 def img_enlargement(img, width, height):
@@ -35,25 +44,63 @@ def output_folders_inference():
     return path
 
 
+def get_device():
+    """
+    returns the GPU if available, otherwise the CPU
+    """
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+
 class Inference():
-    def __init__(self, ckpt):
+    def __init__(self, ckpt, device=None, precision=None, backend=None):
+        """
+        :param ckpt:        checkpoint name (see config.py)
+        :param device:      torch device, if None the GPU is used when available, otherwise the CPU
+        :param precision:   'fp32', 'bf16', 'fp16' or 'int8' (CPU only), default: config.precision
+        :param backend:     'torch' or 'onnx' (ONNX Runtime on the CPU, fp32 only), default: config.backend
+        """
         if ckpt:
             self.ckpt = ckpt
-            self.torch_transform = Compose([ToTensor(), Normalize(Carla.mean, Carla.std)])
-            
-            models =['FastSCNN', 'bisenetv2']
-            for model in models:
-                if model in ckpt:
-                    self.model_name = model
-            
-            if self.model_name == models[0]:
-                self.network = FastSCNN(in_channels=3, num_classes=Carla.num_train_ids)
-                
-            elif self.model_name == models[1]:
-                self.network = BiSeNetV2(n_classes=Carla.num_train_ids)
-                # self.network = TRTModule()
-            self.network.load_state_dict(torch.load(os.path.join(os.getcwd(), 'weights', self.ckpt + '.pth')))
-            self.network.cuda().eval()
+            self.device = device if device is not None else get_device()
+            self.precision = precision if precision is not None else cfg.precision
+            self.backend = backend if backend is not None else cfg.backend
+            if self.backend == 'onnx' and self.precision != 'fp32':
+                logging.warning('the onnx backend runs in fp32 only')
+                self.precision = 'fp32'
+            if (self.precision == 'int8' or self.backend == 'onnx') and self.device.type != 'cpu':
+                logging.warning(f'{self.backend} {self.precision} inference runs on the CPU only')
+                self.device = torch.device('cpu')
+            self.dtype = torch.float32 if self.precision == 'int8' else precision_dtype(self.precision, self.device)
+            self.preprocessing = Preprocessing(Carla.mean, Carla.std, self.device, cfg.inference_scale)
+            self.model_name = get_network_name(ckpt)
+            self.channels_last = cfg.deploy and cfg.channels_last and self.precision != 'int8' and self.backend == 'torch'
+            if self.backend == 'onnx':
+                # exported graph with folded batch norms (export_onnx.py)
+                self.network = OnnxNetwork(onnx_path(ckpt))
+            elif self.backend == 'torch':
+                self.network = self.load_torch_network()
+            else:
+                raise ValueError(f'backend {self.backend} is not supported')
+
+    def load_torch_network(self):
+        network = load_network(self.ckpt, self.device, cfg.bisenet_aux_mode)
+        if self.precision == 'int8':
+            # the FX quantization fuses conv --> bn --> relu itself, deploy() only traces
+            network = quantize_int8(network, self.calibration(), cfg.quantization_backend)
+        else:
+            network = network.to(self.dtype)
+        if cfg.deploy:
+            example = torch.zeros((1, 3, *inference_size(cfg.height, cfg.width, cfg.inference_scale)), 
+                                  device=self.device, dtype=self.dtype)
+            network = deploy(network, example, self.channels_last, cfg.jit)
+        return network
+
+    def calibration(self):
+        """
+        normalized recorded frames for the int8 calibration
+        """
+        for frame in calibration_frames(cfg.calibration_root, cfg.calibration_frames):
+            yield self.preprocessing(frame).clone()
 
     def processing(self, image):
         """
@@ -61,20 +108,255 @@ class Inference():
         """
         #----------- preprocessing -----------
         image.convert(carla.ColorConverter.Raw)     # raw data needed!!!
-        array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
-        array = np.reshape(array, (image.height, image.width, 4))
-        array = array[:, :, :3]
-        array = array[:, :, ::-1] # swap first and third channel (bgr-->rgb)
-        img = array.copy()
+        x = self.preprocessing(image)               # normalized rgb tensor (1, 3, H, W)
         #----------- inference -----------
-        x = self.torch_transform(img).unsqueeze_(0).cuda() # unsqueeze --> add a channel
-        # with torch.no_grad():
-        if self.model_name == 'bisenetv2':
-            y_trt = self.network(x)[0]
-        else:
-            y_trt = self.network(x)
-        pred = y_trt.argmax(dim=1)[0].cpu()#.numpy()
-        pred = ToPILImage()(pred.to(dtype=torch.uint8))
+        with torch.inference_mode():
+            pred = self.predict(x).to(dtype=torch.uint8)
+            pred = upsample_nearest(pred, (image.height, image.width))[0]    # back to the camera resolution
         #----------- unique/converting -----------
-        mask = np.array(carla_colorize(pred)) 
-        return mask
\ No newline at end of file
+        mask = carla_colorize(pred).cpu().numpy()    # colorized on the device, only the mask is transferred
+        return mask
+
+    def predict(self, x):
+        """
+        forward pass, returns the class map (N, H, W)
+        :param x: normalized input tensor (N, 3, H, W)
+        """
+        x = x.to(device=self.device, dtype=self.dtype)
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        y_trt = self.network(x)
+        if isinstance(y_trt, (tuple, list)):    # bisenetv2 in 'eval' mode
+            y_trt = y_trt[0]
+        if y_trt.dim() == 3:                    # bisenetv2 in 'pred' mode returns the argmax
+            return y_trt
+        return y_trt.argmax(dim=1)
+
+
+class InferenceEngine():
+    """
+    holds the networks of several checkpoints and runs each frame through all active 
+    networks at once, so checkpoints can be compared side by side (A/B)
+    frames are preprocessed once and shared by all networks, the class maps of all 
+    networks are colorized as one batch with a single transfer back to the host
+    """
+    def __init__(self, ckpts, device=None, output='mask', colorize_on_device=True, cache_size=None, prefetch=False):
+        """
+        :param ckpts:               list of checkpoint names (see config.py)
+        :param device:              torch device, if None the GPU is used when available, otherwise the CPU
+        :param output:              'mask' for colorized masks (H, W, 3), 'class_map' for uint8 train ids (H, W)
+                                    or 'both' for (mask, class_map) pairs
+        :param colorize_on_device:  colorize on the device of the networks, so only the colored mask is 
+                                    transferred, otherwise the uint8 class map is transferred and colorized on the host
+        :param cache_size:          number of networks held in memory, the least recently used one is unloaded,
+                                    None holds all networks
+        :param prefetch:            load the networks in a background thread (at startup up to the cache size and 
+                                    when they are selected), otherwise they are loaded by the first frame which needs them
+        """
+        self.device = device if device is not None else get_device()
+        self.output = output
+        self.colorize_on_device = colorize_on_device
+        self.ckpts = [ckpt for ckpt in ckpts if ckpt]
+        self.cache_size = max(1, cache_size) if cache_size is not None else len(self.ckpts)
+        self.prefetch_models = prefetch
+        self.models = OrderedDict()     # ckpt --> Inference, least recently used first
+        self.streams = {}               # one cuda stream per network, the forward passes of the active networks can overlap
+        self.lock = threading.Lock()        # guards models
+        self.load_lock = threading.Lock()   # one network is loaded at a time
+        self.preprocessing = Preprocessing(Carla.mean, Carla.std, self.device, cfg.inference_scale)
+        self.active = list(self.ckpts[:1])
+        for ckpt in self.active:    # only the first network is loaded at startup
+            self.get_model(ckpt)
+        if self.prefetch_models:
+            self.prefetch(self.ckpts[1:self.cache_size])
+
+    def get_model(self, ckpt):
+        """
+        returns the network of a checkpoint, it is loaded if it is not cached
+        """
+        with self.lock:
+            if ckpt in self.models:
+                self.models.move_to_end(ckpt)
+                return self.models[ckpt]
+        with self.load_lock:
+            with self.lock:     # loaded by another thread in the meantime
+                if ckpt in self.models:
+                    self.models.move_to_end(ckpt)
+                    return self.models[ckpt]
+            start = time.perf_counter()
+            model = Inference(ckpt, self.device)
+            logging.info(f'loaded {ckpt} in {time.perf_counter() - start:.2f} s')
+            with self.lock:
+                self.models[ckpt] = model
+                if self.device.type == 'cuda' and ckpt not in self.streams:
+                    self.streams[ckpt] = torch.cuda.Stream(device=self.device)
+                for old in list(self.models):
+                    if len(self.models) <= self.cache_size:
+                        break
+                    if old not in self.active and old != ckpt:
+                        del self.models[old]
+                        logging.info(f'unloaded {old}')
+        return model
+
+    def prefetch(self, ckpts):
+        """
+        loads the networks in a background thread
+        """
+        with self.lock:
+            ckpts = [ckpt for ckpt in ckpts if ckpt not in self.models]
+        if ckpts:
+            threading.Thread(target=lambda: [self.get_model(ckpt) for ckpt in ckpts], 
+                             name='ModelPrefetch', daemon=True).start()
+
+    def set_active(self, ckpts):
+        """
+        select the networks each frame is processed with, networks which are not cached are loaded 
+        in the background (prefetch) or by the next frame, so the caller is never blocked
+        :param ckpts: checkpoint name or list of checkpoint names
+        """
+        if isinstance(ckpts, str):
+            ckpts = [ckpts]
+        for ckpt in ckpts:
+            if ckpt not in self.ckpts:
+                raise KeyError(f'checkpoint {ckpt} is not configured')
+        self.active = list(ckpts)
+        if self.prefetch_models:
+            self.prefetch(ckpts)
+
+    def processing(self, images):
+        """
+        runs the frames through all active networks
+        :param images:  carla image or list of carla images
+        :return:        dict {ckpt: mask} with the colorized masks (H, W, 3) or class maps (H, W), 
+                        for a list of images each mask gets the leading dimension N
+        """
+        single = not isinstance(images, (list, tuple))
+        if single:
+            images = [images]
+        active = list(self.active)
+        if not active:
+            return {}
+        for image in images:
+            image.convert(carla.ColorConverter.Raw)     # raw data needed!!!
+        x = self.preprocessing(images)
+        models = [self.get_model(ckpt) for ckpt in active]
+        preds = []
+        with torch.inference_mode():
+            for ckpt, model in zip(active, models):
+                if ckpt in self.streams:
+                    self.streams[ckpt].wait_stream(torch.cuda.current_stream(self.device))
+                    with torch.cuda.stream(self.streams[ckpt]):
+                        preds.append(model.predict(x).to(self.device, non_blocking=True))
+                else:
+                    # cpu models (int8, onnx) return host tensors, all class maps are concatenated on the device
+                    preds.append(model.predict(x).to(self.device, non_blocking=True))
+            for ckpt in active:
+                if ckpt in self.streams:
+                    torch.cuda.current_stream(self.device).wait_stream(self.streams[ckpt])
+            # (M*N, H, W) class maps of all networks --> one transfer to the host
+            preds = torch.cat(preds).to(dtype=torch.uint8)
+            preds = upsample_nearest(preds, (images[0].height, images[0].width))   # back to the camera resolution
+            class_maps = preds.cpu().numpy() if self.output in ('class_map', 'both') else None
+            if self.output == 'class_map':
+                masks = class_maps
+            elif self.colorize_on_device:
+                masks = carla_colorize(preds).cpu().numpy()
+            else:
+                masks = carla_colorize(class_maps if class_maps is not None else preds.cpu().numpy())
+        masks = masks.reshape(len(active), len(images), *masks.shape[1:])
+        masks = {ckpt: mask[0] if single else mask for ckpt, mask in zip(active, masks)}
+        if self.output == 'both':
+            class_maps = class_maps.reshape(len(active), len(images), *class_maps.shape[1:])
+            return {ckpt: (masks[ckpt], class_map[0] if single else class_map) for ckpt, class_map in zip(active, class_maps)}
+        return masks
+
+
+
+class InferenceWorker():
+    """
+    runs the inference engine in its own thread, decoupled from the carla sensor callback
+    the frames wait in a bounded queue, if it is full the oldest frame is dropped (latest frame wins),
+    so a slow forward pass never backs up the sensor delivery
+    the render loop reads the most recent completed result with get()
+    """
+    def __init__(self, engine, maxsize=1):
+        """
+        :param engine:  InferenceEngine
+        :param maxsize: number of frames which can wait for the inference
+        """
+        self.engine = engine
+        self.frames = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.result = None
+        self.new_result = False
+        #----------- counters -----------
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.latency = 0.       # end-to-end latency of the last result [s]
+        self.mean_latency = 0.  # exponential moving average [s]
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='InferenceWorker', daemon=True)
+        self.thread.start()
+
+    def put(self, image):
+        """
+        hands a frame over to the worker, called in the sensor callback
+        """
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append((image, time.perf_counter()))
+            self.received += 1
+            self.condition.notify()
+
+    def get(self):
+        """
+        :return: (masks, image) of the most recent completed frame, None if there is no new result
+        """
+        with self.condition:
+            if not self.new_result:
+                return None
+            self.new_result = False
+            return self.result
+
+    def stats(self):
+        """
+        counters for dropped frames, queue depth and end-to-end latency
+        """
+        with self.condition:
+            return {
+                'received':     self.received,
+                'processed':    self.processed,
+                'dropped':      self.dropped,
+                'queue_depth':  len(self.frames),
+                'latency':      self.latency,
+                'mean_latency': self.mean_latency}
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.frames.clear()
+            self.condition.notify()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.frames:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                image, received = self.frames.popleft()
+            try:
+                masks = self.engine.processing(image)
+            except Exception:
+                logging.exception('inference failed')
+                continue
+            latency = time.perf_counter() - received
+            with self.condition:
+                self.result = (masks, image)
+                self.new_result = True
+                self.processed += 1
+                self.latency = latency
+                self.mean_latency = latency if self.processed == 1 else 0.9 * self.mean_latency + 0.1 * latency
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:     # windows, the manifest is used by a single process
+    fcntl = None
+
+STATES = ['pending', 'running', 'done', 'failed']
+
+
+class JobManifest():
+    """
+    persistent list of the corner case extraction jobs, one job per (scene, recording file)
+    the manifest is a json file which is rewritten atomically (os.replace) after every change, so an
+    interrupted run resumes with the jobs which are not done yet
+    several processes (one per CARLA server) share the manifest, every change is made under a file lock
+    on the freshly loaded manifest
+    """
+    def __init__(self, path):
+        """
+        :param path:    json file of the manifest, created if it does not exist
+        """
+        self.path = path
+        self.jobs = {}
+        if os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def key(scene, file):
+        return f'{scene}/{file}'
+
+    def load(self):
+        with open(self.path) as f:
+            self.jobs = json.load(f)['jobs']
+
+    def save(self):
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'jobs': self.jobs}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)  # atomic, the manifest is never half written
+
+    @contextmanager
+    def locked(self):
+        """
+        exclusive access to the manifest, the jobs are reloaded before and saved after the change
+        """
+        lock = open(f'{self.path}.lock', 'w')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(self.path):
+                self.load()
+            yield self.jobs
+            self.save()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+    def add(self, scene, files):
+        """
+        adds the jobs of a scene, known jobs keep their state
+        :param files:   recording files of the scene
+        """
+        with self.locked() as jobs:
+            for file in files:
+                jobs.setdefault(self.key(scene, file), {
+                    'scene': scene, 'file': file, 'state': 'pending', 'port': None, 'attempts': 0,
+                    'error': None, 'updated': time.time()})
+
+    def reset(self, retry_failed=False):
+        """
+        jobs which were running when the last run was interrupted are pending again
+        call it once before the workers are started
+        :param retry_failed:    failed jobs are pending again as well
+        """
+        states = ['running', 'failed'] if retry_failed else ['running']
+        with self.locked() as jobs:
+            for job in jobs.values():
+                if job['state'] in states:
+                    job['state'] = 'pending'
+
+    def claim(self, port=None):
+        """
+        marks the next pending job as running
+        :param port:    port of the CARLA server which runs the job
+        :return:        job dict or None if no job is pending
+        """
+        with self.locked() as jobs:
+            for key in sorted(jobs):
+                job = jobs[key]
+                if job['state'] == 'pending':
+                    job.update(state='running', port=port, attempts=job['attempts'] + 1, error=None, updated=time.time())
+                    return dict(job)
+        return None
+
+    def finish(self, job, error=None):
+        """
+        marks a job as done (or failed)
+        :param error:   error message of a failed job
+        :return:        True if all jobs of the scene are done
+        """
+        with self.locked() as jobs:
+            jobs[self.key(job['scene'], job['file'])].update(
+                state='done' if error is None else 'failed', error=error, updated=time.time())
+            return all(j['state'] == 'done' for j in jobs.values() if j['scene'] == job['scene'])
+
+    def summary(self):
+        """
+        number of jobs per state
+        """
+        if os.path.exists(self.path):
+            self.load()
+        count = {state: 0 for state in STATES}
+        for job in self.jobs.values():
+            count[job['state']] += 1
+        return count
@@ -0,0 +1,31 @@
+import numpy as np
+
+from utils.carla_dataloader import Carla
+
+
+def confusion_matrix(pred, target, num_classes=Carla.num_train_ids, ignore_index=255):
+    """
+    :param pred:    predicted train ids (H, W)
+    :param target:  ground truth train ids (H, W), ignore_index is not evaluated
+    :return:        (num_classes, num_classes) matrix, rows: ground truth, columns: prediction
+    """
+    valid = target != ignore_index
+    index = num_classes * target[valid].astype(np.int64) + pred[valid].astype(np.int64)
+    return np.bincount(index, minlength=num_classes**2).reshape(num_classes, num_classes)
+
+
+def iou(conf):
+    """
+    intersection over union per class, nan for classes which neither occur nor are predicted
+    """
+    tp = np.diag(conf).astype(np.float64)
+    union = conf.sum(axis=0) + conf.sum(axis=1) - tp
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return tp / union
+
+
+def mean_iou(conf):
+    """
+    mean intersection over union over Carla.train_ids
+    """
+    return float(np.nanmean(iou(conf)[Carla.train_ids]))
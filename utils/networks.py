@@ -0,0 +1,39 @@
+import os
+import torch
+
+from models.fast_scnn import FastSCNN
+from models.bisenetv2 import bisenetv2_inference
+from utils.carla_dataloader import Carla
+
+model_names = ['FastSCNN', 'bisenetv2']
+
+
+def get_network_name(ckpt):
+    """
+    :param ckpt: checkpoint name, needs to contain the network name (FastSCNN or bisenetv2)
+    """
+    for model in model_names:
+        if model in ckpt:
+            return model
+    raise ValueError(f'no known network in checkpoint name {ckpt}')
+
+
+def load_network(ckpt, device='cpu', bisenet_aux_mode='eval', path=None):
+    """
+    builds the network of a checkpoint for inference and loads its weights
+    :param ckpt:                checkpoint name (see config.py)
+    :param device:              torch device
+    :param bisenet_aux_mode:    'eval' or 'pred', the aux heads of BiSeNetV2 are skipped
+    :param path:                checkpoint file, default: weights/<ckpt>.pth
+    """
+    if path is None:
+        path = os.path.join(os.getcwd(), 'weights', ckpt + '.pth')
+    state_dict = torch.load(path, map_location=device)
+    if get_network_name(ckpt) == 'FastSCNN':
+        network = FastSCNN(in_channels=3, num_classes=Carla.num_train_ids)
+        network.load_state_dict(state_dict)
+    else:
+        # main head only, the aux heads of the training checkpoint are skipped
+        network = bisenetv2_inference(Carla.num_train_ids, state_dict, bisenet_aux_mode)
+        # network = TRTModule()
+    return network.to(device).eval()
@@ -0,0 +1,106 @@
+import os
+import copy
+import inspect
+import torch
+from torch import nn
+
+from utils.deploy import fuse_bn
+
+
+def onnx_path(ckpt):
+    """
+    exported ONNX graph of a checkpoint: weights/<ckpt>.onnx
+    """
+    return os.path.join(os.getcwd(), 'weights', ckpt + '.onnx')
+
+
+def pooling_matrix(in_size, out_size):
+    """
+    (out_size, in_size) averaging matrix of the bins of an adaptive average pooling
+    """
+    matrix = torch.zeros((out_size, in_size))
+    for i in range(out_size):
+        start, end = (i * in_size) // out_size, -((-(i + 1) * in_size) // out_size)
+        matrix[i, start:end] = 1. / (end - start)
+    return matrix
+
+
+class FixedAdaptiveAvgPool2d(nn.Module):
+    """
+    AdaptiveAvgPool2d for a fixed input size as two matrix products, ONNX has no adaptive pooling 
+    for output sizes which are not a factor of the input size (PPMModule of FastSCNN)
+    """
+    def __init__(self, in_size, out_size):
+        super().__init__()
+        self.register_buffer('rows', pooling_matrix(in_size[0], out_size[0]))
+        self.register_buffer('cols', pooling_matrix(in_size[1], out_size[1]).t().contiguous())
+
+    def forward(self, x):
+        return torch.matmul(torch.matmul(self.rows, x), self.cols)
+
+
+def fix_adaptive_pooling(network, example):
+    """
+    replaces the adaptive average poolings by FixedAdaptiveAvgPool2d for the resolution of the example input
+    """
+    sizes = {}
+    hooks = [module.register_forward_hook(lambda module, x, y: sizes.__setitem__(module, (x[0].shape[-2:], y.shape[-2:])))
+             for module in network.modules() if isinstance(module, nn.AdaptiveAvgPool2d)]
+    with torch.no_grad():
+        network(example)
+    for hook in hooks:
+        hook.remove()
+    for module in list(network.modules()):
+        for name, child in module.named_children():
+            if child in sizes:
+                setattr(module, name, FixedAdaptiveAvgPool2d(*sizes[child]))
+    return network
+
+
+def export_onnx(network, path, example, opset=11):
+    """
+    exports a network with folded batch norms, the batch dimension is dynamic, the network itself is not changed
+    :param network: network with loaded weights
+    :param path:    output file
+    :param example: input tensor (N, 3, H, W), fixes the input resolution
+    :param opset:   ONNX opset version
+    """
+    network = fix_adaptive_pooling(fuse_bn(copy.deepcopy(network).cpu().eval()), example.cpu())
+    kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        kwargs['dynamo'] = False    # TorchScript based exporter, the default up to torch 2.8
+    with torch.no_grad():
+        torch.onnx.export(network, example.cpu(), path, input_names=['input'], output_names=['output'],
+                          dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}}, opset_version=opset, **kwargs)
+    return path
+
+
+class OnnxNetwork():
+    """
+    runs an exported ONNX graph with ONNX Runtime on the CPU, can be used like the torch network:
+    called with the normalized input tensor (N, 3, H, W) it returns the output tensor
+    """
+    def __init__(self, path, threads=None):
+        """
+        :param path:    ONNX file (see export_onnx.py)
+        :param threads: number of intra op threads, default: ONNX Runtime decides
+        """
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError('cannot import onnxruntime, make sure onnxruntime package is installed')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'{path} does not exist, export the checkpoint with export_onnx.py')
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads is not None:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        out = self.session.run(None, {self.input_name: x.detach().cpu().float().contiguous().numpy()})[0]
+        return torch.from_numpy(out)
+
+    def eval(self):
+        return self
@@ -0,0 +1,29 @@
+import numpy as np
+import torch
+
+_device_luts = {}
+
+
+def device_lut(lut, device):
+    """
+    returns the lookup table as tensor on the given device, the copy is made once per device
+    :param lut:     (256, 3) uint8 numpy lookup table
+    :param device:  torch device
+    """
+    key = (id(lut), str(device))
+    if key not in _device_luts:
+        _device_luts[key] = torch.from_numpy(np.ascontiguousarray(lut)).to(device)
+    return _device_luts[key]
+
+
+def colorize(class_map, lut):
+    """
+    colorizes a class map with a single gather in the lookup table
+    :param class_map:   class ids (..., H, W) as numpy array or torch tensor, 
+                        a tensor is colorized on its device
+    :param lut:         (256, 3) uint8 lookup table class id --> color
+    :return:            colored mask (..., H, W, 3) uint8 of the same type (and device) as class_map
+    """
+    if isinstance(class_map, torch.Tensor):
+        return device_lut(lut, class_map.device)[class_map.long()]
+    return lut[class_map]
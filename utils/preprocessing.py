@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+import torch
+
+from utils.carla_dataloader import Carla
+
+
+def inference_size(height, width, scale=1.):
+    """
+    inference resolution (h, w) of a frame, rounded to a multiple of 32 (output stride of the networks)
+    """
+    if scale == 1.:
+        return (height, width)
+    return (max(32, int(round(height * scale / 32)) * 32), max(32, int(round(width * scale / 32)) * 32))
+
+
+def upsample_nearest(class_map, size):
+    """
+    nearest neighbour upsampling of class maps (same indices as F.interpolate(mode='nearest')), 
+    works for uint8 on every device
+    :param class_map:   tensor (N, h, w)
+    :param size:        output size (H, W)
+    """
+    if tuple(class_map.shape[-2:]) == tuple(size):
+        return class_map
+    h, w = class_map.shape[-2:]
+    rows = (torch.arange(size[0], device=class_map.device) * h // size[0]).view(-1, 1)
+    cols = torch.arange(size[1], device=class_map.device) * w // size[1]
+    return class_map[:, rows, cols]
+
+
+class Preprocessing():
+    """
+    converts the BGRA raw data of carla images into a normalized float tensor (N, 3, H, W)
+
+    replaces frombuffer --> slice --> channel flip --> copy --> ToTensor --> Normalize --> unsqueeze: 
+    the raw data is copied once into a preallocated uint8 buffer, the channel flip is done while 
+    casting into a preallocated float tensor and ToTensor + Normalize are folded into one fused 
+    scale and shift per channel (addcmul)
+        (x / 255 - mean) / std = x * 1 / (255 * std) - mean / std
+    so no full frame is allocated per frame
+
+    with a scale < 1 the frames are downsampled on the host (INTER_AREA) before the upload, so the network 
+    runs at the inference resolution independent of the camera / display resolution
+
+    the returned tensor is reused, it is overwritten by the next call
+    """
+    def __init__(self, mean=Carla.mean, std=Carla.std, device=None, scale=1.):
+        """
+        :param mean:    normalization mean per rgb channel
+        :param std:     normalization std per rgb channel
+        :param device:  torch device of the output tensor (default: cpu)
+        :param scale:   inference resolution relative to the frame resolution (see inference_size)
+        """
+        self.device = torch.device(device) if device is not None else torch.device('cpu')
+        self.input_scale = scale
+        self.scale = torch.tensor([1. / (255. * s) for s in std], 
+                                  dtype=torch.float32, device=self.device).view(1, 3, 1, 1)
+        self.shift = torch.tensor([-m / s for m, s in zip(mean, std)], 
+                                  dtype=torch.float32, device=self.device).view(1, 3, 1, 1)
+        self.shape = None
+        self.copied = None
+
+    def allocate(self, batch_size, height, width):
+        """
+        allocates the buffers for a batch of frames, pinned host memory is used for the upload to the GPU
+        """
+        use_cuda = self.device.type == 'cuda'
+        self.size = inference_size(height, width, self.input_scale)
+        height, width = self.size
+        self.host = torch.empty((batch_size, height, width, 4), dtype=torch.uint8, pin_memory=use_cuda)
+        self.host_array = self.host.numpy()
+        self.raw = torch.empty_like(self.host, device=self.device) if use_cuda else self.host
+        self.tensor = torch.empty((batch_size, 3, height, width), dtype=torch.float32, device=self.device)
+        self.copied = torch.cuda.Event() if use_cuda else None
+
+    def __call__(self, images):
+        """
+        :param images:  carla image or list of carla images with the same size,
+                        each needs raw_data (BGRA), height and width
+        :return:        normalized rgb tensor (N, 3, h, w) on self.device at the inference resolution
+        """
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        shape = (len(images), images[0].height, images[0].width)
+        if shape != self.shape:
+            self.allocate(*shape)
+            self.shape = shape
+        if self.copied is not None:
+            self.copied.synchronize()   # the last upload has to be finished before the buffer is overwritten
+        for i, image in enumerate(images):
+            frame = np.frombuffer(image.raw_data, dtype=np.dtype("uint8")).reshape(shape[1], shape[2], 4)
+            if self.size == shape[1:]:
+                self.host_array[i] = frame
+            else:
+                interpolation = cv2.INTER_AREA if self.size[0] < shape[1] else cv2.INTER_LINEAR
+                cv2.resize(frame, self.size[::-1], dst=self.host_array[i], interpolation=interpolation)
+        if self.copied is not None:
+            self.raw.copy_(self.host, non_blocking=True)
+            self.copied.record()
+        for c in range(3):
+            # rgb channel c is the bgra channel 2 - c
+            self.tensor[:, c].copy_(self.raw[..., 2 - c])
+        return torch.addcmul(self.shift, self.tensor, self.scale, out=self.tensor)
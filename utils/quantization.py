@@ -0,0 +1,70 @@
+import warnings
+import numpy as np
+import torch
+
+from utils.carla_dataloader import Carla, CarlaRecording, Frame
+
+PRECISIONS = ['fp32', 'bf16', 'fp16', 'int8']
+
+
+def precision_dtype(precision, device):
+    """
+    floating point type of the weights and inputs for a precision mode, falls back if the device does not support it
+    :param precision:   'fp32', 'bf16' or 'fp16' ('int8' keeps float inputs, see quantize_int8)
+    :param device:      torch device
+    """
+    device = torch.device(device)
+    if precision not in PRECISIONS:
+        raise ValueError(f'precision {precision} is not supported, choose from {PRECISIONS}')
+    if precision == 'fp16':
+        if device.type == 'cuda':
+            return torch.float16
+        warnings.warn('fp16 convolutions are not supported on the CPU, using bf16')
+        precision = 'bf16'
+    if precision == 'bf16':
+        if device.type == 'cuda' and not torch.cuda.is_bf16_supported():
+            warnings.warn('bf16 is not supported by this GPU, using fp16')
+            return torch.float16
+        return torch.bfloat16
+    return torch.float32
+
+
+def calibration_frames(root, max_frames=100):
+    """
+    recorded camera frames (01_cam) for the calibration of the INT8 quantization
+    :param root:        scene folder or folder with several scenes
+    :param max_frames:  number of frames
+    """
+    dataset = CarlaRecording(root, max_frames)
+    if len(dataset) == 0:
+        raise RuntimeError(f'no recorded frames (01_cam) found in {root} for the INT8 calibration')
+    for i in range(len(dataset)):
+        image, _ = dataset[i]
+        yield Frame(image)
+
+
+def quantize_int8(network, batches, backend='fbgemm'):
+    """
+    post-training static INT8 quantization (FX graph mode), CPU only
+    conv --> bn --> relu are fused by the FX prepare step, the activation ranges are observed on the calibration batches
+    :param network: float network in eval mode, its batch norms must not be folded yet
+    :param batches: iterable of normalized input tensors (N, 3, H, W) on the CPU
+    :param backend: 'fbgemm' (x86) or 'qnnpack' (ARM)
+    """
+    from torch.quantization import get_default_qconfig
+    from torch.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = backend
+    qconfig_dict = {'': get_default_qconfig(backend)}
+    network = network.cpu().eval()
+    batches = iter(batches)
+    example = next(batches)
+    try:
+        prepared = prepare_fx(network, qconfig_dict, example_inputs=(example,))
+    except TypeError:   # torch < 1.13 has no example inputs
+        prepared = prepare_fx(network, qconfig_dict)
+    with torch.no_grad():
+        prepared(example)
+        for x in batches:
+            prepared(x)
+    return convert_fx(prepared)
@@ -1,12 +1,22 @@
 import os
-import queue
+import cv2
+from functools import partial
+import numpy as np
 import imageio as iio
-from utils.tools import get_folder_name
+from utils.session import Session
+from utils.ringbuffer import RingBuffer, CompressedRingBuffer, ReferenceRingBuffer
+from utils.codec import check_codec, encode_frame, decode_frame, mask_bytes, max_seconds_before_cc
+from utils.palette import colorize
+from utils.carla_dataloader import Carla
+from utils.writer import AsyncWriter
 import config as cfg
 
 class Recording:
-    def __init__(self):
-        self.path_tmp = get_folder_name()
+    def __init__(self, session=None):
+        """
+        :param session: scene folder of the run (utils.session.Session), default: the latest one
+        """
+        self.path_tmp = (session if session is not None else Session.latest()).path
     def start(self, client, i_rec):
         client.start_recorder(os.path.join(self.path_tmp, '00_log', f'scene_recording_{i_rec}.log'), additional_data=True)
     def stop(self, client):
@@ -18,35 +28,99 @@ class Recording:
 
 class QRecording():
     """
-    saves inference and rgb image of last few seconds in queues which can be emptied 
+    saves inference and rgb image of last few seconds in ring buffers which can be emptied 
     when a cc occurs
+    to extend the history the masks can be kept as class id maps (3x smaller) and the camera 
+    frames jpeg or lz4 compressed, they are decoded by the writer after a cc
     """
-    def __init__(self, fps = 30, seconds_before_cc = 5, record_every_x_frames = 1):
+    def __init__(self, fps = 30, seconds_before_cc = 5, record_every_x_frames = 1, writer = None, 
+                 class_ids = False, compression = None, memory_mb = None, resolution = None, session = None):
+        """
+        :param writer:      AsyncWriter which writes the frames of a cc in the background
+        :param class_ids:   keep the masks as class id maps (H, W), add() needs the class map
+        :param compression: None, 'jpeg' or 'lz4', compression of the camera frames (lz4: also of the class id maps)
+        :param memory_mb:   memory budget of the history, seconds_before_cc is limited to the affordable seconds
+        :param resolution:  [width, height] of the camera frames (image_size_x/y), needed for the memory budget,
+                            default: cfg.resolution
+        :param session:     scene folder of the run (utils.session.Session), default: the latest one
+        """
+        check_codec(compression)
         self.fps = fps
-        self.seconds_before_cc = seconds_before_cc
         self.record_every_x_frames = record_every_x_frames
-        self.maskqueue = queue.Queue(maxsize = self.seconds_before_cc * self.fps // self.record_every_x_frames + 1)
-        self.camqueue =  queue.Queue(maxsize = self.seconds_before_cc * self.fps // self.record_every_x_frames + 1)
-        #self.mask = None
+        self.class_ids = class_ids
+        self.compression = compression
+        self.seconds_before_cc = seconds_before_cc
+        self.max_seconds = None
+        if memory_mb is not None:
+            width, height = resolution if resolution is not None else cfg.resolution
+            self.max_seconds = max_seconds_before_cc(memory_mb, width, height, fps, record_every_x_frames, 
+                                                     class_ids, compression)
+            if self.max_seconds < seconds_before_cc:
+                print(f'memory budget of {memory_mb} MB: only {self.max_seconds} s before a corner case are saved')
+                self.seconds_before_cc = max(1, self.max_seconds)
+        self.capacity = self.seconds_before_cc * self.fps // self.record_every_x_frames + 1
+        # the masks (class maps) are new arrays of the inference every frame, they are kept by reference,
+        # the camera frames in a preallocated (N, H, W, 3) uint8 buffer, allocated with the first frame,
+        # or rings of encoded frames
+        if self.compression == 'lz4' and self.class_ids:
+            self.masks = CompressedRingBuffer(self.capacity)
+        else:
+            self.masks = ReferenceRingBuffer(self.capacity)
+        if self.compression is not None:
+            # the encoded camera frames get the budget which is left by the masks (estimated)
+            max_bytes = None
+            if memory_mb is not None:
+                max_bytes = memory_mb * 2**20 - self.capacity * mask_bytes(width, height, class_ids, compression)
+            self.cams = CompressedRingBuffer(self.capacity, max_bytes)
+            self.scratch = None     # BGR / RGB frame which is encoded
+        else:
+            self.cams = RingBuffer(self.capacity)
         self.frame = 0
-        self.qitems = 0
-        self.path = get_folder_name()
+        self.shape = (0, 0)     # (H, W) of the recorded frames
+        self.path = (session if session is not None else Session.latest()).path
         self.cc_counter = 0
         self.wait = False
+        self.writer = writer if writer is not None else AsyncWriter(cfg.writer_workers, cfg.writer_max_pending)
+
+    @property
+    def qitems(self):
+        return len(self.masks)
+
+    @property
+    def nbytes(self):
+        """
+        memory of the buffered frames
+        """
+        return self.masks.nbytes + self.cams.nbytes
 
-    def add(self, mask, image):
+    def add(self, mask, image, class_map = None):
+        """
+        :param mask:        colorized inference mask (H, W, 3)
+        :param image:       carla image (raw BGRA), stored as rgb
+        :param class_map:   uint8 class id map (H, W), stored instead of the mask with class_ids
+        """
         if not self.wait:
             if self.frame % self.record_every_x_frames == 0:
-                if self.qitems < self.maskqueue.maxsize:
-                    self.maskqueue.put(mask)
-                    self.camqueue.put(image)
-                    self.qitems += 1
+                self.shape = (image.height, image.width)
+                if self.class_ids:
+                    if class_map is None:
+                        raise ValueError('QRecording with class_ids needs the class map')
+                    if self.compression == 'lz4':
+                        self.masks.push(encode_frame(np.ascontiguousarray(class_map), 'lz4'), self.frame)
+                    else:
+                        self.masks.push(class_map, self.frame)
                 else:
-                    self.maskqueue.get()
-                    self.camqueue.get()
-                    self.maskqueue.put(mask)
-                    self.camqueue.put(image)
-            #self.frame += self.record_every_x_frames
+                    self.masks.push(mask, self.frame)   # kept by reference, the inference does not reuse it
+                bgra = np.frombuffer(image.raw_data, dtype=np.uint8).reshape(image.height, image.width, 4)
+                if self.compression is None:
+                    cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=self.cams.slot((image.height, image.width, 3), self.frame))
+                else:
+                    # jpeg is encoded from BGR, lz4 keeps rgb
+                    code = cv2.COLOR_BGRA2BGR if self.compression == 'jpeg' else cv2.COLOR_BGRA2RGB
+                    if self.scratch is None or self.scratch.shape[:2] != bgra.shape[:2]:
+                        self.scratch = np.empty((image.height, image.width, 3), dtype=np.uint8)
+                    cv2.cvtColor(bgra, code, dst=self.scratch)
+                    self.cams.push(encode_frame(self.scratch, self.compression), self.frame)
             self.frame += 1
 
     def wait_on(self):
@@ -55,35 +129,97 @@ class QRecording():
     def wait_off(self):
         self.wait = False
 
-    def retrieve(self, cc_true):
-        try: 
-            if cc_true:
-                self.cc_counter += 1
-                infpath = os.path.join(self.path, "10_inference", f"cc_{self.cc_counter}")
-                campath = os.path.join(self.path, "01_cam", f"cc_{self.cc_counter}")
-                os.mkdir(infpath)
-                os.mkdir(campath)
-                frame = self.frame # fixed current frame for saving images
-        
-                for i in range(self.qitems):
-                    inf = self.maskqueue.get()
-                    cam = self.camqueue.get()
-                    iio.v3.imwrite(os.path.join(infpath, f"frame_{frame - self.record_every_x_frames * (self.qitems - i)}.jpg"), inf, plugin="pillow")
-                    cam.save_to_disk(os.path.join(campath, f"frame_{frame - self.record_every_x_frames * (self.qitems - i)}.jpg"))
-                # self.wait = False
-                    
-            
-            del self.maskqueue
-            del self.camqueue
-            self.maskqueue = queue.Queue(maxsize = self.seconds_before_cc * self.fps // self.record_every_x_frames + 1)
-            self.camqueue =  queue.Queue(maxsize = self.seconds_before_cc * self.fps // self.record_every_x_frames + 1)
-            self.qitems = 0
-            
-        except queue.Empty:
-            del self.maskqueue
-            del self.camqueue
-            self.maskqueue = queue.Queue(maxsize = self.seconds_before_cc * self.fps // self.record_every_x_frames + 1)
-            self.camqueue =  queue.Queue(maxsize = self.seconds_before_cc * self.fps // self.record_every_x_frames + 1)
-            self.qitems = 0
-            
-            return
\ No newline at end of file
+    def snapshot(self):
+        """
+        the buffered masks and camera frames (oldest first) with their frame numbers, the buffers are emptied
+        without copying the frames (give them back with recycle() when they are written)
+        the items are raw arrays or encoded bytes depending on class_ids and compression, see decode_mask, decode_cam
+        """
+        masks, frames = self.masks.snapshot()
+        cams, cam_frames = self.cams.snapshot()
+        self.masks.clear()
+        self.cams.clear()
+        if len(cam_frames) != len(frames):  # the memory budget dropped old camera frames
+            keep = np.isin(frames, cam_frames)
+            masks = [mask for mask, k in zip(masks, keep) if k]
+            frames = frames[keep]
+        return masks, cams, frames
+
+    def recycle(self, cams):
+        """
+        gives the storage of the camera frames of snapshot() back to the ring buffer
+        """
+        self.cams.recycle(cams)
+
+    def decode_mask(self, mask, shape):
+        """
+        :return: colorized mask (H, W, 3)
+        """
+        if self.class_ids:
+            if self.compression == 'lz4':
+                mask = decode_frame(mask, 'lz4', shape)
+            return colorize(mask, Carla.color_lut_train_ids)
+        return mask
+
+    def decode_cam(self, cam, shape):
+        """
+        :return: rgb frame (H, W, 3)
+        """
+        if self.compression == 'jpeg':
+            return cv2.cvtColor(decode_frame(cam, 'jpeg'), cv2.COLOR_BGR2RGB)
+        if self.compression == 'lz4':
+            return decode_frame(cam, 'lz4', shape)
+        return cam
+
+    def save_mask(self, path, mask, shape):
+        iio.v3.imwrite(path, self.decode_mask(mask, shape), plugin="pillow")
+
+    def save_cam(self, path, cam, shape):
+        if self.compression == 'jpeg':     # already a jpg file
+            with open(path, 'wb') as f:
+                f.write(cam)
+        else:
+            iio.v3.imwrite(path, self.decode_cam(cam, shape), plugin="pillow")
+
+    def save_frame(self, mask_path, mask, cam_path, cam, shape):
+        """
+        writes the inference mask and the camera image of one frame
+        :param shape:   (H, W) of the frame
+        """
+        self.save_mask(mask_path, mask, shape)
+        self.save_cam(cam_path, cam, shape + (3,))
+
+    def retrieve(self, cc_true, progress = None):
+        """
+        hands the buffered frames over to the writer, the recording continues right away, 
+        the frames are decoded by the writer threads
+        :param progress:    optional callback progress(cc_counter, written, total), called by the writer threads
+                            after each written frame (inference mask and camera image)
+        :return:            Future which is done when all frames of the cc are written, its result is the
+                            number of frames (None without cc)
+        """
+        masks, cams, frames = self.snapshot()
+        height, width = self.shape
+        if not cc_true:
+            self.recycle(cams)
+            return None
+        self.cc_counter += 1
+        infpath = os.path.join(self.path, "10_inference", f"cc_{self.cc_counter}")
+        campath = os.path.join(self.path, "01_cam", f"cc_{self.cc_counter}")
+        os.mkdir(infpath)
+        os.mkdir(campath)
+        jobs = []
+        for mask, cam, frame in zip(masks, cams, frames):
+            jobs.append((self.save_frame, (os.path.join(infpath, f"frame_{frame}.jpg"), mask,
+                                           os.path.join(campath, f"frame_{frame}.jpg"), cam, (height, width))))
+        if progress is not None:
+            progress = partial(progress, self.cc_counter)
+        batch = self.writer.submit_batch(jobs, progress)
+        batch.add_done_callback(lambda _: self.recycle(cams))   # the storage is reused once all frames are written
+        return batch
+
+    def close(self):
+        """
+        waits until all frames are written
+        """
+        self.writer.shutdown(wait=True)
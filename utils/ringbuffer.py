@@ -0,0 +1,149 @@
+from collections import deque
+import numpy as np
+
+
+class RingBuffer():
+    """
+    fixed capacity ring buffer of equally shaped arrays (e.g. masks or camera frames (H, W, 3))
+    the storage (capacity, H, W, 3) is allocated once with the first item, a push copies the item
+    into the next slot (or the item is written directly into slot()) and overwrites the oldest one 
+    when the buffer is full, so there is no allocation per frame and no locking
+    snapshot() hands the storage over without copying it, the buffer continues in a spare storage which is
+    given back with recycle() when the items are not needed anymore (e.g. written), or in a new one
+    """
+    def __init__(self, capacity, dtype=np.uint8):
+        """
+        :param capacity:    maximal number of items
+        :param dtype:       dtype of the storage
+        """
+        self.capacity = capacity
+        self.dtype = dtype
+        self.data = None
+        self.spare = None   # storage of a former snapshot, reused by allocate()
+        self.frames = np.zeros(capacity, dtype=np.int64)    # frame number of each slot
+        self.head = 0   # next slot
+        self.count = 0
+
+    def allocate(self, shape):
+        if self.spare is not None and self.spare.shape[1:] == tuple(shape):
+            self.data, self.spare = self.spare, None
+        else:
+            self.data = np.empty((self.capacity, *shape), dtype=self.dtype)
+
+    def slot(self, shape, frame=0):
+        """
+        reserves the next slot (the oldest item when the buffer is full), O(1)
+        :param shape:   item shape
+        :param frame:   frame number of the item
+        :return:        view of the slot, the item is written into it
+        """
+        if self.data is None or self.data.shape[1:] != tuple(shape):
+            self.allocate(shape)
+            self.head, self.count = 0, 0
+        view = self.data[self.head]
+        self.frames[self.head] = frame
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return view
+
+    def push(self, array, frame=0):
+        """
+        copies an item into the buffer, O(1)
+        :param array:   array with the item shape, can be a strided view
+        :param frame:   frame number of the item
+        """
+        np.copyto(self.slot(array.shape, frame), array)
+
+    def order(self):
+        """
+        slot indices from the oldest to the newest item
+        """
+        return (self.head - self.count + np.arange(self.count)) % self.capacity
+
+    def snapshot(self):
+        """
+        detaches the buffered items, O(capacity) without copying the frames, the buffer is empty and
+        is refilled right away in the spare storage (or a new one, allocated with the next item)
+        :return: list of the items (views into the detached storage) and frame numbers (count,)
+                 from the oldest to the newest item
+        """
+        if self.count == 0:
+            return [], np.empty((0,), dtype=np.int64)
+        index = self.order()
+        items, frames = [self.data[i] for i in index], self.frames[index]
+        self.data = None
+        self.clear()
+        return items, frames
+
+    def recycle(self, items):
+        """
+        gives the storage of snapshot() items back, it is reused instead of allocating a new one
+        can be called from another thread (e.g. the writer when the items are written)
+        """
+        if items and self.spare is None:
+            self.spare = items[0].base
+
+    def clear(self):
+        """
+        empties the buffer, the storage is kept
+        """
+        self.head, self.count = 0, 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return 0 if self.data is None else self.data.nbytes
+
+
+class CompressedRingBuffer():
+    """
+    ring buffer of encoded frames (bytes) of varying size, bounded by the number of items and
+    optionally by their total size, the oldest items are dropped first
+    """
+    @staticmethod
+    def size(data):
+        return len(data)
+
+    def __init__(self, capacity, max_bytes=None):
+        """
+        :param capacity:    maximal number of items
+        :param max_bytes:   maximal total size of the items
+        """
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.items = deque()    # (frame, data)
+        self.nbytes = 0
+
+    def push(self, data, frame=0):
+        self.items.append((frame, data))
+        self.nbytes += self.size(data)
+        while len(self.items) > self.capacity or (self.max_bytes is not None and self.nbytes > self.max_bytes and len(self.items) > 1):
+            self.nbytes -= self.size(self.items.popleft()[1])
+
+    def snapshot(self):
+        """
+        :return: list of the encoded items and their frame numbers (oldest first)
+        """
+        return [data for _, data in self.items], np.array([frame for frame, _ in self.items], dtype=np.int64)
+
+    def clear(self):
+        self.items.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def recycle(self, items):
+        pass    # the items are not stored in a shared storage
+
+
+class ReferenceRingBuffer(CompressedRingBuffer):
+    """
+    ring buffer of references to arrays which are not reused by the caller (e.g. the masks of the inference,
+    a new array per frame), they are kept without copying them
+    """
+    @staticmethod
+    def size(data):
+        return data.nbytes
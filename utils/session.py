@@ -0,0 +1,91 @@
+import os
+import re
+import config as cfg
+
+SUBFOLDERS = ['00_log', '01_cam', '02_semseg_raw', '02_semseg_cs', '03_inseg_raw', '03_inseg_cs', '04_lidar',
+              '05_radar', '06_depth_raw', '06_depth_log', '07_bboxes', '08_trajectory', '09_corner_cases',
+              '10_inference']
+
+
+def output_root():
+    return os.path.join(os.getcwd(), 'output')
+
+
+def scene_numbers(root, name=None):
+    """
+    numbers of the scene folders <name>_0001, <name>_0002, ... in the output folder
+    """
+    name = name if name is not None else cfg.name_out_folder
+    pattern = re.compile(re.escape(name) + r'_(\d{4,})$')
+    if not os.path.isdir(root):
+        return []
+    return sorted(int(match.group(1)) for match in map(pattern.match, os.listdir(root)) if match)
+
+
+class Session():
+    """
+    scene folder of a run, resolved once at the start and handed to the writers (weather, recorder,
+    corner cases, pedal tracking, ...) instead of scanning the output folder with every write
+        session = Session.create()  # new scene folder with its subfolders
+        session = Session.latest()  # scene folder created by another process (e.g. utils/spawn_npc.py)
+        session.log                 # <scene>/00_log
+        session.folder('09_corner_cases')
+    """
+    def __init__(self, path):
+        """
+        :param path: scene folder
+        """
+        self.path = path
+        self.folders = {name: os.path.join(path, name) for name in SUBFOLDERS}
+        self.log = self.folders['00_log']
+        self.cam = self.folders['01_cam']
+        self.trajectory = self.folders['08_trajectory']
+        self.corner_cases = self.folders['09_corner_cases']
+        self.inference = self.folders['10_inference']
+
+    @classmethod
+    def create(cls, root=None, name=None, subfolders=True):
+        """
+        creates the next scene folder, the number is claimed by os.mkdir, so concurrent runs get
+        different folders instead of racing on the count of the existing folders
+        :param subfolders:  also creates 00_log ... 10_inference
+        """
+        root = root if root is not None else output_root()
+        name = name if name is not None else cfg.name_out_folder
+        os.makedirs(root, exist_ok=True)
+        numbers = scene_numbers(root, name)
+        number = numbers[-1] + 1 if numbers else 1
+        while True:
+            path = os.path.join(root, '{}_%04i'.format(name) % number)
+            try:
+                os.mkdir(path)
+                break
+            except FileExistsError:     # claimed by another run in the meantime
+                number += 1
+        session = cls(path)
+        if subfolders:
+            for folder in session.folders.values():
+                os.makedirs(folder, exist_ok=True)
+        return session
+
+    @classmethod
+    def latest(cls, root=None, name=None):
+        """
+        the scene folder with the highest number
+        """
+        root = root if root is not None else output_root()
+        name = name if name is not None else cfg.name_out_folder
+        numbers = scene_numbers(root, name)
+        if not numbers:
+            raise FileNotFoundError(f'no scene folder {name}_xxxx in {root}')
+        return cls(os.path.join(root, '{}_%04i'.format(name) % numbers[-1]))
+
+    def folder(self, name, *paths):
+        """
+        :param name:    subfolder, e.g. 00_log
+        :param paths:   joined to the subfolder
+        """
+        return os.path.join(self.folders[name], *paths)
+
+    def __str__(self):
+        return self.path
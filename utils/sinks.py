@@ -0,0 +1,221 @@
+import os
+import cv2
+import numpy as np
+from concurrent.futures import wait
+
+from utils.carla_dataloader import Carla
+from utils.depth import decode_depth, save_depth
+from utils.depth_lidar import depth_to_points, lidar_pixels, save_points
+from utils.framepack import FramePackWriter, pack_path
+
+
+def raw_bgra(image):
+    """
+    view of the raw data of a carla image (H, W, 4)
+    """
+    return np.frombuffer(image.raw_data, dtype=np.uint8).reshape(image.height, image.width, 4)
+
+
+class PngSink():
+    """
+    writes the raw BGRA buffer of a carla image as png, same file as image.save_to_disk(path)
+    """
+    def __init__(self, folder, ext='png'):
+        """
+        :param folder:  sensor folder within the scene, e.g. '01_cam' or os.path.join('12_bird', '01_cam')
+        """
+        self.folder = folder
+        self.ext = ext
+        self.created = set()
+
+    def path(self, root, name_rec, frame):
+        return os.path.join(root, self.folder, name_rec, '{0:05d}.{1}'.format(frame, self.ext))
+
+    def encode(self, bgra):
+        return bgra
+
+    def write(self, path, image):
+        """
+        :param image:   carla image (raw BGRA)
+        """
+        bgra = raw_bgra(image)
+        folder = os.path.dirname(path)
+        if folder not in self.created:
+            os.makedirs(folder, exist_ok=True)
+            self.created.add(folder)
+        if not cv2.imwrite(path, self.encode(bgra)):
+            raise IOError(f'cannot write {path}')
+
+    def close(self):
+        pass
+
+
+class CityScapesSink(PngSink):
+    """
+    writes a semantic segmentation image in the CityScapesPalette, same file as 
+    image.save_to_disk(path, carla.ColorConverter.CityScapesPalette), the colors are looked up 
+    by the writer instead of converting the image on the main thread
+    """
+    lut = Carla.color_lut_ids[:, ::-1].copy()   # id --> BGR
+
+    def encode(self, bgra):
+        bgr = self.lut[bgra[..., 2]]    # the class id is stored in the red channel
+        return np.dstack([bgr, bgra[..., 3]])
+
+
+class LabelSink(PngSink):
+    """
+    writes only the label channel of a semantic segmentation image (carla ids, H x W), the CityScapes colors 
+    are derived offline (supplement/colorize_semseg.py) or on demand (CarlaRecording(target='color'))
+    """
+    def encode(self, bgra):
+        return np.ascontiguousarray(bgra[..., 2])   # the class id is stored in the red channel
+
+
+class DepthSink(PngSink):
+    """
+    decodes the 24 bit depth once when it is written and stores the depth map compressed (npz) in m 
+    (float32, float16) or mm (uint16), so the consumers do not decode the png again
+    """
+    def __init__(self, folder, depth_format='float16'):
+        """
+        :param depth_format:    [float32, float16, mm], see utils.depth.decode_depth
+        """
+        super().__init__(folder, ext='npz')
+        self.depth_format = depth_format
+
+    def encode(self, bgra):
+        return decode_depth(bgra, self.depth_format)
+
+    def write(self, path, image):
+        depth = self.encode(raw_bgra(image))
+        folder = os.path.dirname(path)
+        if folder not in self.created:
+            os.makedirs(folder, exist_ok=True)
+            self.created.add(folder)
+        save_depth(path, depth)
+
+
+class DepthLidarSink(PngSink):
+    """
+    labeled point cloud of the depth and semantic segmentation camera (utils.depth_lidar), 
+    fed with the data of both cameras: index (depth index, semseg index) in the SinkStage
+    """
+    def __init__(self, folder, fov=90., ext='npz', lidar=None):
+        """
+        :param ext:     [npz, bin], see utils.depth_lidar.save_points
+        :param lidar:   dict of lidar_pixels settings (channels, upper_fov, lower_fov, points_per_channel),
+                        the points of the rays of this lidar are kept, default: every pixel
+        """
+        super().__init__(folder, ext=ext)
+        self.fov = fov
+        self.lidar = lidar
+
+    def write(self, path, images):
+        image_depth, image_semseg = images
+        depth = decode_depth(raw_bgra(image_depth))
+        pixels = None
+        if self.lidar is not None:
+            pixels = lidar_pixels(image_depth.width, image_depth.height, float(self.fov), **self.lidar)
+        points, labels = depth_to_points(depth, raw_bgra(image_semseg)[..., 2], self.fov, pixels)
+        save_points(path, points, labels)
+
+
+class FramePacks():
+    """
+    open FramePackWriters of the recordings, shared by the PackSinks of a SinkStage
+    """
+    def __init__(self, codec='lz4'):
+        self.codec = codec
+        self.writers = {}
+
+    def open(self, root, name_rec):
+        path = pack_path(root, name_rec)
+        if path not in self.writers:
+            self.writers[path] = FramePackWriter(path, self.codec)
+        return self.writers[path]
+
+    def close(self):
+        writers, self.writers = self.writers, {}
+        for writer in writers.values():
+            writer.close()
+
+
+class PackSink():
+    """
+    writes the frames of a sink as a stream of the pack of the recording (root/<name_rec>.pack) 
+    instead of one png file per frame, the frames are encoded like the ones of the sink
+    """
+    def __init__(self, sink, packs):
+        """
+        :param sink:    PngSink or CityScapesSink, its folder is the name of the stream
+        :param packs:   FramePacks
+        """
+        self.sink = sink
+        self.packs = packs
+
+    def path(self, root, name_rec, frame):
+        return self.packs.open(root, name_rec), self.sink.folder, frame
+
+    def write(self, path, image):
+        pack, stream, frame = path
+        pack.write(stream, frame, self.sink.encode(raw_bgra(image)))
+
+    def close(self):
+        self.packs.close()
+
+
+class SinkStage():
+    """
+    hands the raw buffers of the sensor data of a tick to the sinks, which encode and write them 
+    in the bounded pool of an AsyncWriter, so the next tick does not wait for the png encoding
+    """
+    def __init__(self, writer, sinks):
+        """
+        :param writer:  AsyncWriter, it blocks if too many frames are queued (back-pressure)
+        :param sinks:   list of (index, sink), index of the sensor data in the tick data or a tuple of indices,
+                        the sink gets a tuple of the sensor data then
+        """
+        self.writer = writer
+        self.sinks = sinks
+        self.futures = []
+
+    def submit(self, data, root, name_rec, frame):
+        """
+        :param data:        sensor data of a tick (carla images)
+        :param root:        scene folder
+        :param name_rec:    name of the recording
+        :param frame:       frame number
+        """
+        for index, sink in self.sinks:
+            item = tuple(data[i] for i in index) if isinstance(index, tuple) else data[index]
+            # the job holds the carla image until its raw data is written, the pool bounds the held images
+            self.futures.append(self.writer.submit(sink.write, sink.path(root, name_rec, frame), item))
+
+    def wait(self):
+        """
+        waits until all submitted frames are written, raises the first error
+        """
+        futures, self.futures = self.futures, []
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """
+        waits until all submitted frames are written and closes the sinks (the packs of the recordings)
+        """
+        try:
+            self.wait()
+        finally:
+            for _, sink in self.sinks:
+                sink.close()
+
+    def discard(self):
+        """
+        drops the submitted frames (e.g. of a failed replay) without raising their errors and closes the sinks
+        """
+        futures, self.futures = self.futures, []
+        wait(futures)
+        for _, sink in self.sinks:
+            sink.close()
@@ -1,20 +1,66 @@
 import torch
 import os
+import time
 import sys
 sys.path.append(os.getcwd())
 import config as cfg
+from utils.session import Session
 
 
 class TimeMeasurement:
     def __init__(self):
-        """Time measurement with CUDA"""
-        self.starter, self.ender = torch.cuda.Event(enable_timing=True),   torch.cuda.Event(enable_timing=True)
+        """Time measurement with CUDA, falls back to the wall clock without GPU"""
+        self.use_cuda = torch.cuda.is_available()
+        if self.use_cuda:
+            self.starter, self.ender = torch.cuda.Event(enable_timing=True),   torch.cuda.Event(enable_timing=True)
     def start(self):
-        self.starter.record()
+        if self.use_cuda:
+            self.starter.record()
+        else:
+            self.starter = time.perf_counter()
     def end(self):
-        self.ender.record()
-        torch.cuda.synchronize()
-        print(str(self.starter.elapsed_time(self.ender)/1000)) 
+        if self.use_cuda:
+            self.ender.record()
+            torch.cuda.synchronize()
+            print(str(self.starter.elapsed_time(self.ender)/1000)) 
+        else:
+            print(str(time.perf_counter() - self.starter))
+
+
+class PhaseTimer():
+    """
+    wall clock time of the consecutive phases of a job (e.g. replay start, weather load, sensor warm-up, capture)
+        timer = PhaseTimer()
+        ...
+        timer.lap('replay start')   # time since the start
+        ...
+        timer.lap('weather load')   # time since the last lap
+    the times of several jobs can be summed up with add()
+    """
+    def __init__(self):
+        self.times = {}     # phase --> seconds, in the order of the first lap
+        self.jobs = 0
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.times[name] = self.times.get(name, 0.) + now - self.last
+        self.last = now
+
+    def add(self, other):
+        for name, seconds in other.times.items():
+            self.times[name] = self.times.get(name, 0.) + seconds
+        self.jobs += max(other.jobs, 1)
+
+    def total(self):
+        return sum(self.times.values())
+
+    def report(self):
+        """
+        one line with the time of each phase and the total time
+        """
+        return ', '.join([f'{name}: {seconds:.2f}s' for name, seconds in self.times.items()] + [f'total: {self.total():.2f}s'])
+
 
 # def find_carla_module():
 #     try:
@@ -28,12 +74,10 @@ class TimeMeasurement:
 
 def get_folder_name():
     """
-    gets the output folder name
+    gets the output folder name (the latest scene folder), scans the output folder with every call,
+    a run resolves it once with utils.session.Session
     """
-    path = os.path.join(os.getcwd(), 'output')
-    nr_files = len(os.listdir(path))
-    folder_name = os.path.join(path, '{}_%04i'.format(cfg.name_out_folder)) % nr_files
-    return folder_name
+    return Session.latest().path
 
 
 def get_model_name(ckpt_path):
@@ -49,24 +93,4 @@ def output_folders_data_generator():
     """
     create output folders for data generator script with counting the existing folders
     """
-    path = os.path.join(os.getcwd(), 'output')
-    if not os.path.exists(path): os.mkdir(path)
-    nr_files = len(os.listdir(path))
-    nr_files += 1
-    path = os.path.join(path, '{}_%04i'.format(cfg.name_out_folder)) % nr_files
-    os.mkdir(path)
-    os.mkdir(os.path.join(path,'00_log'))
-    os.mkdir(os.path.join(path,'01_cam'))
-    os.mkdir(os.path.join(path,'02_semseg_raw'))
-    os.mkdir(os.path.join(path,'02_semseg_cs'))
-    os.mkdir(os.path.join(path,'03_inseg_raw'))
-    os.mkdir(os.path.join(path,'03_inseg_cs'))
-    os.mkdir(os.path.join(path,'04_lidar'))
-    os.mkdir(os.path.join(path,'05_radar'))
-    os.mkdir(os.path.join(path,'06_depth_raw'))
-    os.mkdir(os.path.join(path,'06_depth_log'))
-    os.mkdir(os.path.join(path,'07_bboxes'))
-    os.mkdir(os.path.join(path,'08_trajectory'))
-    os.mkdir(os.path.join(path,'09_corner_cases'))
-    os.mkdir(os.path.join(path,'10_inference'))
-    return path
\ No newline at end of file
+    return Session.create().path
\ No newline at end of file
@@ -3,25 +3,121 @@ import matplotlib.pyplot as plt
 plt.style.use('ggplot')
 import csv
 import os
-from utils.tools import get_folder_name
+import time
+import numpy as np
+from utils.writer import AsyncWriter
 
-def pedal_tracking(throttle_sem, throttle_safety, brake_sem, brake_safety, timer):
+PEDAL_FIELDS = ["timer", "throttle_sem", "brake_sem", "throttle_safety", "brake_safety", "steer_sem", "steer_safety"]
+
+
+def pedal_deflection(value):
+    """
+    maps the pedal command to the deflection of the pedal in [0, 1]
+    """
+    return (value+0.049480200779342)/1.063121089866
+
+
+class PedalRecorder():
+    """
+    telemetry of the pedals and steering wheels of the semantic and the safety driver (formerly pedal_tracking),
+    a sample is written into a preallocated (capacity, 7) buffer, the buffer is handed to a background thread
+    when it is full or flush_seconds passed, which appends the rows as float64 to 00_log/pedal_tracking.bin
+    (the file stays open), so the wheel poll does no file access and can run at 1 kHz
+    the file is appended, so the samples of former drives in the same scene folder are kept
+    """
+    def __init__(self, folder, start=None, capacity=4096, flush_seconds=5.):
+        """
+        :param folder:          00_log folder of the scene
+        :param start:           starting time (time.time()), the timer column is relative to it
+        :param capacity:        rows of the buffer
+        :param flush_seconds:   maximal time a sample stays in memory
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, 'pedal_tracking.bin')
+        self.start = start if start is not None else time.time()
+        self.buffer = np.empty((capacity, len(PEDAL_FIELDS)), dtype=np.float64)
+        self.count = 0
+        self.flush_seconds = flush_seconds
+        self.last_flush = time.perf_counter()
+        self.file = open(self.path, 'ab')
+        self.first = self.file.tell() // self.buffer[0].nbytes     # first sample of this drive
+        self.writer = AsyncWriter(workers=1, max_pending=4)    # one worker: the chunks are appended in order
+
+    def record(self, throttle_sem, brake_sem, throttle_safety=np.nan, brake_safety=np.nan,
+               steer_sem=np.nan, steer_safety=np.nan, timer=None):
+        """
+        :param throttle_sem ... brake_safety:   pedal commands, stored as deflection (pedal_deflection)
+        :param steer_sem, steer_safety:         steering commands
+        :param timer:                           time in s, e.g. since the last corner case (the timer column
+                                                of the former pedal_tracking.csv), default: since start
+        """
+        if timer is None:
+            timer = time.time() - self.start
+        self.buffer[self.count] = (timer, pedal_deflection(throttle_sem), pedal_deflection(brake_sem),
+                                   pedal_deflection(throttle_safety), pedal_deflection(brake_safety),
+                                   steer_sem, steer_safety)
+        self.count += 1
+        if self.count == len(self.buffer) or time.perf_counter() - self.last_flush > self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        hands the buffered samples to the background thread
+        """
+        self.last_flush = time.perf_counter()
+        if self.count == 0:
+            return
+        rows = self.buffer[:self.count].copy()
+        self.count = 0
+        self.writer.submit(self.write, rows)
+
+    def write(self, rows):
+        rows.tofile(self.file)
+        self.file.flush()
+
+    def close(self, export_csv=False):
+        """
+        writes the remaining samples and closes the file
+        :param export_csv:  additionally appends the samples of this drive to pedal_tracking.csv next to it
+                            (former format)
+        """
+        if self.file is None:
+            return
+        self.flush()
+        self.writer.shutdown(wait=True)
+        self.file.close()
+        self.file = None
+        if export_csv:
+            export_pedal_csv(self.path, first=self.first)
+
+
+def read_pedal_log(path, first=0):
+    """
+    :param first:   index of the first sample, e.g. PedalRecorder.first for the samples of one drive
+    :return:        samples (N, 7) with the PEDAL_FIELDS
+    """
+    row_bytes = len(PEDAL_FIELDS) * np.dtype(np.float64).itemsize
+    return np.fromfile(path, dtype=np.float64, offset=first * row_bytes).reshape(-1, len(PEDAL_FIELDS))
+
+
+def export_pedal_csv(path, csv_path=None, first=0):
     """
-    saves pedal tracking in a csv file
+    appends the samples in the format of the former pedal_tracking.csv (pedals rounded to 2 decimals),
+    the steering columns are appended, the header is written into an empty file only
+    :param first:   index of the first exported sample
+    :return:        csv path
     """
-    path = get_folder_name()
-    fields = ["timer", "throttle_sem", "brake_sem", "throttle_safety", "brake_safety"]
-    throttle_sem = round((throttle_sem+0.049480200779342)/1.063121089866,2)
-    brake_sem=round((brake_sem+0.049480200779342)/1.063121089866,2)
-    throttle_safety=round((throttle_safety+0.049480200779342)/1.063121089866,2)
-    brake_safety=round((brake_safety+0.049480200779342)/1.063121089866,2)
-
-    row=[timer, throttle_sem, brake_sem, throttle_safety, brake_safety]
-    with open(os.path.join(path, '00_log', 'pedal_tracking.csv'), 'a') as file:
+    if csv_path is None:
+        csv_path = os.path.splitext(path)[0] + '.csv'
+    rows = read_pedal_log(path, first)
+    header = not os.path.exists(csv_path) or os.stat(csv_path).st_size == 0
+    with open(csv_path, 'a') as file:
         csvwriter = csv.writer(file)
-        if not os.path.exists(os.path.join(path, '00_log', 'pedal_tracking.csv')) or os.stat(os.path.join(path, '00_log', 'pedal_tracking.csv')).st_size == 0:
-            csvwriter.writerow(fields)
-        csvwriter.writerow(row)
+        if header:
+            csvwriter.writerow(PEDAL_FIELDS)
+        for row in rows.tolist():
+            csvwriter.writerow([row[0]] + [round(value, 2) for value in row[1:]])
+    return csv_path
 
 
 def live_plotter(x_vec, y1_data, line1, y2_data, line2, y3_data, line3, pause_time=0.01):
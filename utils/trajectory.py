@@ -0,0 +1,319 @@
+import gzip
+import io
+import json
+import os
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EARTH_RADIUS_EQUA = 6378137.0   # carla/geom/GeoLocation.cpp
+
+VANS = ["vehicle.mercedes.sprinter", "vehicle.volkswagen.t2", "vehicle.volkswagen.t2_2021", "vehicle.ford.ambulance"]
+MOTORCYCLES = ["vehicle.yamaha.yzf", "vehicle.vespa.zx125", "vehicle.kawasaki.ninja"]
+TRAJECTORY_CODECS = [None, 'gzip', 'zstd']
+EXTENSIONS = {None: '.jsonl', 'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+
+def class_name(type_id):
+    """
+    class of the trajectory entry, None for actors which are not recorded (sensors, props, ...)
+    """
+    if type_id in VANS:
+        return "van"
+    if type_id.startswith('walker'):
+        return "pedestrian"
+    if type_id in MOTORCYCLES:
+        return "motorcycle"
+    if type_id == "vehicle.bh.crossbike":
+        return "cyclist"
+    if type_id.startswith('vehicle'):
+        return "car"
+    return None
+
+
+def geolocation(reference, x, y):
+    """
+    vectorized carla.Map.transform_to_geolocation (mercator projection around the geo reference of the map)
+    :param reference:   (latitude, longitude) of the map origin
+    :param x:           x of the locations (N,)
+    :param y:           y of the locations (N,)
+    :return:            latitudes (N,) and longitudes (N,)
+    """
+    lat0, lon0 = reference
+    scale = np.cos(np.radians(lat0))
+    mx = scale * np.radians(lon0) * EARTH_RADIUS_EQUA + x
+    my = scale * EARTH_RADIUS_EQUA * np.log(np.tan((90.0 + lat0) * np.pi / 360.0)) - y
+    lon = mx * 180.0 / (np.pi * EARTH_RADIUS_EQUA * scale)
+    lat = 360.0 * np.arctan(np.exp(my / (EARTH_RADIUS_EQUA * scale))) / np.pi - 90.0
+    return lat, lon
+
+
+class TrajectoryEngine():
+    """
+    trajectories of the vehicles and walkers around the ego vehicle (SaveContext.collect_trajectories)
+    the transforms are read once per step from the world snapshot into arrays, the radius filter, speed and
+    acceleration (finite differences to the last step of each actor) are computed for all actors at once,
+    the types of the actors are queried once per actor and the geo reference of the map once per run
+    """
+    def __init__(self, world=None, reference=None):
+        """
+        :param world:       carla world, needed by step()
+        :param reference:   (latitude, longitude) of the map origin, default: from the map of the world
+        """
+        self.world = world
+        if reference is None:
+            import carla    # the engine itself works on arrays, carla is only needed for the map
+            origin = world.get_map().transform_to_geolocation(carla.Location(0, 0, 0))
+            reference = (origin.latitude, origin.longitude)
+        self.reference = reference
+        self.classes = {}   # actor id --> class name (None: not recorded)
+        # state of the recorded actors at their last step, sorted by id
+        self.ids = np.empty(0, dtype=np.int64)
+        self.state = np.empty((0, 7))   # x, y, z, vx, vy, vz, timestamp [us]
+        self.age = np.empty(0, dtype=np.int64)
+
+    def read_snapshot(self, snapshot):
+        """
+        :return: ids (N,), locations (N, 3) and yaws (N,) of the actors in the snapshot
+        """
+        ids, values = [], []
+        for actor_snapshot in snapshot:
+            transform = actor_snapshot.get_transform()
+            ids.append(actor_snapshot.id)
+            values.append((transform.location.x, transform.location.y, transform.location.z, transform.rotation.yaw))
+        values = np.array(values, dtype=np.float64).reshape(-1, 4)
+        return np.array(ids, dtype=np.int64), values[:, :3], values[:, 3]
+
+    def lookup_classes(self, ids):
+        """
+        :return: class names (N,) of the actors, the unknown actors are queried with one call
+        """
+        unknown = [int(actor_id) for actor_id in ids if int(actor_id) not in self.classes]
+        if unknown:
+            for actor in self.world.get_actors(actor_ids=unknown):
+                self.classes[actor.id] = class_name(str(actor.type_id))
+            for actor_id in unknown:
+                self.classes.setdefault(actor_id, None)     # destroyed in the meantime
+        return [self.classes[int(actor_id)] for actor_id in ids]
+
+    def step(self, ego_id, snapshot, timestamp, bboxes=None, radius=15):
+        """
+        :param ego_id:      id of the ego vehicle
+        :param snapshot:    carla world snapshot
+        :param timestamp:   timestamp of the step [us]
+        :param bboxes:      output of BoundingBoxes.on_tick
+        :param radius:      radius around the ego vehicle in which actors are recorded [m]
+        :return:            list of the trajectory entries of the step
+        """
+        ids, locations, yaws = self.read_snapshot(snapshot)
+        ego = np.flatnonzero(ids == ego_id)
+        if len(ego):
+            ego_location = locations[ego[0]]
+        else:
+            location = self.world.get_actor(ego_id).get_location()
+            ego_location = (location.x, location.y, location.z)
+        return self.update(ids, locations, yaws, self.lookup_classes(ids), ego_location, timestamp, bboxes, radius)
+
+    def update(self, ids, locations, yaws, classes, ego_location, timestamp, bboxes=None, radius=15):
+        """
+        step on arrays, independent of carla
+        :param classes:         class names (N,) of the actors, None for actors which are not recorded
+        :param ego_location:    x, y, z of the ego vehicle
+        """
+        distance = np.hypot(locations[:, 0] - ego_location[0], locations[:, 1] - ego_location[1])
+        recorded = np.array([name is not None for name in classes], dtype=bool)
+        selected = np.flatnonzero((distance < radius) & recorded)
+        ids, locations, yaws = ids[selected], locations[selected], yaws[selected]
+
+        # finite differences to the last step of the actors which were recorded before
+        position = np.searchsorted(self.ids, ids)
+        known = position < len(self.ids)
+        known[known] = self.ids[position[known]] == ids[known]
+        last = self.state[position[known]]
+        velocity = np.zeros((len(ids), 3))
+        acceleration = np.zeros((len(ids), 3))
+        dt = (timestamp - last[:, 6:7]) / 10**6
+        velocity[known] = (locations[known] - last[:, 0:3]) / dt
+        acceleration[known] = (velocity[known] - last[:, 3:6]) / dt
+        age = np.ones(len(ids), dtype=np.int64)
+        age[known] = self.age[position[known]] + 1
+
+        # new state: former actors which were not recorded in this step keep their last state
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[position[known]] = False
+        state = np.hstack([locations, velocity, np.full((len(ids), 1), float(timestamp))])
+        self.ids = np.concatenate([self.ids[keep], ids])
+        self.state = np.concatenate([self.state[keep], state])
+        self.age = np.concatenate([self.age[keep], age])
+        order = np.argsort(self.ids, kind='stable')
+        self.ids, self.state, self.age = self.ids[order], self.state[order], self.age[order]
+
+        speed = np.linalg.norm(velocity, axis=1)
+        acc = np.linalg.norm(acceleration, axis=1)
+        lat, lon = geolocation(self.reference, locations[:, 0], locations[:, 1])
+        ego_lat, ego_lon = geolocation(self.reference, np.array([ego_location[0]]), np.array([ego_location[1]]))
+        boxes = {}
+        if bboxes is not None:
+            boxes = {box["id"]: box for box in bboxes[0]['3d']}
+
+        entries = []
+        for i, actor_id in enumerate(ids.tolist()):
+            entry = {
+                "id": actor_id,
+                "age": int(age[i]),
+                "existence_prob": 1,
+                "class_name1": classes[selected[i]],
+                "class_prob1": 1,
+                "latitude": float(lat[i]),
+                "longitude": float(lon[i]),
+                "length": "NA",
+                "width": "NA",
+                "height": "NA",
+                "orientation": float(yaws[i])
+            }
+            if bboxes is not None:
+                entry["orientation"] += 180     # added 180 degrees to get the scale in [0, 360]
+                box = boxes.get(actor_id)
+                if box is not None:
+                    entry["length"] = box["extent"][0] * 2  # multiplied by two to get box extent
+                    entry["width"] = box["extent"][1] * 2
+                    entry["height"] = box["extent"][2] * 2
+                else:
+                    print("ERROR: could not find bounding box for actor {}.".format(actor_id))
+            entry["speed"] = float(speed[i])                        # in m/s
+            entry["acceleration_longitudinal"] = float(acc[i])      # in m/s²
+            entry["kidt_car_company"] = "buw"
+            entry["kidt_car_latitude"] = float(ego_lat[0])
+            entry["kidt_car_longitude"] = float(ego_lon[0])
+            entries.append(entry)
+        return entries
+
+
+def check_trajectory_codec(codec):
+    if codec not in TRAJECTORY_CODECS:
+        raise ValueError(f'codec {codec} is not supported, choose from {TRAJECTORY_CODECS}')
+    if codec == 'zstd' and zstandard is None:
+        raise RuntimeError('cannot import zstandard, make sure zstandard package is installed')
+
+
+def trajectory_path(folder, codec=None):
+    """
+    :return: path of the trajectories of a recording in the folder
+    """
+    return os.path.join(folder, 'trajectories' + EXTENSIONS[codec])
+
+
+class TrajectoryWriter():
+    """
+    streams the trajectory entries of each timestamp to disk as soon as they are collected, so the run is not
+    held in memory: one compact json line {"<timestamp>": [entries]} per timestamp, with gzip or zstd every
+    line is a separate member / frame, so the file is still a valid .gz / .zst stream and each line can be
+    decompressed on its own
+    the byte range of every line is written to <file>.idx on close for the random access of TrajectoryReader
+    """
+    def __init__(self, path, codec=None):
+        """
+        :param path:    trajectories file, see trajectory_path()
+        :param codec:   None, gzip or zstd (needs zstandard)
+        """
+        check_trajectory_codec(codec)
+        self.path = path
+        self.codec = codec
+        self.compressor = zstandard.ZstdCompressor() if codec == 'zstd' else None
+        self.blocks = []    # [timestamp, offset, size]
+        self.offset = 0
+        self.file = open(path, 'wb')
+
+    def write(self, timestamp, entries):
+        """
+        :param timestamp:   timestamp of the entries [us]
+        :param entries:     trajectory entries of the timestamp (TrajectoryEngine.step)
+        """
+        data = (json.dumps({str(timestamp): entries}, separators=(',', ':')) + '\n').encode()
+        if self.codec == 'gzip':
+            data = gzip.compress(data, compresslevel=6)
+        elif self.codec == 'zstd':
+            data = self.compressor.compress(data)
+        self.file.write(data)
+        self.blocks.append([int(timestamp), self.offset, len(data)])
+        self.offset += len(data)
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        with open(self.path + '.idx', 'w') as f:
+            json.dump({'codec': self.codec, 'blocks': self.blocks}, f, separators=(',', ':'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryReader():
+    """
+    lazy reader of the files of TrajectoryWriter, iterating yields (timestamp, entries) line by line,
+    read() decodes a single timestamp with the index
+    """
+    def __init__(self, path):
+        """
+        :param path:    trajectories file (.jsonl, .jsonl.gz or .jsonl.zst)
+        """
+        self.path = path
+        self.codec = [codec for codec, extension in EXTENSIONS.items() if path.endswith(extension)][-1]
+        check_trajectory_codec(self.codec)
+        self.index = None
+        if os.path.exists(path + '.idx'):
+            with open(path + '.idx') as f:
+                self.index = {timestamp: (offset, size) for timestamp, offset, size in json.load(f)['blocks']}
+
+    def lines(self):
+        if self.codec == 'gzip':
+            return gzip.open(self.path, 'rt')   # reads across the members
+        if self.codec == 'zstd':
+            reader = zstandard.ZstdDecompressor().stream_reader(open(self.path, 'rb'), read_across_frames=True)
+            return io.TextIOWrapper(reader)
+        return open(self.path)
+
+    def __iter__(self):
+        with self.lines() as f:
+            for line in f:
+                if line.strip():
+                    (timestamp, entries), = json.loads(line).items()
+                    yield int(timestamp), entries
+
+    def timestamps(self):
+        if self.index is None:
+            return [timestamp for timestamp, _ in self]
+        return list(self.index)
+
+    def read(self, timestamp):
+        """
+        :return: trajectory entries of the timestamp, without index the file is scanned
+        """
+        if self.index is None:
+            for current, entries in self:
+                if current == timestamp:
+                    return entries
+            raise KeyError(timestamp)
+        offset, size = self.index[int(timestamp)]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(size)
+        if self.codec == 'gzip':
+            data = gzip.decompress(data)
+        elif self.codec == 'zstd':
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return json.loads(data)[str(timestamp)]
+
+    def to_dict(self):
+        """
+        all timestamps in the layout of the former trajectories.json {"<timestamp>": [entries]}
+        """
+        return {str(timestamp): entries for timestamp, entries in self}
@@ -4,7 +4,7 @@ import sys
 import random
 import config as cfg
 import json
-from utils.tools import get_folder_name
+from utils.session import Session
 from datetime import datetime
 
 try:
@@ -18,8 +18,12 @@ except IndexError:
 import carla
 
 class Weather:
-    def __init__(self, client, preset):
+    def __init__(self, client, preset, session=None):
+        """
+        :param session: scene folder of the run (utils.session.Session), default: the latest one
+        """
         self.client = client
+        self.session = session
         self.world = self.client.get_world()
         # self.weather_preset = preset
         #fixed parameters:
@@ -147,5 +151,6 @@ class Weather:
         if self.weather_preset:
             setup['weather_preset']    = self.weather_preset
         
-        with open(os.path.join(get_folder_name(), '00_log', 'weather.json'), 'w') as f:
+        session = self.session if self.session is not None else Session.latest()
+        with open(session.folder('00_log', 'weather.json'), 'w') as f:
             json.dump(setup, f)
\ No newline at end of file
@@ -0,0 +1,119 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class AsyncWriter():
+    """
+    encodes and writes files in a pool of worker threads, so the drive (or the replay) is not blocked
+    the encoders (Pillow, OpenCV) release the GIL, so threads work in parallel without copying the frames
+    into other processes
+    at most max_pending files are queued, submit() blocks if the pool falls behind (back-pressure),
+    so the memory held by the queued frames is bounded
+    """
+    def __init__(self, workers=4, max_pending=64):
+        """
+        :param workers:     number of writer threads
+        :param max_pending: maximal number of queued files
+        """
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='AsyncWriter')
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.feeders = 0    # batches which are still fed into the pool
+        self.feeding = threading.Condition()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        queues a write job, blocks while max_pending jobs are queued
+        :param function:    writes one file, e.g. imageio.v3.imwrite or cv2.imwrite
+        :return:            Future of the job
+        """
+        self.pending.acquire()
+        with self.lock:
+            self.submitted += 1
+        try:
+            future = self.executor.submit(function, *args, **kwargs)
+        except Exception:
+            self.pending.release()
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def submit_batch(self, jobs, progress=None):
+        """
+        queues a batch of write jobs (e.g. the frames of a corner case) without blocking
+        :param jobs:        list of (function, args) tuples
+        :param progress:    optional callback progress(written, total), called by the writer threads
+        :return:            Future which is done when all files are written, its result is the number of files,
+                            it raises the first error of the batch
+        """
+        batch = Future()
+        total = len(jobs)
+        state = {'done': 0, 'error': None}
+        lock = threading.Lock()
+
+        def done(future):
+            with lock:
+                state['done'] += 1
+                if future.exception() is not None and state['error'] is None:
+                    state['error'] = future.exception()
+                finished = state['done'] == total
+                count = state['done']
+            if progress is not None:
+                progress(count, total)
+            if finished:
+                if state['error'] is not None:
+                    batch.set_exception(state['error'])
+                else:
+                    batch.set_result(total)
+
+        def feed():
+            for function, args in jobs:
+                try:
+                    self.submit(function, *args).add_done_callback(done)
+                except Exception as error:     # the pool was shut down
+                    future = Future()
+                    future.set_exception(error)
+                    done(future)
+            with self.feeding:
+                self.feeders -= 1
+                self.feeding.notify_all()
+
+        if total == 0:
+            batch.set_result(0)
+        with self.feeding:
+            self.feeders += 1
+        # the jobs are fed by a thread, so the caller is not blocked by the back-pressure
+        threading.Thread(target=feed, name='AsyncWriterFeed', daemon=True).start()
+        return batch
+
+    def progress(self):
+        """
+        counters of the submitted, written and failed files
+        """
+        with self.lock:
+            return {'submitted': self.submitted, 'written': self.written, 'failed': self.failed,
+                    'pending': self.submitted - self.written - self.failed}
+
+    def shutdown(self, wait=True):
+        """
+        :param wait: waits until all queued files are written
+        """
+        if wait:
+            with self.feeding:
+                while self.feeders:
+                    self.feeding.wait()
+        self.executor.shutdown(wait=wait)
+
+    def _done(self, future):
+        self.pending.release()
+        with self.lock:
+            if future.exception() is None:
+                self.written += 1
+            else:
+                self.failed += 1
+        if future.exception() is not None:
+            logging.error(f'writing failed: {future.exception()}')